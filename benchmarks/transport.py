@@ -0,0 +1,95 @@
+"""
+Compare the client-side CPU cost per message of the requests and urllib3
+transports, sending to a local stand-in for the Pushover API.
+
+Usage: python benchmarks/transport.py [messages]
+
+CPU time is measured on the sending thread only, so the stand-in server's
+work is excluded.
+"""
+
+import http.server
+import os
+import sys
+import threading
+import time
+from unittest import mock
+
+# import the checkout being benchmarked, rather than requiring it be installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from pullover import Application, User, Message, transport, retry, \
+    sounds, endpoint  # noqa: E402
+from pullover.transport import RequestsTransport, \
+    Urllib3Transport  # noqa: E402
+
+
+_BODY = b'{"status":1,"request":"647d2300-702c-4b38-8b2f-d56326ae460b"}'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep connections alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(_BODY)))
+        self.end_headers()
+        self.wfile.write(_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def _measure(sender, root, count):
+    """
+    Send messages with a transport.
+
+    :param Transport sender: The transport.
+    :param str root: The stand-in API root.
+    :param int count: The number of messages to send.
+    :return: CPU and wall-clock microseconds per message.
+    :rtype: tuple(float, float)
+    """
+    transport.configure(sender)
+    prepared = Message('Benchmark', title='pullover').prepare(
+        Application('azGDORePK8gMaC0QOYAMyEEuzJnyUi'),
+        User('uQiRzpo4DXghDmr9QzzfQu27cmVRsG'))
+    with mock.patch.object(endpoint.MESSAGES, 'root', root):
+        for _ in range(min(count, 100)):  # warm up connections and caches
+            prepared.send()
+        cpu, wall = time.thread_time(), time.perf_counter()
+        for _ in range(count):
+            prepared.send()
+        cpu, wall = time.thread_time() - cpu, time.perf_counter() - wall
+    return cpu / count * 1e6, wall / count * 1e6
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 5000
+    retry.configure(None)
+    sounds.configure(None)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = 'http://127.0.0.1:{0}/1/'.format(
+        server.server_address[1])
+
+    results = {}
+    for name, sender in (('requests', RequestsTransport()),
+                         ('urllib3', Urllib3Transport())):
+        results[name] = _measure(sender, root, count)
+        print('{0:>8}: {1:7.1f} us CPU, {2:7.1f} us wall per message'.format(
+            name, *results[name]))
+    print('CPU reduction: {0:.0%}'.format(
+        1 - results['urllib3'][0] / results['requests'][0]))
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
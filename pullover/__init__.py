@@ -6,6 +6,8 @@ from pullover.application import Application
 from pullover.message import Message, PreparedMessage, SendError, \
     ClientSendError, ServerSendError
 from pullover.user import User
+from pullover.glance import Glance
+from pullover.dispatch import Dispatcher
 
 
 __title__ = 'pullover'
@@ -3,10 +3,12 @@ import logging
 import sys
 import os
 import argparse
+import time
 import dateutil.parser
 
 import pullover
-from pullover import util, Message, User, Application
+from pullover import util, deadletter, Message, User, Application
+from pullover.follow import Follower
 
 
 logger = logging.getLogger(__name__)
@@ -65,7 +67,9 @@ class PriorityAction(argparse.Action):
         str(Message.NORMAL): Message.NORMAL,
         'normal': Message.NORMAL,
         str(Message.HIGH): Message.HIGH,
-        'high': Message.HIGH
+        'high': Message.HIGH,
+        str(Message.EMERGENCY): Message.EMERGENCY,
+        'emergency': Message.EMERGENCY
     }
 
     def __call__(self, parser, namespace, values, option_string=None):
@@ -75,6 +79,11 @@ class PriorityAction(argparse.Action):
         setattr(namespace, self.dest, self._PRIORITIES[values])
 
 
+# first arguments selecting a mode other than sending a message
+_REPLAY = '--replay'
+_FOLLOW = '--follow'
+
+
 def _parse_argv(argv):
     """
     Interpret command line arguments.
@@ -84,8 +93,12 @@ def _parse_argv(argv):
     :rtype: argparse.Namespace
     """
 
-    parser = argparse.ArgumentParser(prog=pullover.__title__,
-                                     description=pullover.__description__)
+    parser = argparse.ArgumentParser(
+        prog=pullover.__title__,
+        description=pullover.__description__,
+        epilog="to replay a dead-letter file or follow a file, see '{0} "
+               "--replay --help' and '{0} --follow --help'".format(
+                   pullover.__title__))
     parser.add_argument('-V', '--version',
                         action='version',
                         version='%(prog)s ' + pullover.__version__)
@@ -103,6 +116,11 @@ def _parse_argv(argv):
                         env='PUSHOVER_USER_KEY',
                         help='the user key to send to; defaults to '
                              'PUSHOVER_USER_KEY')
+    parser.add_argument('-d', '--device',
+                        action='append',
+                        help="the name of one of the user's devices to send "
+                             'to; may be given multiple times; defaults to '
+                             'all devices')
     parser.add_argument('-p', '--priority',
                         action=PriorityAction,
                         help='the priority of the message, either an integer '
@@ -121,23 +139,139 @@ def _parse_argv(argv):
                         action=DependencyAction,
                         depends_on='url',
                         help='the URL title; requires --url')
+    parser.add_argument('-s', '--sound',
+                        help='the name of the notification sound to play; '
+                             "defaults to the user's default sound")
+    parser.add_argument('--retry',
+                        type=int,
+                        help='for emergency priority, how often in seconds to '
+                             'repeat the notification until acknowledged')
+    parser.add_argument('--expire',
+                        type=int,
+                        help='for emergency priority, how many seconds to '
+                             'keep repeating the notification for')
+    parser.add_argument('--tag',
+                        action='append',
+                        help='for emergency priority, a label to cancel the '
+                             'message by; may be given multiple times')
     parser.add_argument('message',
                         help='the message content to send')
-    return parser.parse_args(argv[1:])
+    args = parser.parse_args(argv[1:])
+    if args.priority == Message.EMERGENCY:
+        if args.retry is None or args.expire is None:
+            parser.error('emergency priority requires --retry and --expire')
+    elif args.retry is not None or args.expire is not None or args.tag:
+        parser.error('--retry, --expire and --tag require emergency priority')
+    return args
 
 
-def main(argv):
+def _parse_replay_argv(argv):
     """
-    pullover's entry point.
+    Interpret command line arguments for replaying a dead-letter file.
 
-    :param list(str) argv: Command-line arguments, with the program in position
-                           0.
+    :param list(str) argv: `sys.argv`
+    :return: The populated argparse namespace.
+    :rtype: argparse.Namespace
     """
 
-    args = _parse_argv(argv)
+    parser = argparse.ArgumentParser(
+        prog=pullover.__title__ + ' ' + _REPLAY,
+        description='Send the messages in a dead-letter file again. Messages '
+                    'that fail again are returned to the file.')
+    parser.add_argument('-v', '--verbosity',
+                        help='increase output verbosity',
+                        action='count',
+                        default=0)
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        default=8,
+                        help='the maximum number of messages to send '
+                             'concurrently; defaults to 8')
+    parser.add_argument('file',
+                        help='the dead-letter file to replay')
+    return parser.parse_args(argv[2:])
+
+
+def _parse_follow_argv(argv):
+    """
+    Interpret command line arguments for following a file.
+
+    :param list(str) argv: `sys.argv`
+    :return: The populated argparse namespace.
+    :rtype: argparse.Namespace
+    """
+
+    parser = argparse.ArgumentParser(
+        prog=pullover.__title__ + ' ' + _FOLLOW,
+        description='Follow a file, e.g. a log, sending lines matching any of '
+                    'the given patterns. Matches close together are sent as '
+                    'one message.')
+    parser.add_argument('-v', '--verbosity',
+                        help='increase output verbosity',
+                        action='count',
+                        default=0)
+    parser.add_argument('-a', '--app',
+                        action=EnvDefault,
+                        env='PUSHOVER_APP_TOKEN',
+                        help='the application token to send from; defaults to '
+                             'PUSHOVER_APP_TOKEN')
+    parser.add_argument('-u', '--user',
+                        action=EnvDefault,
+                        env='PUSHOVER_USER_KEY',
+                        help='the user key to send to; defaults to '
+                             'PUSHOVER_USER_KEY')
+    parser.add_argument('-d', '--device',
+                        action='append',
+                        help="the name of one of the user's devices to send "
+                             'to; may be given multiple times; defaults to '
+                             'all devices')
+    parser.add_argument('-p', '--priority',
+                        action=PriorityAction,
+                        help='the priority of messages, either an integer '
+                             "or string (e.g. '0' or 'normal'); emergency "
+                             'priority is not supported',
+                        default=Message.NORMAL)
+    parser.add_argument('-t', '--title',
+                        help='the title of messages; defaults to the name of '
+                             'the file')
+    parser.add_argument('-e', '--regex',
+                        action='append',
+                        required=True,
+                        help='a regular expression lines must contain to be '
+                             'sent; may be given multiple times')
+    parser.add_argument('--window',
+                        type=float,
+                        default=Follower._DEFAULT_WINDOW,
+                        help='how many seconds to wait after a match for '
+                             'others to send with it; defaults to 2')
+    parser.add_argument('--rate',
+                        type=float,
+                        default=Follower._DEFAULT_RATE,
+                        help='the maximum number of messages per minute; '
+                             'defaults to 6')
+    parser.add_argument('--burst',
+                        type=int,
+                        default=Follower._DEFAULT_BURST,
+                        help='the maximum number of messages to send in quick '
+                             'succession; defaults to 3')
+    parser.add_argument('--from-start',
+                        action='store_true',
+                        help="also check the file's existing contents")
+    parser.add_argument('file',
+                        help='the file to follow')
+    args = parser.parse_args(argv[2:])
+    if args.priority == Message.EMERGENCY:
+        parser.error('emergency priority is not supported by follow')
+    return args
+
+
+def _configure_logging(verbosity):
+    """
+    Sort out logging output and level.
 
-    # sort out logging output and level
-    level = util.log_level_from_vebosity(args.verbosity)
+    :param int verbosity: The number of times the `-v` option was specified.
+    """
+    level = util.log_level_from_vebosity(verbosity)
     root = logging.getLogger()
     root.setLevel(level)
     handler = logging.StreamHandler(sys.stdout)
@@ -145,15 +279,99 @@ def main(argv):
     handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
     root.addHandler(handler)
 
+
+def replay(argv):
+    """
+    The entry point for replaying a dead-letter file.
+
+    :param list(str) argv: Command-line arguments, with the program in position
+                           0 and ``--replay`` in position 1.
+    :return: The return code of the program.
+    :rtype: int
+    """
+
+    args = _parse_replay_argv(argv)
+    _configure_logging(args.verbosity)
+    logger.debug(args)
+
+    store = deadletter.DeadLetterStore(args.file)
+    total = len(store)
+    last_report = [0.]
+
+    def progress(sent, failed):
+        now = time.monotonic()
+        if now - last_report[0] >= 1 or sent + failed == total:
+            last_report[0] = now
+            util.print_error('Replayed {0}/{1}: {2} sent, {3} failed'.format(
+                sent + failed, total, sent, failed))
+
+    sent, failed = deadletter.replay(store, args.workers, progress)
+    print('{0} sent, {1} failed'.format(sent, failed))
+    return 0 if failed == 0 else 1
+
+
+def follow(argv):
+    """
+    The entry point for following a file.
+
+    :param list(str) argv: Command-line arguments, with the program in position
+                           0 and ``--follow`` in position 1.
+    :return: The return code of the program.
+    :rtype: int
+    """
+
+    args = _parse_follow_argv(argv)
+    _configure_logging(args.verbosity)
+    logger.debug(args)
+
+    try:
+        follower = Follower(args.file, args.regex, Application(args.app),
+                            User(args.user, args.device), args.title,
+                            args.priority, args.window, args.rate, args.burst,
+                            not args.from_start)
+    except ValueError as e:
+        util.print_error(str(e))
+        return 1
+    follower.run()
+    logger.info('Sent %d messages for %d matching lines', follower.sent,
+                follower.matched)
+    return 0
+
+
+def main(argv):
+    """
+    pullover's entry point.
+
+    :param list(str) argv: Command-line arguments, with the program in position
+                           0.
+    :return: The return code of the program.
+    :rtype: int
+    """
+
+    # flags rather than subcommands, so a message may be any word
+    if argv[1:2] == [_REPLAY]:
+        return replay(argv)
+    if argv[1:2] == [_FOLLOW]:
+        return follow(argv)
+
+    args = _parse_argv(argv)
+    _configure_logging(args.verbosity)
     logger.debug(args)
 
-    message = Message(args.message, args.title, args.timestamp, args.url,
-                      args.url_title, args.priority)
+    try:
+        message = Message(args.message, args.title, args.timestamp, args.url,
+                          args.url_title, args.priority, args.retry,
+                          args.expire, args.tag, args.sound)
+    except ValueError as e:
+        util.print_error(str(e))
+        return 1
     app = Application(args.app)
-    user = User(args.user)
+    user = User(args.user, args.device)
     response = message.send(app, user)
     if response.ok:
         print(response.id)
+        if response.receipt is not None:
+            print(response.receipt)
         return 0
 
     util.print_error(os.linesep.join(response.errors))
@@ -11,6 +11,14 @@ class Application:
         """
         self._token = token
 
+    @property
+    def token(self):
+        """
+        :return: The application token.
+        :rtype: str
+        """
+        return self._token
+
     def sign(self, request):
         """
         Modify a request to indicate that a new message was sent by this
@@ -20,5 +28,13 @@ class Application:
         """
         request.data['token'] = self._token
 
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        return self._token == other._token
+
+    def __hash__(self):
+        return hash(self._token)
+
     def __str__(self):
         return '{0.__class__.__name__}({0._token})'.format(self)
@@ -0,0 +1,361 @@
+import logging
+import datetime
+import threading
+import pytz
+import backoff
+import requests
+
+from pullover import endpoint
+from pullover.exceptions import PulloverError
+from pullover.client.websocket import WebSocket, WebSocketError
+
+
+logger = logging.getLogger(__name__)
+
+
+class ClientError(PulloverError):
+    """
+    Raised if Pushover rejects an Open Client API request, or cannot be
+    reached.
+    """
+
+    def __init__(self, errors):
+        """
+        Initialise a new error.
+
+        :param list(str) errors: A list of textual errors.
+        """
+        super(ClientError, self).__init__(errors)
+
+        #: A list of textual errors
+        self.errors = errors
+
+
+class ClientUnavailableError(ClientError):
+    """
+    Raised if an Open Client API request failed for a reason that may be
+    temporary: Pushover could not be reached, timed out, or reported a server
+    error or rate limit. Retrying later may succeed, without logging in
+    again.
+    """
+
+
+class ReceivedMessage:
+    """
+    A message downloaded by an Open Client device.
+    """
+
+    def __init__(self, json):
+        """
+        Initialise a new received message.
+
+        :param dict json: The message, as returned by Pushover.
+        """
+
+        #: The message's identifier, unique and increasing per device.
+        self.id = int(json['id'])
+
+        #: The message's identifier, unique across all of Pushover.
+        self.umid = json.get('umid')
+
+        #: The contents of the message.
+        self.body = json['message']
+
+        #: The message heading, or None.
+        self.title = json.get('title')
+
+        #: The name of the sending application.
+        self.app = json.get('app')
+
+        #: The identifier of the sending application.
+        self.aid = json.get('aid')
+
+        #: The message priority, e.g. :attr:`pullover.Message.HIGH`.
+        self.priority = int(json.get('priority', 0))
+
+        #: When the message was sent.
+        self.date = datetime.datetime.fromtimestamp(int(json['date']),
+                                                    pytz.utc)
+
+        #: A supplementary URL, or None.
+        self.url = json.get('url')
+
+        #: The title of the URL, or None.
+        self.url_title = json.get('url_title')
+
+        #: For emergency messages, the receipt, otherwise None.
+        self.receipt = json.get('receipt')
+
+    def __str__(self):
+        return '{0.__class__.__name__}({0.id}, {0.body})'.format(self)
+
+
+class Client:
+    """
+    Receives messages as a Pushover Open Client device, e.g. to check
+    messages sent by pullover are delivered end-to-end.
+
+    A device logs in and registers once, then keeps one persistent WebSocket
+    connection open. Each time Pushover signals new messages, everything
+    waiting is downloaded with a single request and deleted with another,
+    however many messages arrived. Requests share pullover's connections.
+
+    The API and push endpoints can be overridden, e.g. to test against a
+    local stand-in server.
+    """
+
+    _API = endpoint.ROOT
+    _PUSH = 'wss://client.pushover.net/push'
+    _TIMEOUT = 10
+
+    # the desktop operating system code for Open Client devices
+    _OS = 'O'
+
+    # single-byte frames sent over the WebSocket
+    _KEEP_ALIVE = b'#'
+    _NEW_MESSAGE = b'!'
+    _RELOAD = b'R'
+    _ERROR = b'E'
+    _SESSION_CLOSED = b'A'
+
+    # Pushover sends a keep-alive every 30s; assume a connection is dead if
+    # nothing has been received for a while longer
+    _RECV_TIMEOUT = 90
+
+    # upper limit of the delay between reconnection attempts
+    _MAX_RECONNECT_DELAY = 60
+
+    def __init__(self, secret=None, device_id=None, api=_API, push=_PUSH):
+        """
+        Initialise a new client.
+
+        :param str secret: The secret of a logged in user. Defaults to
+                           requiring :meth:`login()`.
+        :param str device_id: The identifier of a registered device. Defaults
+                              to requiring :meth:`register()`.
+        :param str api: The root of the Pushover API.
+        :param str push: The WebSocket URL to listen on.
+        """
+        self._secret = secret
+        self._device_id = device_id
+        self._api = api
+        self._push = push
+        self._socket = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def secret(self):
+        """
+        :return: The logged in user's secret. Store this, together with the
+                 device identifier, to avoid logging in and registering every
+                 time.
+        :rtype: str
+        """
+        return self._secret
+
+    @property
+    def device_id(self):
+        """
+        :return: The registered device's identifier.
+        :rtype: str
+        """
+        return self._device_id
+
+    def _call(self, method, path, **data):
+        """
+        Make a request to the Open Client API.
+
+        :param str method: The HTTP method.
+        :param str path: The path relative to the API root.
+        :param data: Parameters to send.
+        :return: The decoded response.
+        :rtype: dict
+        :raises ClientUnavailableError: If the request failed temporarily.
+        :raises ClientError: If Pushover rejected the request.
+        """
+        try:
+            response = endpoint.Endpoint(path, method, self._api).call(
+                data=data, timeout=self._TIMEOUT)
+        except requests.RequestException as e:
+            raise ClientUnavailableError([str(e)])
+        if response.status_code == 429 or response.status_code >= 500:
+            raise ClientUnavailableError(['HTTP {0}'.format(
+                response.status_code)])
+        try:
+            json_ = response.json()
+        except ValueError as e:
+            raise ClientError([str(e)])
+        if json_.get('status') != 1:
+            raise ClientError(json_.get('errors', []))
+        return json_
+
+    def login(self, email, password, twofa=None):
+        """
+        Log in as a Pushover user.
+
+        :param str email: The user's email address.
+        :param str password: The user's password.
+        :param str twofa: The user's current two-factor authentication code,
+                          if they have it enabled.
+        :return: The user's key.
+        :rtype: str
+        :raises ClientError: If the login failed.
+        """
+        data = {'email': email, 'password': password}
+        if twofa is not None:
+            data['twofa'] = twofa
+        json_ = self._call('POST', 'users/login.json', **data)
+        self._secret = json_['secret']
+        logger.info('Logged in as %s', json_['id'])
+        return json_['id']
+
+    def register(self, name):
+        """
+        Register a new Open Client device for the logged in user.
+
+        :param str name: The device's name, up to 25 letters, numbers, hyphens
+                         and underscores.
+        :return: The device's identifier.
+        :rtype: str
+        :raises ClientError: If the registration failed.
+        """
+        json_ = self._call('POST', 'devices.json', secret=self._secret,
+                           name=name, os=self._OS)
+        self._device_id = json_['id']
+        logger.info('Registered device %s', name)
+        return self._device_id
+
+    def download(self):
+        """
+        Retrieve all messages waiting for the device, without deleting them.
+
+        :return: The messages, oldest first.
+        :rtype: list(ReceivedMessage)
+        :raises ClientError: If the download failed.
+        """
+        json_ = self._call('GET', 'messages.json', secret=self._secret,
+                           device_id=self._device_id)
+        messages = [ReceivedMessage(message) for message in json_['messages']]
+        messages.sort(key=lambda message: message.id)
+        return messages
+
+    def delete(self, highest_id):
+        """
+        Delete all messages on the device up to and including an identifier,
+        with a single request.
+
+        :param int highest_id: The identifier of the newest message to
+                               delete.
+        :raises ClientError: If the deletion failed.
+        """
+        self._call('POST',
+                   'devices/{0}/update_highest_message.json'.format(
+                       self._device_id),
+                   secret=self._secret, message=highest_id)
+
+    def sync(self):
+        """
+        Download and delete all messages waiting for the device.
+
+        :return: The messages, oldest first.
+        :rtype: list(ReceivedMessage)
+        :raises ClientError: If a request failed.
+        """
+        messages = self.download()
+        if messages:
+            self.delete(messages[-1].id)
+            logger.debug('Synced %d messages', len(messages))
+        return messages
+
+    def _connect(self):
+        """
+        Open and log in to the WebSocket.
+
+        :return: The connected socket.
+        :rtype: WebSocket
+        """
+        socket = WebSocket(self._push, self._RECV_TIMEOUT)
+        socket.send('login:{0}:{1}\n'.format(self._device_id, self._secret))
+        with self._lock:
+            if self._stopped.is_set():
+                socket.close()
+                raise WebSocketError('Client stopped')
+            self._socket = socket
+        return socket
+
+    def _receive(self, socket, handler):
+        """
+        Process frames from a connected WebSocket until it must be reopened.
+
+        :param WebSocket socket: The connected socket.
+        :param callable handler: Called with each received message.
+        :raises ClientUnavailableError: If messages could not be synced.
+        :raises ClientError: If the device must log in or register again.
+        """
+        while True:
+            frame = socket.recv()
+            if frame == self._NEW_MESSAGE:
+                for message in self.sync():
+                    handler(message)
+            elif frame == self._RELOAD:
+                logger.info('Reconnecting at Pushover\'s request')
+                return
+            elif frame == self._ERROR:
+                raise ClientError(['Device login failed; log in and register '
+                                   'again'])
+            elif frame == self._SESSION_CLOSED:
+                raise ClientError(['Device logged in from another session'])
+            elif frame != self._KEEP_ALIVE:
+                logger.debug('Ignoring unknown frame %r', frame)
+
+    def listen(self, handler):
+        """
+        Receive messages until :meth:`stop()` is called, reconnecting with
+        backoff if the connection is lost.
+
+        :param callable handler: Called with each received message, oldest
+                                 first, on the calling thread.
+        :raises ClientError: If the device must log in or register again.
+                             Temporary failures, including
+                             :class:`ClientUnavailableError`, are retried.
+        """
+        self._stopped.clear()
+        transient = (WebSocketError, OSError, ClientUnavailableError)
+
+        @backoff.on_exception(backoff.expo,
+                              transient,
+                              max_value=self._MAX_RECONNECT_DELAY,
+                              giveup=lambda _: self._stopped.is_set())
+        def connect():
+            socket = self._connect()
+            try:
+                # catch up on messages received while disconnected
+                return socket, self.sync()
+            except BaseException:
+                socket.close()
+                raise
+
+        while not self._stopped.is_set():
+            try:
+                socket, messages = connect()
+            except transient:
+                return  # stopped while connecting
+            try:
+                for message in messages:
+                    handler(message)
+                self._receive(socket, handler)
+            except transient as e:
+                if not self._stopped.is_set():
+                    logger.warning('Lost connection: %s', e)
+            finally:
+                socket.close()
+
+    def stop(self):
+        """
+        Make :meth:`listen()` return. May be called from any thread.
+        """
+        with self._lock:
+            self._stopped.set()
+            if self._socket is not None:
+                self._socket.close()
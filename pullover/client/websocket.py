@@ -0,0 +1,206 @@
+import logging
+import base64
+import hashlib
+import os
+import socket
+import ssl
+import struct
+import urllib.parse
+
+from pullover.exceptions import PulloverError
+
+
+logger = logging.getLogger(__name__)
+
+
+class WebSocketError(PulloverError):
+    """
+    Raised if a WebSocket handshake fails, or the connection is closed.
+    """
+
+
+class WebSocket:
+    """
+    A minimal WebSocket client, as described by RFC 6455, supporting just
+    what the Open Client API needs: connecting, sending text frames and
+    receiving messages. Pings are answered transparently.
+
+    Instances are not thread-safe, except that :meth:`close()` may be called
+    from another thread to interrupt :meth:`recv()`.
+    """
+
+    # appended to the handshake key before hashing, per RFC 6455
+    _GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    _CONTINUATION = 0x0
+    _TEXT = 0x1
+    _BINARY = 0x2
+    _CLOSE = 0x8
+    _PING = 0x9
+    _PONG = 0xA
+
+    def __init__(self, url, timeout=None, headers=None):
+        """
+        Connect to a WebSocket server, completing the opening handshake.
+
+        :param str url: The ``ws://`` or ``wss://`` URL to connect to.
+        :param float timeout: The maximum number of seconds to wait for the
+                              connection, or for each read. Defaults to
+                              waiting indefinitely.
+        :param dict headers: Additional headers to send in the handshake.
+        :raises WebSocketError: If the server rejects the handshake.
+        :raises OSError: If the connection fails.
+        """
+        parsed = urllib.parse.urlsplit(url)
+        secure = parsed.scheme == 'wss'
+        host = parsed.hostname
+        port = parsed.port or (443 if secure else 80)
+
+        sock = socket.create_connection((host, port), timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(
+                sock, server_hostname=host)
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+        self._closed = False
+
+        key = base64.b64encode(os.urandom(16))
+        lines = [
+            'GET {0} HTTP/1.1'.format(parsed.path or '/'),
+            'Host: {0}'.format(parsed.netloc),
+            'Upgrade: websocket',
+            'Connection: Upgrade',
+            'Sec-WebSocket-Key: {0}'.format(key.decode('ascii')),
+            'Sec-WebSocket-Version: 13'
+        ]
+        lines.extend('{0}: {1}'.format(name, value)
+                     for name, value in (headers or {}).items())
+        self._sock.sendall(
+            ('\r\n'.join(lines) + '\r\n\r\n').encode('ascii'))
+
+        status = self._reader.readline().decode('latin-1')
+        response_headers = {}
+        while True:
+            line = self._reader.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        expected = base64.b64encode(
+            hashlib.sha1(key + self._GUID).digest()).decode('ascii')
+        if status.split(' ', 2)[1:2] != ['101'] or \
+                response_headers.get('sec-websocket-accept') != expected:
+            self.close()
+            raise WebSocketError('Handshake failed: {0}'.format(
+                status.strip()))
+        logger.debug('Connected to %s', url)
+
+    def _read(self, length):
+        """
+        Read exactly a number of bytes from the connection.
+
+        :param int length: The number of bytes.
+        :return: The bytes.
+        :rtype: bytes
+        :raises WebSocketError: If the connection was closed.
+        """
+        try:
+            data = self._reader.read(length)
+        except (OSError, ValueError) as e:
+            # ValueError if closed by another thread
+            raise WebSocketError('Connection closed: {0}'.format(e))
+        if len(data) < length:
+            raise WebSocketError('Connection closed')
+        return data
+
+    def _send_frame(self, opcode, payload):
+        """
+        Send a single, masked frame, as clients must.
+
+        :param int opcode: The frame's opcode.
+        :param bytes payload: The frame's payload.
+        """
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 1 << 16:
+            header.append(0x80 | 126)
+            header.extend(struct.pack('!H', length))
+        else:
+            header.append(0x80 | 127)
+            header.extend(struct.pack('!Q', length))
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self._sock.sendall(bytes(header) + mask + masked)
+
+    def _recv_frame(self):
+        """
+        Read a single frame.
+
+        :return: Whether the frame is final, its opcode and its payload.
+        :rtype: tuple(bool, int, bytes)
+        """
+        first, second = self._read(2)
+        length = second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', self._read(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', self._read(8))
+        mask = self._read(4) if second & 0x80 else None
+        payload = self._read(length)
+        if mask is not None:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def send(self, text):
+        """
+        Send a text message.
+
+        :param str text: The message.
+        """
+        self._send_frame(self._TEXT, text.encode('utf-8'))
+
+    def recv(self):
+        """
+        Wait for the next message.
+
+        :return: The message's payload. Text messages are not decoded.
+        :rtype: bytes
+        :raises WebSocketError: If the connection was closed.
+        """
+        fragments = []
+        while True:
+            final, opcode, payload = self._recv_frame()
+            if opcode == self._PING:
+                self._send_frame(self._PONG, payload)
+            elif opcode == self._CLOSE:
+                if not self._closed:
+                    self._send_frame(self._CLOSE, payload[:2])
+                    self.close()
+                raise WebSocketError('Connection closed by server')
+            elif opcode in (self._TEXT, self._BINARY, self._CONTINUATION):
+                fragments.append(payload)
+                if final:
+                    return b''.join(fragments)
+
+    def close(self):
+        """
+        Close the connection, without waiting for the server to acknowledge.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class AimdLimiter:
+    """
+    Limits the number of messages in flight at once, adjusting the limit
+    automatically using additive increase, multiplicative decrease (AIMD).
+
+    Each send that completes without a sign of congestion raises the limit
+    slightly, so it grows by about one per limit's worth of sends. A sign of
+    congestion cuts the limit by a constant factor. Congestion is indicated
+    by a 429 or 5xx response, a transport failure, latency well above the
+    usual, or the application nearing its monthly message limit. At most one
+    cut is made per typical round trip, so a burst of failures from the same
+    overloaded moment is treated as a single signal.
+
+    Concurrent send paths such as :class:`~pullover.Dispatcher` and
+    :class:`~pullover.sendqueue.SendQueue` accept a limiter, which may be
+    shared between them.
+    """
+
+    _DEFAULT_INITIAL = 4
+    _DEFAULT_MINIMUM = 1
+    _DEFAULT_MAXIMUM = 64
+
+    # weight given to each new latency sample in the baseline average
+    _BASELINE_WEIGHT = 0.1
+
+    def __init__(self, initial=_DEFAULT_INITIAL, minimum=_DEFAULT_MINIMUM,
+                 maximum=_DEFAULT_MAXIMUM, increase=1., decrease=0.5,
+                 tolerance=3., reserve=100, clock=time.monotonic):
+        """
+        Initialise a new limiter.
+
+        :param int initial: The initial limit. Defaults to 4.
+        :param int minimum: The lowest the limit can fall. Defaults to 1.
+        :param int maximum: The highest the limit can rise. Defaults to 64.
+        :param float increase: The amount to raise the limit by per limit's
+                               worth of successful sends. Defaults to 1.
+        :param float decrease: The factor to multiply the limit by on
+                               congestion. Defaults to 0.5.
+        :param float tolerance: How many times the baseline latency a send can
+                                take before it is considered congested.
+                                Defaults to 3.
+        :param int reserve: The number of remaining messages in the monthly
+                            limit below which to slow down. Defaults to 100.
+        :param callable clock: A function returning the current time in
+                               seconds. Defaults to the monotonic clock.
+        :raises ValueError: If the bounds are inconsistent.
+        """
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('Limits must satisfy 1 <= minimum <= initial <= '
+                             'maximum')
+
+        self._limit = float(initial)
+        self._minimum = minimum
+        self._maximum = maximum
+        self._increase = increase
+        self._decrease = decrease
+        self._tolerance = tolerance
+        self._reserve = reserve
+        self._clock = clock
+
+        self._in_flight = 0
+        self._baseline = None
+        self._last_decrease = None
+        self._cond = threading.Condition()
+
+        #: The number of times the limit has been cut.
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        """
+        :return: The current maximum number of messages in flight.
+        :rtype: int
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        """
+        :return: The number of messages currently in flight.
+        :rtype: int
+        """
+        return self._in_flight
+
+    def acquire(self, timeout=None):
+        """
+        Wait until another message can be sent, and count it as in flight.
+        Every successful call must be followed by :meth:`release()`.
+
+        :param float timeout: The maximum number of seconds to wait. Defaults
+                              to waiting indefinitely.
+        :return: True if the message can be sent, false if the timeout
+                 expired.
+        :rtype: bool
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                    lambda: self._in_flight < int(self._limit), timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    def _congested(self, response, latency):
+        """
+        Decide whether the outcome of a send indicates congestion.
+
+        :param SendResponse response: The result of the send, or None if it
+                                      raised.
+        :param float latency: The number of seconds the send took.
+        :return: True if it does, false otherwise.
+        :rtype: bool
+        """
+        if response is None or response.status is None:
+            return True
+        if response.http_status == 429 or response.http_status >= 500:
+            return True
+        if response.app_remaining is not None and \
+                response.app_remaining < self._reserve:
+            return True
+        return latency is not None and self._baseline is not None and \
+            latency > self._baseline * self._tolerance
+
+    def release(self, response=None, latency=None):
+        """
+        Record that a message is no longer in flight, and adjust the limit
+        based on how its send went.
+
+        :param SendResponse response: The result of the send, or None if it
+                                      raised.
+        :param float latency: The number of seconds the final request took,
+                              if known. This should exclude time spent
+                              waiting between retries, which would otherwise
+                              be mistaken for congestion.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if self._congested(response, latency):
+                now = self._clock()
+                # wait a typical round trip for the last cut to take effect
+                if self._last_decrease is None or \
+                        now - self._last_decrease >= (self._baseline or 0):
+                    self._limit = max(self._minimum,
+                                      self._limit * self._decrease)
+                    self._last_decrease = now
+                    self.decreases += 1
+                    logger.debug('Congestion; limit cut to %d', self.limit)
+            else:
+                if latency is not None:
+                    self._baseline = latency if self._baseline is None \
+                        else (1 - self._BASELINE_WEIGHT) * self._baseline + \
+                        self._BASELINE_WEIGHT * latency
+                self._limit = min(self._maximum,
+                                  self._limit + self._increase / self._limit)
+            self._cond.notify_all()
+
+    def send(self, prepared, **kwargs):
+        """
+        Send a prepared message once the limit allows, recording the outcome.
+        Latency is taken from the final request, not the whole send, so
+        retries are not mistaken for congestion.
+
+        :param PreparedMessage prepared: The prepared message to send.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`.
+        :return: The result of the send attempt.
+        :rtype: SendResponse
+        """
+        self.acquire()
+        response = None
+        try:
+            response = prepared.send(**kwargs)
+            return response
+        finally:
+            self.release(response,
+                         None if response is None else response.latency)
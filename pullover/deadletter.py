@@ -0,0 +1,268 @@
+import logging
+import datetime
+import json
+import os
+import threading
+
+from pullover import message
+from pullover.concurrency import AimdLimiter
+from pullover.dispatch import Dispatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetter:
+    """
+    A message that could not be sent, together with why.
+    """
+
+    def __init__(self, prepared, error, time):
+        """
+        Initialise a new dead letter.
+
+        :param PreparedMessage prepared: The message that could not be sent.
+        :param str error: The last error encountered sending it.
+        :param str time: When it failed, in ISO 8601 format.
+        """
+
+        #: The message that could not be sent.
+        self.prepared = prepared
+
+        #: The last error encountered sending it.
+        self.error = error
+
+        #: When it failed, in ISO 8601 format.
+        self.time = time
+
+
+class DeadLetterStore:
+    """
+    Records messages that could not be sent in a file, one JSON object per
+    line, so they can be replayed later with :func:`replay()` or
+    ``pullover --replay``. Note the file contains application tokens and user
+    keys.
+
+    Instances are thread-safe. To have every failed :meth:`Message.send()
+    <pullover.Message.send()>` recorded, install a store with
+    :func:`~pullover.deadletter.configure()`.
+    """
+
+    # suffix of the file holding dead letters while they are being replayed
+    _REPLAYING = '.replaying'
+
+    def __init__(self, path):
+        """
+        Initialise a new store.
+
+        :param str path: The file to store dead letters in. It is created when
+                         the first message is added.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        """
+        :return: The file dead letters are stored in.
+        :rtype: str
+        """
+        return self._path
+
+    def add(self, prepared, error):
+        """
+        Record a message that could not be sent.
+
+        :param PreparedMessage prepared: The message.
+        :param str error: The last error encountered sending it.
+        """
+        line = json.dumps({
+            'time': datetime.datetime.utcnow().isoformat() + 'Z',
+            'error': error,
+            'message': prepared.to_dict()
+        })
+        with self._lock, open(self._path, 'a') as f:
+            f.write(line + '\n')
+        logger.info('Recorded dead letter for %s: %s', prepared.message,
+                    error)
+
+    @staticmethod
+    def _read(path):
+        """
+        Stream dead letters from a file.
+
+        :param str path: The file.
+        :return: A generator of dead letters, skipping corrupt lines.
+        :rtype: generator(DeadLetter)
+        """
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                    yield DeadLetter(
+                        message.PreparedMessage.from_dict(record['message']),
+                        record['error'],
+                        record['time'])
+                except (ValueError, KeyError) as e:
+                    logger.warning('Skipping corrupt dead letter on line %d '
+                                   'of %s: %s', number, path, e)
+
+    def __iter__(self):
+        """
+        Stream the dead letters currently in the store, without removing
+        them.
+
+        :return: A generator of dead letters.
+        :rtype: generator(DeadLetter)
+        """
+        if os.path.exists(self._path):
+            yield from self._read(self._path)
+
+    def __len__(self):
+        """
+        Count the dead letters in the store, including any left over from an
+        interrupted :meth:`drain()`.
+
+        :return: The number of dead letters.
+        :rtype: int
+        """
+        total = 0
+        for path in (self._path, self._path + self._REPLAYING):
+            if os.path.exists(path):
+                with open(path) as f:
+                    total += sum(1 for _ in f)
+        return total
+
+    def _claim(self):
+        """
+        Set the dead letters in the store aside for replaying, so messages
+        added meanwhile are kept separately. Dead letters left over from an
+        interrupted replay are claimed first.
+
+        :return: The file holding the claimed dead letters, or None if there
+                 are none.
+        :rtype: str
+        """
+        replaying = self._path + self._REPLAYING
+        with self._lock:
+            if not os.path.exists(replaying):
+                if not os.path.exists(self._path):
+                    return None
+                os.replace(self._path, replaying)
+        return replaying
+
+    def drain(self):
+        """
+        Stream and remove the dead letters in the store. Messages added while
+        draining, e.g. because they failed again, are kept for next time.
+        If draining is interrupted, the remaining dead letters are returned by
+        the next call.
+
+        :return: A generator of dead letters.
+        :rtype: generator(DeadLetter)
+        """
+        replaying = self._claim()
+        if replaying is None:
+            return
+        yield from self._read(replaying)
+        os.remove(replaying)
+
+
+_default = None
+
+
+def default():
+    """
+    Retrieve the dead-letter store failed message sends are recorded in.
+
+    :return: The store, or None if failed messages are not recorded.
+    :rtype: DeadLetterStore
+    """
+    return _default
+
+
+def configure(store):
+    """
+    Set the dead-letter store failed message sends are recorded in.
+
+    :param DeadLetterStore store: The store, or None to stop recording.
+    """
+    global _default
+    _default = store
+
+
+def _retriable(response):
+    """
+    Decide whether a failed send is worth replaying again later.
+
+    :param SendResponse response: The result of the send.
+    :return: True if it is, false if it will never succeed.
+    :rtype: bool
+    """
+    return response.status is None or response.http_status == 429 or \
+        response.http_status >= 500
+
+
+def replay(store, workers=8, progress=None, **kwargs):
+    """
+    Send all dead letters in a store again, concurrently. Concurrency adapts to
+    Pushover's rate limiting and latency using an
+    :class:`~pullover.concurrency.AimdLimiter`, and at most a few messages per
+    worker are held in memory at once. Messages that fail in a way that may
+    succeed later are returned to the store; messages Pushover rejects
+    outright are dropped.
+
+    :param DeadLetterStore store: The store to replay.
+    :param int workers: The maximum number of messages to send concurrently.
+                        Defaults to 8.
+    :param callable progress: Called with the numbers of messages sent and
+                              failed so far each time a message completes.
+    :param kwargs: Additional parameters to pass to :meth:`Message.send()
+                   <pullover.Message.send()>`.
+    :return: The numbers of messages sent and failed.
+    :rtype: tuple(int, int)
+    """
+    # Message.send() already records failures in the default store
+    requeue = store is not default()
+    lock = threading.Lock()
+    outstanding = threading.BoundedSemaphore(workers * 4)
+    counts = [0, 0]  # sent, failed
+
+    def done(prepared, future):
+        try:
+            error = future.exception()
+            response = None if error is not None else future.result()
+            if response is not None and response.ok:
+                index = 0
+            else:
+                index = 1
+                if response is not None and not _retriable(response):
+                    logger.warning('Dropping dead letter %s: %s',
+                                   prepared.message, response.errors)
+                elif requeue:
+                    store.add(prepared, str(error) if response is None
+                              else '; '.join(response.errors) or
+                              'HTTP {0}'.format(response.http_status))
+            with lock:
+                counts[index] += 1
+                sent, failed = counts
+            if progress is not None:
+                progress(sent, failed)
+        finally:
+            outstanding.release()
+
+    replaying = store._claim()
+    if replaying is None:
+        return tuple(counts)
+    limiter = AimdLimiter(initial=min(4, workers), maximum=workers)
+    with Dispatcher(workers, limiter=limiter, **kwargs) as dispatcher:
+        for letter in store._read(replaying):
+            outstanding.acquire()
+            future = dispatcher.submit(letter.prepared)
+            future.add_done_callback(
+                lambda f, prepared=letter.prepared: done(prepared, f))
+    # every message has now been sent, dropped or recorded again; if the
+    # process dies before this, the next replay sends the rest, at the cost of
+    # repeating some
+    os.remove(replaying)
+    return tuple(counts)
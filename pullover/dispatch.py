@@ -0,0 +1,196 @@
+import logging
+import collections
+import threading
+import queue
+import concurrent.futures
+
+from pullover import message, tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    """
+    Sends prepared messages concurrently, while guaranteeing that messages
+    from an application to a user are sent in the order they were submitted.
+
+    Each (application, user) pair has its own first-in, first-out lane. A
+    bounded pool of worker threads takes turns sending the message at the head
+    of each lane, so at most one message per lane is ever in flight, while
+    messages to different users are sent in parallel. Lanes are served
+    round-robin, so one busy user cannot starve the others.
+
+    Consecutive messages in a lane that differ only in the devices they target
+    are combined into a single request.
+    """
+
+    _DEFAULT_WORKERS = 8
+
+    # placed on the ready queue to stop a worker
+    _STOP = object()
+
+    def __init__(self, workers=_DEFAULT_WORKERS, limiter=None, **kwargs):
+        """
+        Initialise a new dispatcher, starting its worker threads.
+
+        :param int workers: The maximum number of messages to send
+                            concurrently. Defaults to 8.
+        :param AimdLimiter limiter: Adapts the number of messages sent
+                                    concurrently, up to the number of workers,
+                                    to what Pushover can sustain. Defaults to
+                                    always using every worker.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>` for
+                       every message.
+        :raises ValueError: If fewer than one worker is requested.
+        """
+        if workers < 1:
+            raise ValueError('A dispatcher needs at least one worker')
+
+        self._limiter = limiter
+        self._kwargs = kwargs
+
+        # lane key -> deque of (prepared message, future, tracing context); a
+        # key is on the ready queue at most once, and only while no worker is
+        # sending from its lane
+        self._lanes = {}
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stopping = False
+
+        self._workers = [
+            threading.Thread(target=self._work,
+                             name='pullover-dispatch-{0}'.format(i),
+                             daemon=True)
+            for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    @staticmethod
+    def _key(prepared):
+        """
+        Find the lane a prepared message belongs in.
+
+        :param PreparedMessage prepared: The prepared message.
+        :return: The lane key.
+        :rtype: tuple
+        """
+        return prepared.application, prepared.user.key
+
+    def submit(self, prepared):
+        """
+        Queue a prepared message for sending. It will be sent after all
+        messages previously submitted from the same application to the same
+        user.
+
+        :param PreparedMessage prepared: The prepared message to send.
+        :return: A future that resolves to the result of the send attempt.
+        :rtype: concurrent.futures.Future
+        :raises RuntimeError: If the dispatcher has been shut down.
+        """
+        future = concurrent.futures.Future()
+        key = self._key(prepared)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Cannot submit to a dispatcher that has '
+                                   'been shut down')
+            item = (prepared, future, tracing.capture())
+            lane = self._lanes.get(key)
+            if lane is None:
+                self._lanes[key] = collections.deque([item])
+                self._ready.put(key)
+            else:
+                lane.append(item)
+        return future
+
+    def _send(self, batch):
+        """
+        Send messages from the head of a lane as a single request, resolving
+        their futures. The request is traced in the context of the first.
+
+        :param list(tuple) batch: Prepared messages differing only by disjoint
+                                  sets of devices, their futures and tracing
+                                  contexts.
+        """
+        batch = [item for item in batch
+                 if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        prepared = message.merge(item[0] for item in batch)[0]
+        context = batch[0][2]
+        try:
+            if self._limiter is None:
+                response = tracing.run(context, prepared.send,
+                                       **self._kwargs)
+            else:
+                response = tracing.run(context, self._limiter.send, prepared,
+                                       **self._kwargs)
+        except BaseException as e:
+            logger.exception('Failed to send %s', prepared.message)
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for _, future, _ in batch:
+                future.set_result(response)
+
+    def _stop_workers(self):
+        """
+        Tell every worker to exit. Must be called with the lock held, once the
+        dispatcher is closed and all lanes are empty.
+        """
+        if not self._stopping:
+            self._stopping = True
+            for _ in self._workers:
+                self._ready.put(self._STOP)
+
+    def _work(self):
+        """
+        The main loop of each worker thread.
+        """
+        while True:
+            key = self._ready.get()
+            if key is self._STOP:
+                return
+
+            with self._lock:
+                lane = self._lanes[key]
+                batch = [lane.popleft()]
+                merge_key = batch[0][0]._merge_key()
+                devices = set(batch[0][0].user.devices or ())
+                while devices and lane and \
+                        lane[0][0]._merge_key() == merge_key and \
+                        message._disjoint(devices, lane[0][0]):
+                    devices.update(lane[0][0].user.devices)
+                    batch.append(lane.popleft())
+            self._send(batch)
+            with self._lock:
+                if self._lanes[key]:
+                    self._ready.put(key)  # back of the queue, for fairness
+                else:
+                    del self._lanes[key]
+                    if self._closed and not self._lanes:
+                        self._stop_workers()
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting new messages. Messages already submitted will still be
+        sent.
+
+        :param bool wait: Whether to block until all submitted messages have
+                          been sent. Defaults to true.
+        """
+        with self._lock:
+            self._closed = True
+            if not self._lanes:
+                self._stop_workers()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
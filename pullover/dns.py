@@ -0,0 +1,253 @@
+import logging
+import errno
+import itertools
+import selectors
+import socket
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def _getaddrinfo(host, port):
+    """
+    Resolve a host with the system resolver.
+
+    :param str host: The host name.
+    :param int port: The port.
+    :return: The addresses, as returned by :func:`socket.getaddrinfo`, and
+             None, as the system resolver does not report TTLs.
+    :rtype: tuple(list, None)
+    """
+    return socket.getaddrinfo(host, port, type=socket.SOCK_STREAM), None
+
+
+def _interleave(addresses):
+    """
+    Order addresses for connection attempts so address families alternate,
+    starting with the resolver's first preference, as recommended by
+    RFC 8305.
+
+    :param list addresses: Addresses from :func:`socket.getaddrinfo`.
+    :return: The reordered addresses.
+    :rtype: list
+    """
+    families = {}
+    for address in addresses:
+        families.setdefault(address[0], []).append(address)
+    return [address
+            for group in itertools.zip_longest(*families.values())
+            for address in group if address is not None]
+
+
+class DnsCache:
+    """
+    Caches host name resolutions, so opening a connection does not wait for
+    the resolver, and races connections to a host's addresses.
+
+    An entry's time-to-live is the one reported by the resolver, clamped to a
+    floor and ceiling. Once most of it has passed, the entry is refreshed in
+    the background; until the refresh completes, or if it fails, the existing
+    addresses continue to be used. Only the first resolution of a host
+    blocks.
+
+    Connections are attempted "happy eyeballs" style (RFC 8305): if the first
+    address has not connected within a short delay, the next is tried in
+    parallel, alternating between IPv6 and IPv4, and the first to connect
+    is used.
+
+    Instances are thread-safe.
+    """
+
+    _DEFAULT_MIN_TTL = 30.
+    _DEFAULT_MAX_TTL = 600.
+
+    # used when the resolver does not report a TTL
+    _DEFAULT_TTL = 60.
+
+    # fraction of an entry's TTL after which it is refreshed in the background
+    _REFRESH_AHEAD = 0.75
+
+    # seconds to wait for a connection attempt before starting the next, as
+    # recommended by RFC 8305
+    _DEFAULT_ATTEMPT_DELAY = 0.25
+
+    def __init__(self, min_ttl=_DEFAULT_MIN_TTL, max_ttl=_DEFAULT_MAX_TTL,
+                 attempt_delay=_DEFAULT_ATTEMPT_DELAY, resolver=_getaddrinfo,
+                 clock=time.monotonic):
+        """
+        Initialise a new, empty cache.
+
+        :param float min_ttl: The minimum number of seconds to use an entry
+                              for before refreshing it. Defaults to 30s.
+        :param float max_ttl: The maximum number of seconds to use an entry
+                              for before refreshing it. Defaults to 10 minutes.
+        :param float attempt_delay: The number of seconds to wait for a
+                                    connection attempt before also trying the
+                                    next address. Defaults to 250ms.
+        :param callable resolver: A function taking a host and port, and
+                                  returning addresses as from
+                                  :func:`socket.getaddrinfo` and a TTL in
+                                  seconds, or None if unknown. Defaults to the
+                                  system resolver, which does not report TTLs;
+                                  60s is assumed.
+        :param callable clock: A function returning the current time in
+                               seconds. Defaults to the monotonic clock.
+        """
+        self._min_ttl = min_ttl
+        self._max_ttl = max_ttl
+        self._attempt_delay = attempt_delay
+        self._resolver = resolver
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        # (host, port) -> (addresses, resolved at, ttl)
+        self._entries = {}
+
+        # (host, port) keys being refreshed
+        self._refreshing = set()
+
+    def _resolve(self, key):
+        """
+        Resolve a host and store the result.
+
+        :param tuple(str, int) key: The host and port.
+        :return: The addresses.
+        :rtype: list
+        :raises socket.gaierror: If resolution failed.
+        """
+        addresses, ttl = self._resolver(*key)
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME,
+                                  'No addresses for {0}'.format(key[0]))
+        ttl = min(self._max_ttl, max(
+            self._min_ttl, self._DEFAULT_TTL if ttl is None else ttl))
+        addresses = _interleave(addresses)
+        with self._lock:
+            self._entries[key] = (addresses, self._clock(), ttl)
+        logger.debug('Resolved %s to %d addresses for %ds', key[0],
+                     len(addresses), ttl)
+        return addresses
+
+    def _refresh(self, key):
+        """
+        Resolve a host again in the background, keeping the existing entry if
+        resolution fails.
+
+        :param tuple(str, int) key: The host and port.
+        """
+        try:
+            self._resolve(key)
+        except OSError as e:
+            logger.warning('Failed to refresh %s; keeping previous addresses: '
+                           '%s', key[0], e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def resolve(self, host, port):
+        """
+        Find a host's addresses, without waiting for the resolver unless the
+        host has never been resolved.
+
+        :param str host: The host name.
+        :param int port: The port.
+        :return: The addresses, as from :func:`socket.getaddrinfo`, in the
+                 order to try them.
+        :rtype: list
+        :raises socket.gaierror: If the host has not been resolved before,
+                                 and resolution failed.
+        """
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                addresses, resolved, ttl = entry
+                if self._clock() - resolved >= ttl * self._REFRESH_AHEAD \
+                        and key not in self._refreshing:
+                    self._refreshing.add(key)
+                    threading.Thread(target=self._refresh, args=(key,),
+                                     name='pullover-dns',
+                                     daemon=True).start()
+                return addresses
+        return self._resolve(key)
+
+    def connect(self, host, port, timeout=None, source_address=None,
+                socket_options=None):
+        """
+        Open a TCP connection to a host, racing its addresses.
+
+        :param str host: The host name.
+        :param int port: The port.
+        :param float timeout: The number of seconds to allow for connecting,
+                              which is also set on the returned socket.
+                              Defaults to no limit.
+        :param tuple source_address: An address to bind to before connecting.
+        :param list socket_options: ``(level, option, value)`` tuples to set on
+                                    each socket.
+        :return: The connected socket.
+        :rtype: socket.socket
+        :raises socket.timeout: If no address connected in time.
+        :raises OSError: If every address failed.
+        """
+        remaining = list(self.resolve(host, port))
+        deadline = None if timeout is None else self._clock() + timeout
+        selector = selectors.DefaultSelector()
+        error = None
+        next_attempt = self._clock()
+        try:
+            while True:
+                now = self._clock()
+                if remaining and (not selector.get_map() or
+                                  now >= next_attempt):
+                    family, type_, proto, _, sockaddr = remaining.pop(0)
+                    sock = socket.socket(family, type_, proto)
+                    try:
+                        for option in socket_options or ():
+                            sock.setsockopt(*option)
+                        if source_address:
+                            sock.bind(source_address)
+                        sock.setblocking(False)
+                        result = sock.connect_ex(sockaddr)
+                    except OSError as e:
+                        sock.close()
+                        error = e
+                        continue
+                    if result == 0:
+                        sock.settimeout(timeout)
+                        return sock
+                    if result not in (errno.EINPROGRESS, errno.EWOULDBLOCK,
+                                      errno.EAGAIN):
+                        sock.close()
+                        error = OSError(result, 'Failed to connect to '
+                                        '{0}'.format(sockaddr[0]))
+                        continue
+                    selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                    next_attempt = now + self._attempt_delay
+                    continue
+
+                if not selector.get_map():
+                    raise error or OSError('No addresses for {0}'.format(host))
+                if deadline is not None and now >= deadline:
+                    raise socket.timeout('Timed out connecting to '
+                                         '{0}'.format(host))
+                waits = [deadline - now if deadline is not None else None,
+                         next_attempt - now if remaining else None]
+                waits = [wait for wait in waits if wait is not None]
+                for key, _ in selector.select(min(waits) if waits else None):
+                    sock = key.fileobj
+                    selector.unregister(sock)
+                    result = sock.getsockopt(socket.SOL_SOCKET,
+                                             socket.SO_ERROR)
+                    if result == 0:
+                        sock.settimeout(timeout)
+                        return sock
+                    sock.close()
+                    error = OSError(result, 'Failed to connect to '
+                                    '{0}'.format(key.data[0]))
+                    next_attempt = now  # try the next address straight away
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
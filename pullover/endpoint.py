@@ -0,0 +1,364 @@
+import logging
+import threading
+import backoff
+import requests
+
+import pullover
+from pullover import retry, tracing, transport
+from pullover.exceptions import PulloverError
+from pullover.timeout import AdaptiveTimeout
+
+
+logger = logging.getLogger(__name__)
+
+#: The root of Pushover's API.
+ROOT = 'https://api.pushover.net/1/'
+
+
+class ApiError(PulloverError):
+    """
+    Raised if Pushover rejects a request made with :func:`validate()` or
+    :func:`fetch_limits()`, or cannot be reached.
+    """
+
+    def __init__(self, errors):
+        """
+        Initialise a new error.
+
+        :param list(str) errors: A list of textual errors.
+        """
+        super(ApiError, self).__init__(errors)
+
+        #: A list of textual errors
+        self.errors = errors
+
+
+class Limits:
+    """
+    An application's monthly message allowance, as last reported by Pushover.
+    """
+
+    def __init__(self, limit, remaining, reset):
+        """
+        :param int limit: The number of messages the application may send per
+                          month.
+        :param int remaining: The number of messages it may still send this
+                              month.
+        :param int reset: When the allowance resets, in seconds since the
+                          epoch.
+        """
+        #: The number of messages the application may send per month.
+        self.limit = limit
+
+        #: The number of messages it may still send this month.
+        self.remaining = remaining
+
+        #: When the allowance resets, in seconds since the epoch.
+        self.reset = reset
+
+    def __str__(self):
+        return '{0.__class__.__name__}({0.remaining}/{0.limit})'.format(self)
+
+
+# application -> Limits, from the headers of the latest response
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def _record_limits(application, response):
+    """
+    Remember the allowance reported in a response's headers, if any.
+
+    :param Application application: The application the request was made for.
+    :param response: The response.
+    """
+    try:
+        limits = Limits(int(response.headers['X-Limit-App-Limit']),
+                        int(response.headers['X-Limit-App-Remaining']),
+                        int(response.headers['X-Limit-App-Reset']))
+    except (KeyError, ValueError):
+        return
+    with _limits_lock:
+        _limits[application] = limits
+
+
+class Endpoint:
+    """
+    A Pushover API endpoint. Every endpoint sends requests with the transport
+    returned by :func:`pullover.transport.default()`, and so shares its
+    connection pool, and applies the same retry policy, rate-limit tracking
+    and tracing.
+    """
+
+    _DEFAULT_TIMEOUT = 3
+
+    def __init__(self, path, method='POST', root=ROOT):
+        """
+        Initialise a new endpoint.
+
+        :param str path: The path relative to the API root, with
+                         :meth:`str.format` placeholders for parameters, e.g.
+                         ``'receipts/{receipt}.json'``.
+        :param str method: The HTTP method. Defaults to POST.
+        :param str root: The API root. Defaults to Pushover's.
+        """
+        self.path = path
+        self.method = method
+        self.root = root
+
+    def url(self, **params):
+        """
+        Find the URL of this endpoint.
+
+        :param params: Values for the path's placeholders.
+        :return: The URL.
+        :rtype: str
+        """
+        return self.root + self.path.format(**params)
+
+    def request(self, application=None, user=None, data=None, **params):
+        """
+        Build a signed request to this endpoint. For GET endpoints, the
+        parameters are sent in the query string.
+
+        :param Application application: The application to sign the request
+                                        with, if any.
+        :param User user: The user to sign the request with, if any.
+        :param dict data: Other parameters to send.
+        :param params: Values for the path's placeholders.
+        :return: The request.
+        :rtype: requests.Request
+        """
+        request = requests.Request(
+            self.method,
+            self.url(**params),
+            headers={
+                'User-Agent': '{0}/{1}'.format(pullover.__title__,
+                                               pullover.__version__)
+            },
+            data=dict(data or {}))
+        if application is not None:
+            application.sign(request)
+        if user is not None:
+            user.sign(request)
+        if self.method == 'GET':
+            request.params, request.data = request.data, {}
+        return request
+
+    def send(self, request, application=None, timeout=_DEFAULT_TIMEOUT,
+             retry_interval=5, max_tries=1):
+        """
+        Send a request to this endpoint, retrying timeouts and server errors
+        at a constant interval. Retries are subject to the process-wide
+        :class:`~pullover.retry.RetryBudget`.
+
+        :param requests.Request request: The request, e.g. from
+                                         :meth:`request()`.
+        :param Application application: The application the request is for,
+                                        whose allowance to track from the
+                                        response.
+        :param timeout: The number of seconds to allow for each attempt, or an
+                        :class:`~pullover.timeout.AdaptiveTimeout`. Defaults
+                        to 3s.
+        :type timeout: float or AdaptiveTimeout
+        :param float retry_interval: The number of seconds to wait between
+                                     attempts. Defaults to 5s.
+        :param int max_tries: The number of attempts to make before giving up.
+                              Defaults to 1.
+        :return: The final response, and the number of attempts made.
+        :rtype: tuple(requests.Response, int)
+        :raises requests.Timeout: If the final attempt timed out.
+        :raises requests.RequestException: If a request failed otherwise.
+        """
+        adaptive = isinstance(timeout, AdaptiveTimeout)
+        budget = retry.default() if max_tries > 1 else None
+        timed_out = None
+        tries = 0
+
+        # the span of the current wait between attempts, if any
+        waiting = None
+
+        def should_retry(resp):
+            """
+            Decides whether to retry a request given a response.
+
+            :param requests.Response resp: The response to analyse, or None if
+                                           the request timed out.
+            :return: True if the original request should be retried; false
+                     otherwise.
+            :rtype: bool
+            """
+            if resp is not None and \
+                    (resp.ok or 400 <= resp.status_code < 500):
+                return False
+            if tries >= max_tries:
+                return True  # backoff gives up without another attempt
+            if budget is not None and not budget.withdraw():
+                logger.warning('Retry budget exhausted; giving up')
+                return False
+            return True
+
+        def on_backoff(details):
+            """
+            Starts the span covering a wait between attempts.
+
+            :param dict details: The wait's details, from backoff.
+            """
+            nonlocal waiting
+            waiting = tracing.span('pullover.backoff',
+                                   {'pullover.wait': details['wait']})
+            waiting.__enter__()
+
+        @backoff.on_predicate(backoff.constant,
+                              should_retry,
+                              max_tries=max_tries,
+                              interval=retry_interval,
+                              on_backoff=on_backoff)
+        def send_request(sender, prepped):
+            """
+            Sends a request to Pushover.
+
+            :param Transport sender: The transport to send the request with.
+            :param prepped: The request to send, prepared by the transport.
+            :return: The request response, or None if it timed out.
+            :rtype: requests.Response
+            """
+            nonlocal timed_out, tries, waiting
+            if waiting is not None:
+                waiting.__exit__(None, None, None)
+                waiting = None
+            tries += 1
+            attempt_timeout = timeout.current() if adaptive else timeout
+            with tracing.span('pullover.attempt',
+                              {'pullover.attempt': tries,
+                               'pullover.endpoint': self.path}) as span:
+                try:
+                    resp = sender.send(prepped, attempt_timeout)
+                except requests.Timeout as e:
+                    logger.warning('Request timed out after %fs',
+                                   attempt_timeout)
+                    span.set_attribute('pullover.timed_out', True)
+                    if adaptive:
+                        timeout.expired()
+                    timed_out = e
+                    return None
+                span.set_attribute('http.status_code', resp.status_code)
+            if adaptive:
+                timeout.observe(resp.elapsed.total_seconds())
+            return resp
+
+        sender = transport.default()
+        with tracing.span('pullover.encode'):
+            prepared = sender.prepare(request)
+        if budget is not None:
+            budget.deposit()
+        response = send_request(sender, prepared)
+        if response is None:
+            raise timed_out
+        logger.debug('Request time: %fs', response.elapsed.total_seconds())
+        if application is not None:
+            _record_limits(application, response)
+        return response, tries
+
+    def call(self, application=None, user=None, data=None,
+             timeout=_DEFAULT_TIMEOUT, **params):
+        """
+        Build and send a request to this endpoint, with a single attempt.
+
+        :param Application application: The application to sign the request
+                                        with, if any.
+        :param User user: The user to sign the request with, if any.
+        :param dict data: Other parameters to send.
+        :param float timeout: The number of seconds to allow for the request.
+                              Defaults to 3s.
+        :param params: Values for the path's placeholders.
+        :return: The response.
+        :rtype: requests.Response
+        :raises requests.RequestException: If the request failed.
+        """
+        return self.send(self.request(application, user, data, **params),
+                         application, timeout)[0]
+
+    def __str__(self):
+        return '{0.__class__.__name__}({0.method} {0.path})'.format(self)
+
+
+MESSAGES = Endpoint('messages.json')
+VALIDATE = Endpoint('users/validate.json')
+RECEIPT = Endpoint('receipts/{receipt}.json', 'GET')
+CANCEL_RECEIPT = Endpoint('receipts/{receipt}/cancel.json')
+CANCEL_BY_TAG = Endpoint('receipts/cancel_by_tag/{tag}.json')
+CREATE_GROUP = Endpoint('groups.json')
+GROUP_ADD_USER = Endpoint('groups/{group}/add_user.json')
+GROUP_DELETE_USER = Endpoint('groups/{group}/delete_user.json')
+LIMITS = Endpoint('apps/limits.json', 'GET')
+SOUNDS = Endpoint('sounds.json', 'GET')
+GLANCES = Endpoint('glances.json')
+
+
+def _json(response):
+    """
+    Decode a response to a request that should have succeeded.
+
+    :param requests.Response response: The response.
+    :return: The decoded response.
+    :rtype: dict
+    :raises ApiError: If the response indicates failure.
+    """
+    try:
+        json_ = response.json()
+    except ValueError as e:
+        raise ApiError([str(e)])
+    if json_.get('status') != 1:
+        raise ApiError(json_.get('errors', []))
+    return json_
+
+
+def validate(application, user):
+    """
+    Check that a user key, and any devices it targets, are valid.
+
+    :param Application application: The application making the request.
+    :param User user: The user to check.
+    :return: The names of the user's active devices.
+    :rtype: list(str)
+    :raises ApiError: If the user or a device is invalid, or the request
+                      failed.
+    """
+    try:
+        return _json(VALIDATE.call(application, user)).get('devices', [])
+    except requests.RequestException as e:
+        raise ApiError([str(e)])
+
+
+def limits(application):
+    """
+    Find an application's monthly message allowance, as reported in the
+    headers of the latest response to a request it made, without making a
+    request.
+
+    :param Application application: The application.
+    :return: The allowance, or None if no response has reported it.
+    :rtype: Limits
+    """
+    with _limits_lock:
+        return _limits.get(application)
+
+
+def fetch_limits(application):
+    """
+    Ask Pushover for an application's monthly message allowance.
+
+    :param Application application: The application.
+    :return: The allowance.
+    :rtype: Limits
+    :raises ApiError: If the request failed.
+    """
+    try:
+        json_ = _json(LIMITS.call(application))
+    except requests.RequestException as e:
+        raise ApiError([str(e)])
+    result = Limits(json_['limit'], json_['remaining'], json_['reset'])
+    with _limits_lock:
+        _limits[application] = result
+    return result
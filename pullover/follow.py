@@ -0,0 +1,307 @@
+import logging
+import os
+import re
+import time
+import requests
+
+from pullover.message import Message
+from pullover.ratelimit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+class LineReader:
+    """
+    Reads lines appended to a file, like ``tail -F``. The file is read in
+    large chunks from where the last read stopped, and is reopened when it is
+    rotated, i.e. replaced by a new file at the same path, or truncated.
+    """
+
+    _CHUNK_SIZE = 64 * 1024
+
+    # an unterminated line longer than this is returned as-is
+    _MAX_LINE = 1024 * 1024
+
+    def __init__(self, path, from_end=True):
+        """
+        Initialise a new reader. The file need not exist yet.
+
+        :param str path: The file to follow.
+        :param bool from_end: Whether to ignore the file's existing contents.
+                              Defaults to true. A file created later,
+                              including after a rotation, is read from the
+                              start.
+        """
+        self._path = path
+        self._from_end = from_end
+        self._file = None
+        self._partial = b''
+        if not self._open():
+            # anything written once it exists is new
+            self._from_end = False
+
+    def _open(self):
+        """
+        Open the file at the path, if it exists.
+
+        :return: True if it was opened.
+        :rtype: bool
+        """
+        try:
+            self._file = open(self._path, 'rb')
+        except FileNotFoundError:
+            return False
+        if self._from_end:
+            self._file.seek(0, os.SEEK_END)
+            self._from_end = False
+        logger.debug('Following %s from offset %d', self._path,
+                     self._file.tell())
+        return True
+
+    def _rotated(self):
+        """
+        Check whether the open file has been replaced or truncated, seeking
+        to the start if it was truncated.
+
+        :return: True if a different file now exists at the path.
+        :rtype: bool
+        """
+        try:
+            current = os.stat(self._path)
+        except FileNotFoundError:
+            return False  # mid-rotation; keep the old file until it appears
+        opened = os.fstat(self._file.fileno())
+        if (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            return True
+        if current.st_size < self._file.tell():
+            logger.info('%s was truncated', self._path)
+            self._file.seek(0)
+            self._partial = b''
+        return False
+
+    def read(self):
+        """
+        Read the complete lines appended since the last call, without
+        blocking.
+
+        :return: The lines, without line endings.
+        :rtype: list(str)
+        """
+        if self._file is None and not self._open():
+            return []
+
+        chunks = []
+        while True:
+            chunk = self._file.read(self._CHUNK_SIZE)
+            if chunk:
+                chunks.append(chunk)
+                continue
+            if not self._rotated():
+                break
+            logger.info('%s was rotated; reopening', self._path)
+            self._file.close()
+            self._file = None
+            if self._partial or chunks:
+                chunks.append(b'\n')  # the old file's last line is complete
+            if not self._open():
+                break
+
+        if not chunks:
+            return []
+        data = self._partial + b''.join(chunks)
+        lines = data.split(b'\n')
+        self._partial = lines.pop()
+        if len(self._partial) > self._MAX_LINE:
+            lines.append(self._partial)
+            self._partial = b''
+        return [line.rstrip(b'\r').decode('utf-8', 'replace')
+                for line in lines]
+
+    def close(self):
+        """
+        Close the file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Follower:
+    """
+    Sends a message when lines matching any of a set of regular expressions
+    are appended to a file.
+
+    Matches arriving within a short window of each other are sent as a single
+    message, and messages are rate limited: while the limit is reached,
+    further matches are added to the pending message rather than dropped or
+    sent separately. All messages are sent over the shared, pre-opened
+    connection pool.
+    """
+
+    _DEFAULT_WINDOW = 2.
+    _DEFAULT_RATE = 6.
+    _DEFAULT_BURST = 3
+
+    # lines kept for the body of a single message; further matches are only
+    # counted
+    _MAX_LINES = 50
+
+    _MAX_BODY = 1024
+
+    def __init__(self, path, patterns, application, user, title=None,
+                 priority=Message.NORMAL, window=_DEFAULT_WINDOW,
+                 rate=_DEFAULT_RATE, burst=_DEFAULT_BURST, from_end=True,
+                 clock=time.monotonic):
+        """
+        Initialise a new follower.
+
+        :param str path: The file to follow.
+        :param list(str) patterns: Regular expressions, any of which a line
+                                   must contain to be sent.
+        :param Application application: The application to send messages
+                                        from.
+        :param User user: The user to send messages to.
+        :param str title: The message heading. Defaults to the file's name.
+        :param int priority: The message priority. Emergency priority is not
+                             supported.
+        :param float window: The number of seconds to wait after a match for
+                             others to send with it. Defaults to 2s.
+        :param float rate: The maximum sustained number of messages per
+                           minute. Defaults to 6.
+        :param int burst: The maximum number of messages to send in quick
+                          succession. Defaults to 3.
+        :param bool from_end: Whether to ignore the file's existing contents.
+                              Defaults to true.
+        :param callable clock: A function returning the current time in
+                               seconds. Defaults to the monotonic clock.
+        :raises ValueError: If a pattern is invalid, there are no patterns,
+                            or the priority is emergency.
+        """
+        if not patterns:
+            raise ValueError('At least one pattern is required')
+        if priority == Message.EMERGENCY:
+            raise ValueError('Emergency priority is not supported when '
+                             'following a file')
+        try:
+            self._patterns = [re.compile(pattern) for pattern in patterns]
+        except re.error as e:
+            raise ValueError('Invalid pattern: {0}'.format(e))
+
+        self._reader = LineReader(path, from_end)
+        self._application = application
+        self._user = user
+        self._title = title or os.path.basename(path)
+        self._priority = priority
+        self._window = window
+        self._clock = clock
+        self._bucket = TokenBucket(rate / 60., burst, clock)
+
+        # matching lines not yet sent, the number of matches they represent,
+        # and when the first was seen
+        self._pending = []
+        self._matches = 0
+        self._first_match = None
+
+        #: The number of matching lines seen.
+        self.matched = 0
+
+        #: The number of messages sent.
+        self.sent = 0
+
+    def _match(self, line):
+        return any(pattern.search(line) for pattern in self._patterns)
+
+    def _body(self):
+        """
+        Build the body of a message from the pending lines.
+
+        :return: The body.
+        :rtype: str
+        """
+        body = '\n'.join(self._pending)
+        if self._matches > len(self._pending):
+            body += '\n… and {0} more'.format(
+                self._matches - len(self._pending))
+        if len(body) > self._MAX_BODY:
+            body = body[:self._MAX_BODY - 1] + '…'
+        return body
+
+    def _send(self):
+        """
+        Send the pending lines as one message.
+        """
+        title = self._title if self._matches == 1 else \
+            '{0}: {1} matches'.format(self._title, self._matches)
+        message = Message(self._body(), title, priority=self._priority)
+        self._pending, self._matches, self._first_match = [], 0, None
+        try:
+            response = message.send(self._application, self._user)
+        except requests.RequestException as e:
+            logger.warning('Failed to send %s: %s', message, e)
+            return
+        self.sent += 1
+        if not response.ok:
+            logger.warning('Failed to send %s: %s', message, response.errors)
+
+    def poll(self):
+        """
+        Read newly appended lines, and send the pending message if it is due.
+
+        :return: The number of seconds until the pending message is due, or
+                 None if there is none.
+        :rtype: float
+        """
+        for line in self._reader.read():
+            if not self._match(line):
+                continue
+            self.matched += 1
+            self._matches += 1
+            if len(self._pending) < self._MAX_LINES:
+                self._pending.append(line)
+            if self._first_match is None:
+                self._first_match = self._clock()
+
+        if self._first_match is None:
+            return None
+        wait = self._first_match + self._window - self._clock()
+        if wait <= 0:
+            wait = self._bucket.delay()
+            if wait <= 0 and self._bucket.take():
+                self._send()
+                return None
+        return wait
+
+    def flush(self):
+        """
+        Send any pending lines now, regardless of the window and rate limit.
+        """
+        if self._matches:
+            self._send()
+
+    def run(self, poll_interval=0.5, stop=None):
+        """
+        Follow the file until interrupted.
+
+        :param float poll_interval: The number of seconds to wait between
+                                    reads when the file is idle. Defaults to
+                                    0.5s.
+        :param threading.Event stop: An event to set to stop following.
+                                     Defaults to following until
+                                     :exc:`KeyboardInterrupt`.
+        """
+        Message.warmup()
+        try:
+            while stop is None or not stop.is_set():
+                wait = self.poll()
+                delay = poll_interval if wait is None else \
+                    min(poll_interval, wait)
+                if stop is None:
+                    time.sleep(delay)
+                else:
+                    stop.wait(delay)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.flush()
+            self._reader.close()
@@ -0,0 +1,276 @@
+import logging
+import threading
+import time
+import requests
+
+from pullover import endpoint
+from pullover.message import SendResponse
+
+
+logger = logging.getLogger(__name__)
+
+
+class Glance:
+    """
+    Represents an update to the small widgets Pushover shows on watches and
+    home screens. Unlike a message, a glance generates no notification, and
+    only the fields given are changed.
+    """
+
+    _ENDPOINT = endpoint.GLANCES.url()
+
+    _FIELDS = ('title', 'text', 'subtext', 'count', 'percent')
+
+    # maximum length of the textual fields
+    _MAX_LENGTH = 100
+
+    def __init__(self, title=None, text=None, subtext=None, count=None,
+                 percent=None):
+        """
+        Initialise a new glance.
+
+        :param str title: A description of the data being shown, e.g.
+                          "Queue depth".
+        :param str text: The main line of data.
+        :param str subtext: A second line of data.
+        :param int count: A number, shown on smaller widgets.
+        :param int percent: A percentage from 0 to 100, shown as a progress
+                            bar or circle.
+        :raises ValueError: If no fields are given, a textual field is over
+                            100 characters, or the percentage is out of range.
+        """
+        self._fields = {name: value for name, value in (
+            ('title', title), ('text', text), ('subtext', subtext),
+            ('count', count), ('percent', percent)) if value is not None}
+
+        if not self._fields:
+            raise ValueError('A glance must update at least one field')
+        if any(len(self._fields.get(name, '')) > self._MAX_LENGTH
+               for name in ('title', 'text', 'subtext')):
+            raise ValueError('Glance text fields must be at most {0} '
+                             'characters'.format(self._MAX_LENGTH))
+        if percent is not None and not 0 <= percent <= 100:
+            raise ValueError('A glance percentage must be from 0 to 100')
+
+    @property
+    def fields(self):
+        """
+        :return: The fields updated by this glance, by name.
+        :rtype: dict
+        """
+        return dict(self._fields)
+
+    def send(self, application, user, timeout=3):
+        """
+        Send this glance to a user, making it originate from a given
+        application. Unlike :meth:`Message.send() <pullover.Message.send()>`,
+        a failed request is not retried; a newer value usually supersedes it.
+
+        :param Application application: The application to send the glance
+                                        from.
+        :param User user: The user to send the glance to. All of their
+                          devices will receive it, unless the user targets
+                          specific devices.
+        :param float timeout: The number of seconds to allow for the request.
+                              Defaults to 3s.
+        :return: The result of the send attempt.
+        :rtype: SendResponse
+        :raises requests.RequestException: If the request failed.
+        """
+        logger.info('Sending %s to %s using %s', self, user, application)
+        return SendResponse(endpoint.GLANCES.call(application, user,
+                                                  self._fields, timeout))
+
+    def __str__(self):
+        return '{0.__class__.__name__}({1})'.format(
+            self, ', '.join('{0}={1}'.format(name, self._fields[name])
+                            for name in self._FIELDS
+                            if name in self._fields))
+
+
+class GlanceUpdater:
+    """
+    Coalesces frequent glance updates into occasional requests.
+
+    Only the latest value of each field is kept per user. A user's pending
+    fields are sent together a short delay after the first change, so a burst
+    of updates becomes one request, and at most once per minimum interval, so
+    a producer updating many times per second costs a few requests per
+    minute. A single thread sends updates for every user.
+
+    Failed requests are retried with the next update, unless Pushover rejected
+    them outright, e.g. because the user key is invalid, in which case the
+    fields are dropped.
+    """
+
+    _DEFAULT_DELAY = 1.
+    _DEFAULT_MIN_INTERVAL = 20.
+
+    def __init__(self, application, delay=_DEFAULT_DELAY,
+                 min_interval=_DEFAULT_MIN_INTERVAL, clock=time.monotonic,
+                 **kwargs):
+        """
+        Initialise a new updater, starting its thread.
+
+        :param Application application: The application to send glances
+                                        from.
+        :param float delay: The number of seconds to wait after a change for
+                            further changes to coalesce. Defaults to 1s.
+        :param float min_interval: The minimum number of seconds between
+                                   requests for the same user. Defaults to
+                                   20s.
+        :param callable clock: A function returning the current time in
+                               seconds. Defaults to the monotonic clock.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Glance.send()`.
+        """
+        self._application = application
+        self._delay = delay
+        self._min_interval = min_interval
+        self._clock = clock
+        self._kwargs = kwargs
+
+        # user -> [fields dict, time of first pending change]
+        self._pending = {}
+
+        # user -> time of the last request, oldest first; entries are evicted
+        # once the minimum interval has passed, as they no longer delay
+        # anything
+        self._sent = {}
+
+        self._closed = False
+        self._cond = threading.Condition()
+
+        #: The number of requests sent.
+        self.requests = 0
+
+        #: The number of updates coalesced into those requests.
+        self.updates = 0
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='pullover-glances',
+                                        daemon=True)
+        self._thread.start()
+
+    def update(self, user, **fields):
+        """
+        Change some of a user's glance fields. This method returns
+        immediately.
+
+        :param User user: The user whose glance to update.
+        :param fields: The fields to change, as accepted by
+                       :class:`Glance`'s initialiser.
+        :raises ValueError: If the fields are invalid.
+        :raises RuntimeError: If the updater has been closed.
+        """
+        Glance(**fields)  # validate now, on the caller's thread
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot update a closed glance updater')
+            entry = self._pending.get(user)
+            if entry is None:
+                self._pending[user] = [dict(fields), self._clock()]
+                self._cond.notify_all()
+            else:
+                entry[0].update(fields)
+            self.updates += 1
+
+    def _due(self, user, first_change):
+        """
+        Find when a user's pending fields should be sent. Must be called with
+        the lock held.
+
+        :param User user: The user.
+        :param float first_change: When the oldest pending change was made.
+        :return: The time to send them.
+        :rtype: float
+        """
+        return max(first_change + self._delay,
+                   self._sent.get(user, float('-inf')) + self._min_interval)
+
+    def _take_due(self):
+        """
+        Remove the pending fields that are due to be sent. Must be called with
+        the lock held.
+
+        :return: Fields by user, and the number of seconds until the next
+                 user's fields are due, or None if none are pending.
+        :rtype: tuple(dict, float)
+        """
+        now = self._clock()
+        for user, sent in list(self._sent.items()):
+            if sent + self._min_interval > now:
+                break
+            del self._sent[user]
+
+        due = {}
+        wait = None
+        for user, (fields, first_change) in list(self._pending.items()):
+            at = self._due(user, first_change)
+            if at <= now or self._closed:
+                due[user] = fields
+                del self._pending[user]
+                self._sent.pop(user, None)  # keep oldest first
+                self._sent[user] = now
+            else:
+                wait = at - now if wait is None else min(wait, at - now)
+        return due, wait
+
+    def _send(self, user, fields):
+        """
+        Send a user's coalesced fields, returning them to the pending set if
+        the request fails in a way that may succeed later.
+
+        :param User user: The user.
+        :param dict fields: The fields to send.
+        """
+        try:
+            response = Glance(**fields).send(self._application, user,
+                                             **self._kwargs)
+            failed = not response.ok
+            if failed:
+                logger.warning('Glance update for %s failed: %s', user,
+                               response.errors)
+                if 400 <= response.http_status < 500 and \
+                        response.http_status != 429:
+                    failed = False  # rejected; retrying cannot help
+        except requests.RequestException as e:
+            logger.warning('Glance update for %s failed: %s', user, e)
+            failed = True
+
+        with self._cond:
+            self.requests += 1
+            if failed and not self._closed:
+                # keep any newer values given since
+                entry = self._pending.setdefault(user, [{}, self._clock()])
+                entry[0] = dict(fields, **entry[0])
+
+    def _run(self):
+        """
+        The main loop of the updater thread.
+        """
+        while True:
+            with self._cond:
+                due, wait = self._take_due()
+                while not due:
+                    if self._closed:
+                        return
+                    self._cond.wait(wait)
+                    due, wait = self._take_due()
+            for user, fields in due.items():
+                self._send(user, fields)
+
+    def close(self):
+        """
+        Send all pending fields immediately, and stop the updater thread.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
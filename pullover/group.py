@@ -0,0 +1,318 @@
+import logging
+import hashlib
+import json
+import os
+import threading
+import requests
+
+from pullover import endpoint
+from pullover.exceptions import PulloverError
+from pullover.user import User
+
+
+logger = logging.getLogger(__name__)
+
+
+class GroupError(PulloverError):
+    """
+    Raised if Pushover rejects a delivery group operation, or cannot be
+    reached.
+    """
+
+    def __init__(self, errors):
+        """
+        Initialise a new error.
+
+        :param list(str) errors: A list of textual errors.
+        """
+        super(GroupError, self).__init__(errors)
+
+        #: A list of textual errors
+        self.errors = errors
+
+
+class Group(User):
+    """
+    A Pushover delivery group. Messages sent to a group are delivered to all
+    of its members, so a group can be used anywhere a :class:`~pullover.User`
+    is accepted.
+    """
+
+
+class GroupCache:
+    """
+    Maintains Pushover delivery groups standing in for sets of users, so a
+    message can be sent to many users with a single request.
+
+    Groups are identified by a hash of their sorted member keys, and are
+    created on first use. Named groups are kept up to date incrementally: if
+    the members of a name change, only the difference is added or removed.
+    Groups can optionally be persisted to a file, so they are re-used across
+    restarts rather than recreated. If creating or updating a group fails part
+    way, the group and the changes already made to it are remembered, and the
+    next call for the same users or name completes it, rather than abandoning
+    it.
+
+    Requests to Pushover are made without holding the cache's lock, so a slow
+    request for one set of users does not hold up others.
+    """
+
+    _TIMEOUT = 3
+
+    # below this many recipients, sending individually is cheaper than
+    # creating a group
+    _DEFAULT_THRESHOLD = 10
+
+    def __init__(self, application, threshold=_DEFAULT_THRESHOLD, path=None):
+        """
+        Initialise a new group cache.
+
+        :param Application application: The application that will own the
+                                        groups. Messages must be sent from the
+                                        same application.
+        :param int threshold: The minimum number of recipients for a group to
+                              be used. Defaults to 10.
+        :param str path: A file to persist groups to. Defaults to keeping them
+                         in memory only.
+        """
+        self._application = application
+        self._threshold = threshold
+        self._path = path
+        self._lock = threading.Lock()
+
+        # hash -> group key
+        self._groups = {}
+
+        # name -> [hash, set of member keys]
+        self._names = {}
+
+        # hash -> [group key, set of member keys added so far] for groups
+        # created, but not yet fully populated
+        self._partial = {}
+
+        # name or hash -> lock held while creating or updating its group
+        self._busy = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self._groups = state['groups']
+            self._names = {name: [digest, set(members)]
+                           for name, (digest, members)
+                           in state['names'].items()}
+            self._partial = {digest: [group, set(members)]
+                             for digest, (group, members)
+                             in state.get('partial', {}).items()}
+
+    @staticmethod
+    def _hash(keys):
+        """
+        Calculate the identity of a set of user keys.
+
+        :param set(str) keys: The user keys.
+        :return: A hex digest identifying the set.
+        :rtype: str
+        """
+        return hashlib.sha256(
+            ','.join(sorted(keys)).encode('utf-8')).hexdigest()
+
+    def _save(self):
+        """
+        Write the cache to its file, if it has one. Must be called with the
+        lock held.
+        """
+        if self._path is None:
+            return
+        state = {
+            'groups': self._groups,
+            'names': {name: [digest, sorted(members)]
+                      for name, (digest, members) in self._names.items()},
+            'partial': {digest: [group, sorted(members)]
+                        for digest, (group, members)
+                        in self._partial.items()}
+        }
+        temp = self._path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp, self._path)
+
+    def _call(self, target, group=None, **data):
+        """
+        Make a request to the groups API.
+
+        :param Endpoint target: The endpoint.
+        :param str group: The group key, for endpoints acting on a group.
+        :param data: Parameters to send.
+        :return: The decoded response.
+        :rtype: dict
+        :raises GroupError: If the request failed.
+        """
+        try:
+            response = target.call(self._application, data=data,
+                                   timeout=self._TIMEOUT, group=group)
+            json_ = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise GroupError([str(e)])
+        if json_.get('status') != 1:
+            raise GroupError(json_.get('errors', []))
+        return json_
+
+    def _create(self, digest, name, keys):
+        """
+        Create a new group containing a set of users, or finish populating
+        one whose creation or update previously failed part way.
+
+        :param str digest: The hash of the user keys.
+        :param str name: The name to give the group.
+        :param set(str) keys: The user keys to add.
+        :return: The new group's key.
+        :rtype: str
+        :raises GroupError: If a request failed.
+        """
+        with self._lock:
+            partial = self._partial.get(digest)
+        if partial is None:
+            group = self._call(endpoint.CREATE_GROUP, name=name)['group']
+            logger.info('Created group %s with %d members', group, len(keys))
+            members = set()
+            with self._lock:
+                self._partial[digest] = [group, members]
+                self._save()
+        else:
+            group, members = partial
+            logger.info('Resuming population of group %s', group)
+
+        try:
+            self._update(group, members, keys)
+        except GroupError:
+            with self._lock:
+                self._save()  # resume from here next time
+            raise
+        return group
+
+    def _update(self, group, members, keys):
+        """
+        Change the members of an existing group, recording each change as it
+        is made, so a failed update can be resumed.
+
+        :param str group: The group key.
+        :param set(str) members: The current member keys. Updated in place.
+        :param set(str) keys: The desired member keys.
+        :raises GroupError: If a request failed.
+        """
+        added, removed = keys - members, members - keys
+        logger.info('Updating group %s: %d added, %d removed', group,
+                    len(added), len(removed))
+        for key in added:
+            self._call(endpoint.GROUP_ADD_USER, group, user=key)
+            with self._lock:
+                members.add(key)
+        for key in removed:
+            self._call(endpoint.GROUP_DELETE_USER, group, user=key)
+            with self._lock:
+                members.discard(key)
+
+    def _found(self, digest, name, keys):
+        """
+        Record that a name refers to an existing group. Must be called with
+        the lock held.
+
+        :param str digest: The hash of the user keys.
+        :param str name: The name, or None.
+        :param set(str) keys: The user keys.
+        :return: The group.
+        :rtype: Group
+        """
+        if name is not None and self._names.get(name, [None])[0] != digest:
+            self._names[name] = [digest, keys]
+            self._save()
+        return Group(self._groups[digest])
+
+    def group(self, users, name=None):
+        """
+        Find or create a group containing exactly a set of users.
+
+        :param iterable(User) users: The group's members.
+        :param str name: An optional stable name for the set. If the members
+                         of a name change between calls, its group is updated
+                         rather than a new one created.
+        :return: The group.
+        :rtype: Group
+        :raises GroupError: If the group could not be created or updated.
+        """
+        keys = {user.key for user in users}
+        digest = self._hash(keys)
+        with self._lock:
+            if digest in self._groups:
+                return self._found(digest, name, keys)
+            busy = self._busy.setdefault(
+                digest if name is None else name, threading.Lock())
+
+        # one creation or update per set or name at a time; others wait for
+        # its result
+        with busy:
+            with self._lock:
+                if digest in self._groups:
+                    return self._found(digest, name, keys)
+                named = self._names.get(name)
+                if named is not None:
+                    old_digest, old_keys = named
+                    if old_digest in self._partial:
+                        # left part way through an update
+                        group, members = self._partial[old_digest]
+                    elif any(other != name and other_digest == old_digest
+                             for other, (other_digest, _)
+                             in self._names.items()):
+                        named = None  # shared; leave it for the other names
+                    else:
+                        group = self._groups[old_digest]
+                        members = set(old_keys)
+
+            if named is not None:
+                try:
+                    self._update(group, members, keys)
+                except GroupError:
+                    with self._lock:
+                        # the group still exists; resume from its known
+                        # members next time
+                        self._groups.pop(old_digest, None)
+                        self._partial.pop(old_digest, None)
+                        self._partial[digest] = [group, members]
+                        self._names[name] = [digest, members]
+                        self._save()
+                    raise
+            else:
+                group = self._create(digest, name or digest[:16], keys)
+
+            with self._lock:
+                if named is not None:
+                    self._groups.pop(old_digest, None)
+                    self._partial.pop(old_digest, None)
+                self._partial.pop(digest, None)
+                self._groups[digest] = group
+                if name is not None:
+                    self._names[name] = [digest, keys]
+                self._save()
+            return Group(group)
+
+    def send(self, message, users, name=None, **kwargs):
+        """
+        Send a message to a set of users. Large sets are sent to as a group
+        with a single request; small ones one user at a time.
+
+        :param Message message: The message to send.
+        :param iterable(User) users: The users to send to.
+        :param str name: An optional stable name for the set; see
+                         :meth:`group()`.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`.
+        :return: The result of each send attempt.
+        :rtype: list(SendResponse)
+        :raises GroupError: If a group could not be created or updated.
+        """
+        users = set(users)
+        if len(users) < self._threshold:
+            return [message.send(self._application, user, **kwargs)
+                    for user in users]
+        return [message.send(self._application, self.group(users, name),
+                             **kwargs)]
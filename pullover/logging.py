@@ -0,0 +1,249 @@
+import collections
+import logging
+import logging.handlers
+import queue
+import threading
+import requests
+
+from pullover.message import Message
+from pullover.ratelimit import TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+class _DigestHandler(logging.Handler):
+    """
+    Runs on the queue listener's thread, collecting records into digests and
+    sending each digest as a single message, subject to a rate limit.
+    Duplicate records within a digest are collapsed into one line with a
+    count.
+    """
+
+    # Pushover's limits
+    _MAX_BODY = 1024
+    _MAX_TITLE = 250
+
+    def __init__(self, application, user, window, bucket, max_records,
+                 send_kwargs):
+        super(_DigestHandler, self).__init__()
+        self._application = application
+        self._user = user
+        self._window = window
+        self._bucket = bucket
+        self._max_records = max_records
+        self._send_kwargs = send_kwargs
+
+        # dedup key -> [formatted record, count]
+        self._pending = collections.OrderedDict()
+        self._overflow = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+        #: The number of messages sent.
+        self.sent = 0
+
+    @staticmethod
+    def _key(record):
+        """
+        Find the identity of a record for deduplication. Records with the same
+        logger, level and unformatted message are considered duplicates, even
+        if their arguments differ.
+
+        :param logging.LogRecord record: The record, as enqueued by
+                                         :class:`PushoverHandler`.
+        :return: A hashable key.
+        :rtype: tuple
+        """
+        return record.pullover_key
+
+    def _schedule(self, delay):
+        """
+        Arrange for the digest to be flushed. Must be called with the lock
+        held.
+
+        :param float delay: The number of seconds to wait.
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def emit(self, record):
+        with self._lock:
+            key = self._key(record)
+            if key in self._pending:
+                self._pending[key][1] += 1
+            elif len(self._pending) < self._max_records:
+                self._pending[key] = [record, 1]
+            else:
+                self._overflow += 1
+            self._schedule(self._window)
+
+    def _digest(self, entries, overflow):
+        """
+        Render pending records as a message.
+
+        :param list entries: [record, count] pairs.
+        :param int overflow: The number of records that did not fit.
+        :return: The message to send.
+        :rtype: Message
+        """
+        records = [record for record, _ in entries]
+        total = sum(count for _, count in entries) + overflow
+        priority = Message.HIGH \
+            if any(record.levelno >= logging.CRITICAL for record in records) \
+            else Message.NORMAL
+
+        if total == 1:
+            record = records[0]
+            title = '{0} {1}'.format(record.levelname, record.name)
+            body = record.getMessage()  # formatted when enqueued
+        else:
+            title = '{0} log records'.format(total)
+            lines = []
+            for record, count in entries:
+                line = record.getMessage().splitlines()[0]
+                lines.append(line if count == 1
+                             else '[x{0}] {1}'.format(count, line))
+            if overflow:
+                lines.append('... and {0} more'.format(overflow))
+            body = '\n'.join(lines)
+
+        if len(body) > self._MAX_BODY:
+            body = body[:self._MAX_BODY - 3] + '...'
+        return Message(body, title=title[:self._MAX_TITLE], priority=priority)
+
+    def _flush(self, force=False):
+        """
+        Send pending records as a digest, unless the rate limit has been
+        reached, in which case try again when it allows.
+
+        :param bool force: Whether to ignore the rate limit.
+        """
+        with self._lock:
+            self._timer = None
+            if not self._pending and not self._overflow:
+                return
+            if not self._bucket.take() and not force:
+                self._schedule(self._bucket.delay())
+                return
+            entries = list(self._pending.values())
+            overflow = self._overflow
+            self._pending.clear()
+            self._overflow = 0
+
+        message = self._digest(entries, overflow)
+        try:
+            response = message.send(self._application, self._user,
+                                    **self._send_kwargs)
+        except requests.RequestException as e:
+            logger.warning('Failed to send log digest: %s', e)
+            return
+        self.sent += 1
+        if not response.ok:
+            logger.warning('Failed to send log digest: %s', response.errors)
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+        self._flush(force=True)
+        super(_DigestHandler, self).close()
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """
+    A queue listener that can be stopped when its queue is full.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # waits for the thread to make room
+
+
+class PushoverHandler(logging.handlers.QueueHandler):
+    """
+    A logging handler that sends records to a Pushover user, without ever
+    blocking the logging thread.
+
+    :meth:`emit()` only enqueues the record on a bounded queue; a listener
+    thread does the rest. Records arriving within a short window of each other
+    are batched into a single digest message, records within a digest from
+    the same logger at the same level with the same unformatted message are
+    deduplicated, and digests are rate limited, so an exception
+    storm results in a handful of messages rather than thousands. If the queue
+    is full, records are dropped and counted in :attr:`dropped`.
+
+    Records are formatted with the handler's formatter when enqueued. Records
+    from pullover's own loggers are ignored, to avoid feedback loops.
+    The handler must be closed to stop its thread and send any pending
+    records, e.g. by :func:`logging.shutdown()`.
+    """
+
+    _DEFAULT_CAPACITY = 1000
+    _DEFAULT_WINDOW = 5
+    _DEFAULT_RATE = 1 / 60
+    _DEFAULT_BURST = 5
+    _DEFAULT_MAX_RECORDS = 20
+
+    def __init__(self, application, user, level=logging.ERROR,
+                 capacity=_DEFAULT_CAPACITY, window=_DEFAULT_WINDOW,
+                 rate=_DEFAULT_RATE, burst=_DEFAULT_BURST,
+                 max_records=_DEFAULT_MAX_RECORDS, **kwargs):
+        """
+        Initialise a new handler, starting its listener thread.
+
+        :param Application application: The application to send from.
+        :param User user: The user to send to.
+        :param int level: The minimum level of records to send. Defaults to
+                          :data:`logging.ERROR`.
+        :param int capacity: The maximum number of records waiting to be
+                             processed. Defaults to 1000.
+        :param float window: The number of seconds to wait after a record for
+                             others to batch with it. Defaults to 5s.
+        :param float rate: The sustained number of messages to send per
+                           second. Defaults to one a minute.
+        :param int burst: The number of messages that can be sent in quick
+                          succession before the rate applies. Defaults to 5.
+        :param int max_records: The maximum number of distinct records in a
+                                digest. Defaults to 20.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`.
+        """
+        super(PushoverHandler, self).__init__(queue.Queue(capacity))
+        self.setLevel(level)
+        self.addFilter(lambda record: record.name != 'pullover' and
+                       not record.name.startswith('pullover.'))
+
+        #: The number of records dropped because the queue was full.
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+        self._digester = _DigestHandler(application, user, window,
+                                        TokenBucket(rate, burst), max_records,
+                                        kwargs)
+        self._listener = _QueueListener(self.queue, self._digester)
+        self._listener.start()
+        self._closed = False
+
+    def prepare(self, record):
+        # the dedup key must be taken before the record is formatted, as that
+        # may add e.g. a timestamp
+        key = (record.name, record.levelno, str(record.msg))
+        record = super(PushoverHandler, self).prepare(record)
+        record.pullover_key = key
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._listener.stop()
+            self._digester.close()
+        super(PushoverHandler, self).close()
@@ -2,10 +2,12 @@ import logging
 import abc
 import datetime
 import pytz
-import backoff
 import requests
 
-import pullover
+from pullover import session, sendqueue, deadletter, schedule, sounds, \
+    tracing, endpoint
+from pullover.application import Application
+from pullover.user import User
 from pullover.exceptions import PulloverError
 
 
@@ -82,6 +84,27 @@ class SendResponse:
         :param requests.Response response: The requests response to parse.
         """
         self._response = response
+
+        #: The HTTP status code of the response, e.g. ``429`` if the sending
+        #: application is being rate limited.
+        self.http_status = response.status_code
+
+        #: The number of seconds the final request took.
+        self.latency = response.elapsed.total_seconds()
+
+        #: The number of requests made to send the message, including
+        #: retries.
+        self.attempts = 1
+
+        #: The number of messages the sending application may send before its
+        #: monthly limit is reached, or None if Pushover did not say.
+        self.app_remaining = None
+        try:
+            self.app_remaining = int(
+                response.headers['X-Limit-App-Remaining'])
+        except (KeyError, ValueError):
+            pass
+
         try:
             json = response.json()
 
@@ -96,10 +119,15 @@ class SendResponse:
             #: A list of textual errors detailing which parameters were
             #: invalid, if any.
             self.errors = json['errors'] if 'errors' in json else []
+
+            #: For emergency messages, the receipt to track acknowledgement
+            #: with, otherwise None.
+            self.receipt = json.get('receipt')
         except ValueError:
             self.status = None
             self.id = None
             self.errors = []
+            self.receipt = None
 
     def raise_for_status(self):
         """
@@ -121,10 +149,7 @@ class Message:
     Represents a Pushover message.
     """
 
-    # if more endpoints are ever supported, both of these need abstracting from
-    # this class
-    _ENDPOINT = 'https://api.pushover.net/1/messages.json'
-    _session = None  # send() can take this as a param
+    _ENDPOINT = endpoint.MESSAGES.url()
 
     _EPOCH_START = datetime.datetime(1970, 1, 1, tzinfo=pytz.utc)
 
@@ -144,24 +169,50 @@ class Message:
     #: and shown in red.
     HIGH = 1
 
-    # pullover does not support emergency priority messages
+    #: Same as :attr:`~pullover.Message.HIGH`, except repeated until
+    #: acknowledged by the user or it expires. Requires a retry interval and
+    #: expiry. The send response includes a receipt to track acknowledgement
+    #: with a :class:`~pullover.receipt.ReceiptPoller`.
+    EMERGENCY = 2
+
+    # limits on emergency message retry and expire parameters, in seconds
+    _MIN_RETRY = 30
+    _MAX_EXPIRE = 10800
 
     @classmethod
-    def __session(cls):
+    def warmup(cls, connections=1):
+        """
+        Pre-open connections to Pushover, so the first messages sent do not
+        pay connection setup latency. Call this at startup.
+
+        :param int connections: The number of connections to open. Defaults to
+                                1. Set this to the number of messages you
+                                expect to send concurrently.
+        :return: The number of connections successfully opened.
+        :rtype: int
         """
-        Retrieve a requests session to use within this class. Allows session
-        re-use.
+        return session.warmup(endpoint.MESSAGES.url(), connections)
 
-        :return: A new requests session if this is the first call, otherwise
-                 the existing one.
-        :rtype: requests.Session
+    @classmethod
+    def keep_alive(cls, interval=session.KeepAlive._DEFAULT_INTERVAL):
+        """
+        Start refreshing idle connections to Pushover in the background, so
+        messages sent after a quiet period do not pay connection setup
+        latency. Combine this with :meth:`warmup()`.
+
+        :param float interval: The number of seconds between refreshes.
+                               Defaults to 30s.
+        :return: The started keep-alive thread. Call its ``stop()`` method to
+                 stop refreshing.
+        :rtype: pullover.session.KeepAlive
         """
-        if cls._session is None:
-            cls._session = requests.session()
-        return cls._session
+        thread = session.KeepAlive(endpoint.MESSAGES.url(), interval)
+        thread.start()
+        return thread
 
     def __init__(self, body, title=None, timestamp=None, url=None,
-                 url_title=None, priority=NORMAL):
+                 url_title=None, priority=NORMAL, retry=None, expire=None,
+                 tags=None, sound=None):
         """
         Initialise a new message.
 
@@ -175,11 +226,37 @@ class Message:
         :param int priority: The message priority, e.g.
                              :attr:`~pullover.Message.HIGH`. Defaults to
                              :attr:`~pullover.Message.NORMAL`.
-        :raises ValueError: If a URL title is provided, but no URL.
+        :param int retry: For emergency messages, how often in seconds to
+                          repeat the notification until it is acknowledged.
+                          At least 30s.
+        :param int expire: For emergency messages, how many seconds to keep
+                           repeating the notification for. At most 10800s.
+        :param iterable(str) tags: For emergency messages, labels to cancel
+                                   them by with
+                                   :meth:`ReceiptPoller.cancel_by_tag()
+                                   <pullover.receipt.ReceiptPoller.cancel_by_tag()>`.
+        :param str sound: The name of the notification sound to play.
+                          Defaults to the user's default sound. Checked
+                          against the sending application's
+                          :class:`~pullover.sounds.SoundsCatalogue` when the
+                          message is prepared or sent.
+        :raises ValueError: If a URL title is provided, but no URL, or the
+                            emergency parameters are missing or out of range.
         """
         if url_title is not None and url is None:
             raise ValueError('A URL must be provided for a URL title to be '
                              'specified')
+        if priority == self.EMERGENCY:
+            if retry is None or expire is None:
+                raise ValueError('Emergency messages require a retry interval '
+                                 'and expiry')
+            if retry < self._MIN_RETRY or expire > self._MAX_EXPIRE:
+                raise ValueError('Emergency messages must retry at least '
+                                 'every {0}s and expire within {1}s'.format(
+                                     self._MIN_RETRY, self._MAX_EXPIRE))
+        elif retry is not None or expire is not None or tags:
+            raise ValueError('Retry, expire and tags require emergency '
+                             'priority')
 
         self._body = body
         self._title = title
@@ -187,6 +264,76 @@ class Message:
         self._url = url
         self._url_title = url_title
         self._priority = priority
+        self._retry = retry
+        self._expire = expire
+        self._tags = tuple(tags or ())
+        self._sound = sound
+
+    @property
+    def priority(self):
+        """
+        :return: The message priority, e.g. :attr:`~pullover.Message.HIGH`.
+        :rtype: int
+        """
+        return self._priority
+
+    @property
+    def tags(self):
+        """
+        :return: The labels of an emergency message, which may be empty.
+        :rtype: tuple(str)
+        """
+        return self._tags
+
+    def _data(self):
+        """
+        Build the request parameters representing this message.
+
+        :return: A new dictionary of parameters, excluding the application
+                 and user.
+        :rtype: dict
+        """
+        return {
+            'message': self._body,
+            'title': self._title,
+            'timestamp': None
+            if self._timestamp is None
+            else int((self._timestamp - self._EPOCH_START).total_seconds()),
+            'url': self._url,
+            'url_title': self._url_title,
+            'priority': self._priority,
+            'retry': self._retry,
+            'expire': self._expire,
+            'tags': ','.join(self._tags) or None,
+            'sound': self._sound
+        }
+
+    @classmethod
+    def _from_data(cls, data):
+        """
+        Reconstruct a message from its request parameters.
+
+        :param dict data: Parameters as returned by :meth:`_data()`, with
+                          missing values omitted.
+        :return: The message.
+        :rtype: Message
+        """
+        timestamp = data.get('timestamp')
+        retry_ = data.get('retry')
+        expire = data.get('expire')
+        tags = data.get('tags')
+        return cls(data['message'],
+                   title=data.get('title'),
+                   timestamp=None if timestamp is None
+                   else datetime.datetime.fromtimestamp(int(timestamp),
+                                                        pytz.utc),
+                   url=data.get('url'),
+                   url_title=data.get('url_title'),
+                   priority=int(data.get('priority', cls.NORMAL)),
+                   retry=None if retry_ is None else int(retry_),
+                   expire=None if expire is None else int(expire),
+                   tags=tags.split(',') if tags else None,
+                   sound=data.get('sound'))
 
     def prepare(self, application, user):
         """
@@ -195,88 +342,118 @@ class Message:
 
         :param Application application: The application to send the message
                                         from.
-        :param User user: The user to send the message to. All devices will
-                          receive it.
+        :param User user: The user to send the message to. All of their
+                          devices will receive it, unless the user targets
+                          specific devices.
         :return: A prepared message object.
         :rtype: PreparedMessage
+        :raises ValueError: If the application cannot use the message's
+                            sound.
+        """
+        with tracing.span('pullover.prepare'):
+            self.__check_sound(application)
+            return PreparedMessage(self, application, user)
+
+    def __check_sound(self, application):
         """
-        return PreparedMessage(self, application, user)
+        Check the message's sound against the application's cached
+        catalogue, without waiting for the network.
+
+        :param Application application: The application sending the message.
+        :raises ValueError: If the application cannot use the sound.
+        """
+        catalogue = sounds.default()
+        if self._sound is not None and catalogue is not None and \
+                not catalogue.is_valid(application, self._sound):
+            raise ValueError("'{0}' is not a sound available to the "
+                             "application".format(self._sound))
 
     def send(self, application, user, timeout=3, retry_interval=5,
              max_tries=_DEFAULT_MAX_SEND_TRIES):
         """
         Send this message to a user, making it originate from a given
-        application. This method guarantees not to throw any exceptions.
+        application.
 
         :param Application application: The application to send the message
                                         from.
-        :param User user: The user to send the message to. All devices will
-                          receive it.
-        :param float timeout: The number of seconds to allow for each request
-                              to Pushover. Defaults to 3s.
+        :param User user: The user to send the message to. All of their
+                          devices will receive it, unless the user targets
+                          specific devices.
+        :param timeout: The number of seconds to allow for each request to
+                        Pushover, or an
+                        :class:`~pullover.timeout.AdaptiveTimeout` to set it
+                        from observed latency. Defaults to 3s. Requests that
+                        time out are retried.
+        :type timeout: float or AdaptiveTimeout
         :param float retry_interval: The amount of time to wait between
                                      requests. Defaults to 5s. Note, this is
                                      the `minimum recommended by Pushover
                                      <https://pushover.net/api#friendly>`_.
         :param int max_tries: The number of attempts to make before giving up.
                               Defaults to 5. Set this to 1 to disable back-off.
+                              Retries are also subject to the process-wide
+                              :class:`~pullover.retry.RetryBudget`.
         :return: The result of the send attempt.
         :rtype: SendResponse
+        :raises requests.Timeout: If the final attempt timed out.
+        :raises requests.RequestException: If a request failed otherwise,
+                                           e.g. Pushover could not be reached.
+        :raises ValueError: If the application cannot use the message's
+                            sound.
         """
 
         logger.info('Sending %s to %s using %s', self, user, application)
+        self.__check_sound(application)
+        with tracing.span('pullover.send'):
+            return self.__send(application, user, timeout, retry_interval,
+                               max_tries)
 
-        def should_retry(resp):
-            """
-            Decides whether to retry sending a message given a response.
-
-            :param requests.Response resp: The response to analyse.
-            :return: True if the original request should be retried; false
-                     otherwise.
-            :rtype: bool
-            """
-            return not resp.ok and not (400 <= resp.status_code < 500)
-
-        @backoff.on_predicate(backoff.constant,
-                              should_retry,
-                              max_tries=max_tries,
-                              interval=retry_interval)
-        def send_request(sess, prepped):
-            """
-            Sends a request to Pushover.
-
-            :param requests.Session sess: The session to send the request with.
-            :param requests.PreparedRequest prepped: The request to send.
-            :return: The request response.
-            :rtype: requests.Response
-            """
-            return sess.send(prepped, timeout=timeout)
-
-        request = requests.Request(
-            'POST',
-            self._ENDPOINT,
-            headers={
-                'User-Agent': '{0}/{1}'.format(pullover.__title__,
-                                               pullover.__version__)
-            },
-            data={
-                'message': self._body,
-                'title': self._title,
-                'timestamp': None
-                if self._timestamp is None
-                else int((self._timestamp - self._EPOCH_START)
-                         .total_seconds()),
-                'url': self._url,
-                'url_title': self._url_title,
-                'priority': self._priority
-            })
-        application.sign(request)
-        user.sign(request)
-
-        prepared = self.__session().prepare_request(request)
-        response = send_request(self.__session(), prepared)
-        logger.debug('Request time: %fs', response.elapsed.total_seconds())
-        return SendResponse(response)
+    def __send(self, application, user, timeout, retry_interval, max_tries):
+        """
+        Send this message, as described by :meth:`send()`.
+        """
+        with tracing.span('pullover.sign'):
+            request = self._request(application, user)
+        try:
+            response, tries = endpoint.MESSAGES.send(
+                request, application, timeout, retry_interval, max_tries)
+        except requests.RequestException as e:
+            # e.g. timed out, or Pushover could not be reached
+            self.__dead_letter(application, user, str(e))
+            raise
+        with tracing.span('pullover.parse'):
+            send_response = SendResponse(response)
+        send_response.attempts = tries
+        # retries exhausted, or over the app's limit; worth sending again later
+        if response.status_code == 429 or response.status_code >= 500:
+            self.__dead_letter(application, user,
+                               '; '.join(send_response.errors) or
+                               'HTTP {0}'.format(response.status_code))
+        return send_response
+
+    def _request(self, application, user):
+        """
+        Build the request to send this message.
+
+        :param Application application: The application sending the message.
+        :param User user: The user to send the message to.
+        :return: The signed request.
+        :rtype: requests.Request
+        """
+        return endpoint.MESSAGES.request(application, user, self._data())
+
+    def __dead_letter(self, application, user, error):
+        """
+        Record that this message could not be sent in the process-wide
+        dead-letter store, if there is one.
+
+        :param Application application: The application sending the message.
+        :param User user: The user the message was for.
+        :param str error: The last error encountered.
+        """
+        store = deadletter.default()
+        if store is not None:
+            store.add(PreparedMessage(self, application, user), error)
 
     def __str__(self):
         return '{0.__class__.__name__}({0._body})'.format(self)
@@ -294,13 +471,83 @@ class PreparedMessage:
         :param Message message: The message to send.
         :param Application application: The application to send the message
                                         from.
-        :param User user: The user to send the message to. All devices will
-                          receive it.
+        :param User user: The user to send the message to. All of their
+                          devices will receive it, unless the user targets
+                          specific devices.
         """
         self._message = message
         self._application = application
         self._user = user
 
+        # sends scheduled with send_at() that have not yet completed
+        self._scheduled = set()
+
+    @property
+    def message(self):
+        """
+        :return: The message to send.
+        :rtype: Message
+        """
+        return self._message
+
+    @property
+    def application(self):
+        """
+        :return: The application to send the message from.
+        :rtype: Application
+        """
+        return self._application
+
+    @property
+    def user(self):
+        """
+        :return: The user to send the message to.
+        :rtype: User
+        """
+        return self._user
+
+    def to_dict(self):
+        """
+        Serialise this prepared message, e.g. to store it. Note the result
+        includes the application token and user key.
+
+        :return: A JSON-serialisable dictionary of the message's request
+                 parameters.
+        :rtype: dict
+        """
+        request = requests.Request(data=self._message._data())
+        self._application.sign(request)
+        self._user.sign(request)
+        return {key: value for key, value in request.data.items()
+                if value is not None}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Deserialise a prepared message.
+
+        :param dict data: A dictionary returned by :meth:`to_dict()`.
+        :return: The prepared message.
+        :rtype: PreparedMessage
+        """
+        data = dict(data)
+        application = Application(data.pop('token'))
+        devices = data.pop('device', None)
+        user = User(data.pop('user'), devices.split(',') if devices else None)
+        return cls(Message._from_data(data), application, user)
+
+    def _merge_key(self):
+        """
+        Find the identity of this prepared message, ignoring the devices it
+        targets.
+
+        :return: A hashable key, equal for prepared messages that differ only
+                 by device.
+        :rtype: tuple
+        """
+        return (self._application, self._user.__class__, self._user.key,
+                tuple(sorted(self._message._data().items())))
+
     def send(self, **kwargs):
         """
         Send this prepared message.
@@ -311,3 +558,107 @@ class PreparedMessage:
         :rtype: SendResponse
         """
         return self._message.send(self._application, self._user, **kwargs)
+
+    def submit(self, **kwargs):
+        """
+        Send this prepared message in the background, on the send queue
+        shared by all prepared messages. This method returns once the message
+        is queued. If the queue is full, its overflow policy applies; by
+        default, this blocks until there is room.
+
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`.
+        :return: A future that resolves to the result of the send attempt.
+                 Callbacks can be attached with ``add_done_callback()``.
+        :rtype: concurrent.futures.Future
+        :raises QueueFullError: If the shared queue is full, and its policy
+                                is to reject new messages.
+        """
+        return sendqueue.default().put(self, **kwargs)
+
+    def send_at(self, when, **kwargs):
+        """
+        Send this prepared message at a future time, using the scheduler
+        shared by all prepared messages. This method does not wait for the
+        send; when it is due, the message is put on the shared send queue.
+
+        :param when: When to send the message, as an aware datetime or
+                     seconds since the epoch.
+        :type when: datetime.datetime or float
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`.
+        :return: The scheduled send, whose ``future`` resolves to the result
+                 of the send attempt.
+        :rtype: ScheduledSend
+        """
+        scheduled = schedule.default().schedule(self, when, **kwargs)
+        self._scheduled.add(scheduled)
+        scheduled.future.add_done_callback(
+            lambda _: self._scheduled.discard(scheduled))
+        return scheduled
+
+    def cancel(self):
+        """
+        Stop this prepared message being sent by any pending
+        :meth:`send_at()` calls.
+
+        :return: The number of scheduled sends cancelled.
+        :rtype: int
+        """
+        return sum(scheduled.cancel() for scheduled in list(self._scheduled))
+
+
+def _disjoint(devices, prepared):
+    """
+    Check whether a prepared message targets specific devices, none of which
+    are in a set.
+
+    :param set(str) devices: The devices already targeted.
+    :param PreparedMessage prepared: The prepared message.
+    :return: True if the prepared message can be combined with others
+             targeting the devices; false otherwise.
+    :rtype: bool
+    """
+    return bool(prepared.user.devices) and \
+        devices.isdisjoint(prepared.user.devices)
+
+
+def merge(prepared_messages):
+    """
+    Combine prepared messages that differ only in the devices they target, so
+    each combination is sent with a single request. Pushover accepts several
+    devices per request. Only messages targeting disjoint sets of specific
+    devices are combined; a repeated send, or one to all of a user's devices,
+    is kept separate.
+
+    :param iterable(PreparedMessage) prepared_messages: The prepared messages
+                                                        to combine.
+    :return: The combined prepared messages, in order of first occurrence.
+    :rtype: list(PreparedMessage)
+    """
+    # each combination: the messages in it, and the devices they target
+    combinations = []
+    open_ = {}  # merge key -> combinations that can still grow
+    for prepared in prepared_messages:
+        candidates = open_.setdefault(prepared._merge_key(), [])
+        for group, devices in candidates:
+            if _disjoint(devices, prepared):
+                group.append(prepared)
+                devices.update(prepared.user.devices)
+                break
+        else:
+            combination = ([prepared], set(prepared.user.devices or ()))
+            combinations.append(combination)
+            if prepared.user.devices:
+                candidates.append(combination)
+
+    merged = []
+    for group, devices in combinations:
+        first = group[0]
+        if len(group) == 1:
+            merged.append(first)
+        else:
+            user = first.user.__class__(first.user.key, sorted(devices))
+            merged.append(PreparedMessage(first.message, first.application,
+                                          user))
+    return merged
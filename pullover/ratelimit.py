@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter. Tokens accumulate at a constant
+    rate up to a maximum, and each permitted action takes one.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        """
+        Initialise a new, full bucket.
+
+        :param float rate: The number of tokens added per second.
+        :param float capacity: The maximum number of tokens the bucket can
+                               hold, i.e. the largest permitted burst.
+        :param callable clock: A function returning the current time in
+                               seconds. Defaults to the monotonic clock.
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """
+        Add the tokens accumulated since the last refill. Must be called with
+        the lock held.
+        """
+        now = self._clock()
+        self._tokens = min(self._capacity,
+                           self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def take(self, tokens=1):
+        """
+        Take tokens from the bucket, if there are enough.
+
+        :param float tokens: The number of tokens to take. Defaults to 1.
+        :return: True if the tokens were taken, false if there were not
+                 enough, in which case none are taken.
+        :rtype: bool
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def delay(self, tokens=1):
+        """
+        Find how long it will be until tokens can be taken.
+
+        :param float tokens: The number of tokens required. Defaults to 1.
+        :return: The number of seconds to wait; 0 if they can be taken now.
+        :rtype: float
+        """
+        with self._lock:
+            self._refill()
+            return max(0., (tokens - self._tokens) / self._rate)
@@ -0,0 +1,508 @@
+import logging
+import atexit
+import datetime
+import heapq
+import itertools
+import os
+import threading
+import time
+import concurrent.futures
+import pytz
+import requests
+
+from pullover import endpoint
+from pullover.exceptions import PulloverError
+
+
+logger = logging.getLogger(__name__)
+
+
+class ReceiptError(PulloverError):
+    """
+    Raised if Pushover rejects a receipt cancellation, or cannot be reached.
+    """
+
+    def __init__(self, errors):
+        """
+        Initialise a new error.
+
+        :param list(str) errors: A list of textual errors.
+        """
+        super(ReceiptError, self).__init__(errors)
+
+        #: A list of textual errors
+        self.errors = errors
+
+
+def _datetime(timestamp):
+    """
+    Convert a receipt timestamp to a datetime.
+
+    :param int timestamp: Seconds since the epoch, or 0 if not applicable.
+    :return: The corresponding datetime, or None.
+    :rtype: datetime.datetime
+    """
+    if not timestamp:
+        return None
+    return datetime.datetime.fromtimestamp(int(timestamp), pytz.utc)
+
+
+class ReceiptStatus:
+    """
+    The state of an emergency message, as reported by Pushover.
+    """
+
+    def __init__(self, json):
+        """
+        Initialise a new status.
+
+        :param dict json: The decoded response to a receipt query.
+        """
+
+        #: Whether a user has acknowledged the message.
+        self.acknowledged = bool(json.get('acknowledged'))
+
+        #: When the message was acknowledged, or None.
+        self.acknowledged_at = _datetime(json.get('acknowledged_at'))
+
+        #: The key of the user who acknowledged the message, or None.
+        self.acknowledged_by = json.get('acknowledged_by') or None
+
+        #: The name of the device the message was acknowledged on, or None.
+        self.acknowledged_by_device = \
+            json.get('acknowledged_by_device') or None
+
+        #: When the notification was last repeated, or None.
+        self.last_delivered_at = _datetime(json.get('last_delivered_at'))
+
+        #: Whether the message expired without being acknowledged.
+        self.expired = bool(json.get('expired'))
+
+        #: When the message stops being repeated.
+        self.expires_at = _datetime(json.get('expires_at'))
+
+    @property
+    def done(self):
+        """
+        :return: True if the message will not be repeated again.
+        :rtype: bool
+        """
+        return self.acknowledged or self.expired
+
+
+class Receipt:
+    """
+    An emergency message whose acknowledgement is being tracked by a
+    :class:`~pullover.receipt.ReceiptPoller`.
+    """
+
+    def __init__(self, id_, application, tags):
+        """
+        Initialise a new receipt. Instances are created by
+        :meth:`ReceiptPoller.track()`.
+
+        :param str id_: The receipt returned when the message was sent.
+        :param Application application: The application that sent the
+                                        message.
+        :param tuple(str) tags: The message's tags.
+        """
+        self._id = id_
+        self._application = application
+        self._tags = tags
+
+        #: The most recently polled status, or None if not yet polled.
+        self.status = None
+
+        #: A future that resolves to the final :class:`ReceiptStatus` once the
+        #: message is acknowledged or expires, and is cancelled if tracking
+        #: stops first.
+        self.future = concurrent.futures.Future()
+
+        # seconds between polls; adapted by the poller
+        self._interval = None
+
+    @property
+    def id(self):
+        """
+        :return: The receipt returned when the message was sent.
+        :rtype: str
+        """
+        return self._id
+
+    @property
+    def application(self):
+        """
+        :return: The application that sent the message.
+        :rtype: Application
+        """
+        return self._application
+
+    @property
+    def tags(self):
+        """
+        :return: The message's tags.
+        :rtype: tuple(str)
+        """
+        return self._tags
+
+    def __str__(self):
+        return '{0.__class__.__name__}({0._id})'.format(self)
+
+
+class ReceiptPoller:
+    """
+    Tracks the acknowledgement of many emergency messages at once.
+
+    A single thread keeps a min-heap of receipts ordered by when each should
+    next be polled, and hands due polls to a small, fixed pool of workers
+    sharing pullover's connections, so thousands of outstanding receipts
+    cost neither a thread each nor more than a few concurrent requests.
+    Each receipt is polled every few seconds at first, backing off while its
+    status is unchanged, and more quickly again when the notification is
+    repeated. Receipts stop being polled once acknowledged or expired.
+    """
+
+    _TIMEOUT = 3
+
+    # Pushover asks for receipts to be polled at most every 5 seconds
+    _DEFAULT_MIN_INTERVAL = 5.
+    _DEFAULT_MAX_INTERVAL = 60.
+    _BACKOFF = 1.5
+
+    def __init__(self, concurrency=4, min_interval=_DEFAULT_MIN_INTERVAL,
+                 max_interval=_DEFAULT_MAX_INTERVAL, clock=time.time):
+        """
+        Initialise a new poller, starting its thread.
+
+        :param int concurrency: The maximum number of receipts to poll at
+                                once. Defaults to 4.
+        :param float min_interval: The minimum number of seconds between
+                                   polls of a receipt. Defaults to 5s.
+        :param float max_interval: The maximum number of seconds between
+                                   polls of a receipt. Defaults to 60s.
+        :param callable clock: A function returning the current time in
+                               seconds since the epoch. Defaults to the
+                               system clock.
+        :raises ValueError: If the concurrency is less than one.
+        """
+        if concurrency < 1:
+            raise ValueError('A receipt poller needs a concurrency of at '
+                             'least one')
+
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._clock = clock
+
+        # receipt id -> Receipt for every tracked receipt
+        self._receipts = {}
+
+        # (due, seq, receipt id) entries; may include receipts no longer
+        # tracked, which are skipped when they reach the top
+        self._heap = []
+        self._seq = itertools.count()
+
+        self._closed = False
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            concurrency, thread_name_prefix='pullover-receipt')
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='pullover-receipt-poller',
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def tracked(self):
+        """
+        :return: The number of receipts being tracked.
+        :rtype: int
+        """
+        return len(self._receipts)
+
+    def _call(self, target, application, **params):
+        """
+        Make a cancellation request to the receipts API.
+
+        :param Endpoint target: The endpoint.
+        :param Application application: The application that sent the
+                                        message.
+        :param params: Values for the endpoint's path placeholders.
+        :return: The decoded response.
+        :rtype: dict
+        :raises ReceiptError: If the request failed.
+        """
+        try:
+            json_ = target.call(application, timeout=self._TIMEOUT,
+                                **params).json()
+        except (requests.RequestException, ValueError) as e:
+            raise ReceiptError([str(e)])
+        if json_.get('status') != 1:
+            raise ReceiptError(json_.get('errors', []))
+        return json_
+
+    def _push(self, receipt, delay):
+        """
+        Schedule the next poll of a receipt. Must be called with the lock
+        held.
+
+        :param Receipt receipt: The receipt.
+        :param float delay: The number of seconds until it should be polled.
+        """
+        heapq.heappush(self._heap,
+                       (self._clock() + delay, next(self._seq), receipt.id))
+        self._cond.notify_all()
+
+    def track(self, application, receipt, tags=()):
+        """
+        Start tracking the acknowledgement of an emergency message.
+
+        :param Application application: The application that sent the
+                                        message.
+        :param str receipt: The receipt from the message's
+                            :class:`~pullover.message.SendResponse`.
+        :param iterable(str) tags: The message's tags, to stop tracking it if
+                                   it is cancelled by tag.
+        :return: The tracked receipt. If it was already being tracked, the
+                 existing instance is returned.
+        :rtype: Receipt
+        :raises RuntimeError: If the poller has been closed.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot track with a closed poller')
+            if receipt in self._receipts:
+                return self._receipts[receipt]
+            tracked = Receipt(receipt, application, tuple(tags))
+            tracked._interval = self._min_interval
+            self._receipts[receipt] = tracked
+            self._push(tracked, self._min_interval)
+        logger.debug('Tracking %s', tracked)
+        return tracked
+
+    def _untrack(self, receipt):
+        """
+        Stop tracking a receipt, cancelling its future.
+
+        :param str receipt: The receipt.
+        :return: True if it was being tracked.
+        :rtype: bool
+        """
+        with self._cond:
+            tracked = self._receipts.pop(receipt, None)
+        if tracked is None:
+            return False
+        tracked.future.cancel()
+        return True
+
+    def cancel(self, receipt):
+        """
+        Stop an emergency message being repeated, and stop tracking it.
+
+        :param Receipt receipt: The tracked receipt.
+        :raises ReceiptError: If the cancellation failed.
+        """
+        self._call(endpoint.CANCEL_RECEIPT, receipt.application,
+                   receipt=receipt.id)
+        self._untrack(receipt.id)
+        logger.info('Cancelled %s', receipt)
+
+    def cancel_by_tag(self, application, tag):
+        """
+        Stop all emergency messages with a tag being repeated, and stop
+        tracking them.
+
+        :param Application application: The application that sent the
+                                        messages.
+        :param str tag: The tag.
+        :return: The number of messages Pushover cancelled.
+        :rtype: int
+        :raises ReceiptError: If the cancellation failed.
+        """
+        json_ = self._call(endpoint.CANCEL_BY_TAG, application, tag=tag)
+        with self._cond:
+            matching = [receipt.id for receipt in self._receipts.values()
+                        if receipt.application == application
+                        and tag in receipt.tags]
+        for receipt in matching:
+            self._untrack(receipt)
+        canceled = json_.get('canceled', 0)
+        logger.info('Cancelled %d messages tagged %s', canceled, tag)
+        return canceled
+
+    def _poll(self, receipt):
+        """
+        Query Pushover for a receipt's status, and schedule its next poll.
+        Runs on a worker thread.
+
+        :param Receipt receipt: The receipt.
+        """
+        status_code = None
+        json_ = None
+        try:
+            response = endpoint.RECEIPT.call(receipt.application,
+                                             timeout=self._TIMEOUT,
+                                             receipt=receipt.id)
+            status_code = response.status_code
+            json_ = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning('Failed to poll %s: %s', receipt, e)
+        finally:
+            self._slots.release()
+
+        with self._cond:
+            if receipt.id not in self._receipts:
+                return  # cancelled while polling
+            if json_ is None or json_.get('status') != 1:
+                if status_code is not None and 400 <= status_code < 500 \
+                        and status_code != 429:
+                    # e.g. the receipt is unknown; polling will not help
+                    del self._receipts[receipt.id]
+                    errors = [] if json_ is None else json_.get('errors', [])
+                    receipt.future.set_exception(ReceiptError(errors))
+                    return
+                # Pushover is struggling; back off
+                receipt._interval = min(self._max_interval,
+                                        receipt._interval * 2)
+                self._push(receipt, receipt._interval)
+                return
+
+            previous = receipt.status
+            receipt.status = ReceiptStatus(json_)
+            if receipt.status.done:
+                del self._receipts[receipt.id]
+            elif previous is not None and receipt.status.last_delivered_at \
+                    == previous.last_delivered_at:
+                receipt._interval = min(self._max_interval,
+                                        receipt._interval * self._BACKOFF)
+            else:
+                receipt._interval = self._min_interval
+
+            if not receipt.status.done:
+                delay = receipt._interval
+                if receipt.status.expires_at is not None:
+                    # find out promptly when the message expires
+                    delay = min(delay, max(
+                        self._min_interval,
+                        receipt.status.expires_at.timestamp() -
+                        self._clock()))
+                self._push(receipt, delay)
+
+        if receipt.status.done:
+            logger.info('%s %s', receipt, 'acknowledged'
+                        if receipt.status.acknowledged else 'expired')
+            receipt.future.set_result(receipt.status)
+
+    def _next_due(self):
+        """
+        Remove the earliest receipt from the heap if its poll is due. Must be
+        called with the lock held.
+
+        :return: The receipt, or None if no poll is due yet.
+        :rtype: Receipt
+        """
+        while self._heap and self._heap[0][2] not in self._receipts:
+            heapq.heappop(self._heap)  # no longer tracked
+        if not self._heap or self._heap[0][0] > self._clock():
+            return None
+        return self._receipts[heapq.heappop(self._heap)[2]]
+
+    def _run(self):
+        """
+        The main loop of the poller thread.
+        """
+        while True:
+            # wait for a free worker first, so a backlog of due polls stays in
+            # the heap rather than the executor's unbounded queue
+            self._slots.acquire()
+            with self._cond:
+                receipt = self._next_due()
+                while receipt is None:
+                    if self._closed:
+                        self._slots.release()
+                        return
+                    self._cond.wait(None if not self._heap else max(
+                        0., self._heap[0][0] - self._clock()))
+                    receipt = self._next_due()
+            self._executor.submit(self._poll, receipt)
+
+    def close(self):
+        """
+        Stop polling, cancelling the futures of receipts still being tracked.
+        """
+        with self._cond:
+            self._closed = True
+            receipts = self._receipts
+            self._receipts = {}
+            self._heap = []
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown()
+        for receipt in receipts.values():
+            receipt.future.cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# (pid, poller) tuple; threads do not survive fork(), so a child must not use
+# its parent's poller
+_default = (None, None)
+_default_lock = threading.Lock()
+
+
+def default():
+    """
+    Retrieve the receipt poller shared by the process. Unless
+    :func:`configure()` has been called in this process, it is created on
+    first use with default settings.
+
+    :return: The shared poller.
+    :rtype: ReceiptPoller
+    """
+    global _default
+    pid = os.getpid()
+    owner, poller = _default
+    if owner != pid:
+        with _default_lock:
+            owner, poller = _default
+            if owner != pid:
+                poller = ReceiptPoller()
+                _default = (pid, poller)
+    return poller
+
+
+def configure(poller=None, **kwargs):
+    """
+    Replace the shared receipt poller. Receipts tracked by the previous poller
+    are no longer polled.
+
+    :param ReceiptPoller poller: The poller to use. Defaults to creating a new
+                                 one.
+    :param kwargs: Parameters to create the new poller with, if one is not
+                   provided. See :meth:`ReceiptPoller.__init__()`.
+    :return: The new shared poller.
+    :rtype: ReceiptPoller
+    """
+    global _default
+    if poller is None:
+        poller = ReceiptPoller(**kwargs)
+    with _default_lock:
+        owner, previous = _default
+        _default = (os.getpid(), poller)
+    if previous is not None and owner == os.getpid():
+        previous.close()
+    return poller
+
+
+@atexit.register
+def _close_default():
+    """
+    Stop the shared poller before the interpreter exits.
+    """
+    owner, poller = _default
+    if poller is not None and owner == os.getpid():
+        poller.close()
@@ -0,0 +1,217 @@
+import array
+import collections
+import math
+import threading
+import uuid
+
+
+class ResultStore:
+    """
+    Collects the results of a large batch send in compact columns, rather
+    than keeping a :class:`~pullover.message.SendResponse`, and with it the
+    raw HTTP response, per message.
+
+    Each result takes a few dozen bytes: status codes, latencies and attempt
+    counts are held in typed arrays, request identifiers are packed into 16
+    bytes, and error strings, which repeat across a batch, are interned.
+    Results can be summarised, and failures exported, without creating an
+    object per message.
+
+    Instances are thread-safe.
+    """
+
+    # http status recorded when no response was received
+    _NO_RESPONSE = 0
+
+    # Pushover status recorded when the response could not be parsed
+    _NO_STATUS = -1
+
+    def __init__(self):
+        """
+        Initialise a new, empty store.
+        """
+        self._lock = threading.Lock()
+
+        # caller-supplied position of each result, e.g. its recipient's index
+        self._index = array.array('q')
+        self._http_status = array.array('H')
+        self._status = array.array('b')
+        self._latency = array.array('f')
+        self._attempts = array.array('B')
+
+        # 16 bytes per result: request identifiers as UUIDs, or zeros if
+        # absent or not a UUID
+        self._request_ids = bytearray()
+
+        # per result, an index into the interned error strings, where 0 means
+        # no error
+        self._errors = array.array('I')
+        self._error_strings = ['']
+        self._error_ids = {'': 0}
+
+    def __len__(self):
+        return len(self._index)
+
+    def _intern(self, error):
+        """
+        Find the identifier of an error string, interning it if new. Must be
+        called with the lock held.
+
+        :param str error: The error.
+        :return: The error's identifier.
+        :rtype: int
+        """
+        id_ = self._error_ids.get(error)
+        if id_ is None:
+            id_ = len(self._error_strings)
+            self._error_strings.append(error)
+            self._error_ids[error] = id_
+        return id_
+
+    @staticmethod
+    def _pack(request_id):
+        """
+        Pack a request identifier into 16 bytes.
+
+        :param str request_id: The identifier, or None.
+        :return: The identifier's bytes, or zeros if it is not a UUID.
+        :rtype: bytes
+        """
+        try:
+            return uuid.UUID(request_id).bytes
+        except (TypeError, ValueError, AttributeError):
+            return bytes(16)
+
+    def _append(self, index, http_status, status, latency, attempts,
+                request_id, error):
+        """
+        Record a result in each column.
+        """
+        with self._lock:
+            self._index.append(len(self._index) if index is None else index)
+            self._http_status.append(http_status)
+            self._status.append(status)
+            self._latency.append(latency)
+            self._attempts.append(min(attempts, 255))
+            self._request_ids += self._pack(request_id)
+            self._errors.append(self._intern(error))
+
+    def add(self, response, index=None):
+        """
+        Record the result of a send.
+
+        :param SendResponse response: The result.
+        :param int index: The position of the message in the batch, e.g. its
+                          recipient's index. Defaults to the number of
+                          results already recorded.
+        """
+        self._append(index, response.http_status,
+                     self._NO_STATUS if response.status is None
+                     else response.status,
+                     response.latency, response.attempts, response.id,
+                     '; '.join(response.errors))
+
+    def add_exception(self, exception, index=None):
+        """
+        Record a send that raised an exception, e.g. a timeout.
+
+        :param BaseException exception: The exception.
+        :param int index: The position of the message in the batch. Defaults
+                          to the number of results already recorded.
+        """
+        self._append(index, self._NO_RESPONSE, self._NO_STATUS, math.nan, 0,
+                     None, str(exception) or exception.__class__.__name__)
+
+    def track(self, future, index=None):
+        """
+        Record the result of a send once it completes, e.g. a future returned
+        by :meth:`PreparedMessage.submit()
+        <pullover.PreparedMessage.submit()>`. The future can then be
+        discarded.
+
+        :param concurrent.futures.Future future: The future of the send.
+        :param int index: The position of the message in the batch. Defaults
+                          to the number of results recorded when it
+                          completes.
+        """
+        def done(f):
+            if f.cancelled():
+                self.add_exception(Exception('Cancelled'), index)
+            elif f.exception() is not None:
+                self.add_exception(f.exception(), index)
+            else:
+                self.add(f.result(), index)
+
+        future.add_done_callback(done)
+
+    def percentile(self, q):
+        """
+        Calculate a percentile of the latencies of sends that received a
+        response, using the nearest-rank method.
+
+        :param float q: The percentile, from 0 to 100.
+        :return: The latency in seconds, or None if no sends received a
+                 response.
+        :rtype: float
+        """
+        return self._percentiles([q])[0]
+
+    def _percentiles(self, qs):
+        """
+        Calculate several latency percentiles with a single sort.
+
+        :param list(float) qs: The percentiles, from 0 to 100.
+        :return: The latencies, or Nones if no sends received a response.
+        :rtype: list(float)
+        """
+        with self._lock:
+            latencies = sorted(latency for latency in self._latency
+                               if not math.isnan(latency))
+        if not latencies:
+            return [None] * len(qs)
+        return [latencies[max(0, math.ceil(q / 100 * len(latencies)) - 1)]
+                for q in qs]
+
+    def summary(self):
+        """
+        Aggregate the results.
+
+        :return: The number of results, sends that succeeded and failed,
+                 counts of results by HTTP status (0 for no response), and
+                 50th, 90th and 99th percentile and maximum latencies.
+        :rtype: dict
+        """
+        with self._lock:
+            total = len(self._status)
+            ok = self._status.count(1)
+            by_http_status = collections.Counter(self._http_status)
+        p50, p90, p99, maximum = self._percentiles([50, 90, 99, 100])
+        return {
+            'total': total,
+            'ok': ok,
+            'failed': total - ok,
+            'by_http_status': dict(by_http_status),
+            'latency_p50': p50,
+            'latency_p90': p90,
+            'latency_p99': p99,
+            'latency_max': maximum
+        }
+
+    def failures(self):
+        """
+        Export the sends that did not succeed.
+
+        :return: A generator of tuples of each failure's index, HTTP status
+                 (0 for no response), request identifier (None if unknown)
+                 and error.
+        :rtype: generator(tuple(int, int, str, str))
+        """
+        with self._lock:
+            count = len(self._status)
+        for row in range(count):
+            if self._status[row] == 1:
+                continue
+            packed = bytes(self._request_ids[row * 16:row * 16 + 16])
+            yield (self._index[row], self._http_status[row],
+                   None if not any(packed) else str(uuid.UUID(bytes=packed)),
+                   self._error_strings[self._errors[row]])
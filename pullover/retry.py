@@ -0,0 +1,147 @@
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class RetryBudget:
+    """
+    Limits retries to a fixed ratio of recent first attempts, so when Pushover
+    degrades, retries add a bounded proportion of extra load rather than
+    multiplying it by the maximum number of tries.
+
+    Each first attempt deposits a fraction of a retry into the budget, and
+    each retry withdraws a whole one. Deposits and withdrawals expire after a
+    time-to-live. A small reserve of retries per second is always available,
+    so a process sending few messages can still retry them.
+
+    Instances are thread-safe. By default, every message send in the process
+    shares the budget returned by :func:`~pullover.retry.default()`.
+    """
+
+    # the window is tracked in this many buckets
+    _BUCKETS = 10
+
+    def __init__(self, ratio=0.2, min_per_second=1., ttl=10.,
+                 clock=time.monotonic):
+        """
+        Initialise a new, empty budget.
+
+        :param float ratio: The number of retries permitted per first attempt.
+                            Defaults to 0.2, i.e. at most 20% extra load.
+        :param float min_per_second: The number of retries per second
+                                     permitted regardless of first attempts.
+                                     Defaults to 1.
+        :param float ttl: The number of seconds deposits and withdrawals count
+                          for. Defaults to 10s.
+        :param callable clock: A function returning the current time in
+                               seconds. Defaults to the monotonic clock.
+        """
+        self._ratio = ratio
+        self._reserve = min_per_second * ttl
+        self._width = ttl / self._BUCKETS
+        self._clock = clock
+
+        # per bucket [deposits, withdrawals], indexed by bucket number modulo
+        # the number of buckets
+        self._buckets = [[0, 0] for _ in range(self._BUCKETS)]
+        self._current = math.floor(clock() / self._width)
+        self._lock = threading.Lock()
+
+        #: The number of first attempts recorded.
+        self.attempts = 0
+
+        #: The number of retries permitted.
+        self.retries = 0
+
+        #: The number of retries denied.
+        self.denied = 0
+
+    def _advance(self):
+        """
+        Expire buckets that have fallen out of the window. Must be called with
+        the lock held.
+
+        :return: The bucket for the current time.
+        :rtype: list(int)
+        """
+        now = math.floor(self._clock() / self._width)
+        for bucket in range(max(self._current + 1, now - self._BUCKETS + 1),
+                            now + 1):
+            self._buckets[bucket % self._BUCKETS] = [0, 0]
+        self._current = max(self._current, now)
+        return self._buckets[self._current % self._BUCKETS]
+
+    def _balance(self):
+        """
+        Calculate the number of retries available. Must be called with the
+        lock held, after advancing.
+
+        :return: The number of retries available.
+        :rtype: float
+        """
+        deposits = sum(bucket[0] for bucket in self._buckets)
+        withdrawals = sum(bucket[1] for bucket in self._buckets)
+        return self._reserve + deposits * self._ratio - withdrawals
+
+    @property
+    def balance(self):
+        """
+        :return: The number of retries currently available.
+        :rtype: float
+        """
+        with self._lock:
+            self._advance()
+            return self._balance()
+
+    def deposit(self):
+        """
+        Record a first attempt.
+        """
+        with self._lock:
+            self._advance()[0] += 1
+            self.attempts += 1
+
+    def withdraw(self):
+        """
+        Try to spend a retry.
+
+        :return: True if the retry may go ahead, false if the budget is
+                 exhausted.
+        :rtype: bool
+        """
+        with self._lock:
+            bucket = self._advance()
+            if self._balance() < 1:
+                self.denied += 1
+                return False
+            bucket[1] += 1
+            self.retries += 1
+            return True
+
+
+_default = RetryBudget()
+
+
+def default():
+    """
+    Retrieve the retry budget shared by all message sends.
+
+    :return: The shared budget, or None if retries are not budgeted.
+    :rtype: RetryBudget
+    """
+    return _default
+
+
+def configure(budget):
+    """
+    Replace the retry budget shared by all message sends.
+
+    :param RetryBudget budget: The new budget, or None to allow every retry
+                               permitted by each send's maximum tries.
+    """
+    global _default
+    _default = budget
@@ -0,0 +1,275 @@
+import json
+import re
+
+from pullover import message
+from pullover.user import User
+
+
+# priority names accepted in rules
+_PRIORITIES = {
+    'lowest': -2,
+    'low': -1,
+    'normal': 0,
+    'high': 1,
+    'emergency': 2
+}
+
+
+def _priority(value):
+    """
+    Interpret a rule's priority.
+
+    :param value: A priority name, e.g. ``'high'``, or integer.
+    :type value: str or int
+    :return: The priority.
+    :rtype: int
+    :raises ValueError: If the priority is not recognised.
+    """
+    if isinstance(value, int) and value in _PRIORITIES.values():
+        return value
+    if value in _PRIORITIES:
+        return _PRIORITIES[value]
+    raise ValueError("'{0}' is not a recognised priority".format(value))
+
+
+class _Rule:
+    """
+    A compiled routing rule.
+    """
+
+    def __init__(self, spec, recipients):
+        """
+        Compile a rule.
+
+        :param dict spec: The rule, as described by :class:`Router`.
+        :param dict recipients: Recipient sets by name, as lists of users.
+        :raises ValueError: If the rule is invalid.
+        """
+        try:
+            names = spec['recipients']
+        except KeyError:
+            raise ValueError('Routing rules must have recipients')
+        unknown = [name for name in names if name not in recipients]
+        if unknown:
+            raise ValueError('Unknown recipient sets: {0}'.format(
+                ', '.join(unknown)))
+
+        self.users = [user for name in names for user in recipients[name]]
+        self.priority = _priority(spec.get('priority', 'normal'))
+        self.retry = spec.get('retry')
+        self.expire = spec.get('expire')
+        self.sound = spec.get('sound')
+        self.continue_ = bool(spec.get('continue', False))
+
+        # e.g. an emergency rule without a retry interval and expiry; fail now
+        # rather than when an event first matches
+        message.Message('rule', priority=self.priority, retry=self.retry,
+                        expire=self.expire)
+
+        # label -> set of accepted values, for the index
+        self.equal = {}
+
+        # (label, predicate) pairs checked after the index
+        self.residual = []
+
+        for label, matcher in spec.get('match', {}).items():
+            if isinstance(matcher, str):
+                self.equal[label] = {matcher}
+            elif isinstance(matcher, list):
+                self.equal[label] = set(matcher)
+            elif isinstance(matcher, dict) and 'regex' in matcher:
+                pattern = re.compile(matcher['regex'])
+                self.residual.append(
+                    (label, lambda value, pattern=pattern:
+                     value is not None and
+                     pattern.fullmatch(value) is not None))
+            elif isinstance(matcher, dict) and 'not' in matcher:
+                excluded = matcher['not']
+                excluded = {excluded} if isinstance(excluded, str) \
+                    else set(excluded)
+                self.residual.append(
+                    (label, lambda value, excluded=excluded:
+                     value not in excluded))
+            else:
+                raise ValueError("Invalid matcher for label '{0}'".format(
+                    label))
+
+    def matches_residual(self, labels):
+        """
+        Check the matchers not covered by the index.
+
+        :param dict labels: The event's labels.
+        :return: True if all match.
+        :rtype: bool
+        """
+        return all(predicate(labels.get(label))
+                   for label, predicate in self.residual)
+
+
+class Router:
+    """
+    Decides which users receive which messages, at what priority, by
+    matching events' labels against an ordered list of rules.
+
+    A configuration is a dictionary, e.g. loaded from JSON::
+
+        {
+            "recipients": {
+                "db-oncall": [{"user": "uQiRzpo4DX", "devices": ["phone"]}],
+                "everyone": [{"user": "uQiRzpo4DX"}, {"user": "gznej3rKEV"}]
+            },
+            "rules": [
+                {"match": {"team": "db", "severity": ["critical", "page"]},
+                 "recipients": ["db-oncall"], "priority": "emergency",
+                 "retry": 60, "expire": 3600, "continue": true},
+                {"match": {"env": {"not": "dev"}, "host": {"regex": "db-.*"}},
+                 "recipients": ["everyone"], "priority": "high",
+                 "sound": "siren"}
+            ]
+        }
+
+    A rule matches an event if every one of its label matchers does: a string
+    requires that value, a list any of its values, ``{"regex": ...}`` a full
+    match and ``{"not": ...}`` any other value. A rule may also set the
+    ``"sound"`` of its messages. Rules are tried in order, and
+    matching stops at the first matching rule unless it has ``"continue":
+    true``.
+
+    Rules are compiled into an index from each label value to the set of
+    rules accepting it, as bit masks, so finding the candidate rules for an
+    event costs a few integer operations per indexed label however many rules
+    there are. Only candidates' regular expression and negated matchers are
+    evaluated.
+    """
+
+    def __init__(self, config, application):
+        """
+        Compile a routing configuration.
+
+        :param dict config: The configuration.
+        :param Application application: The application to send messages
+                                        from.
+        :raises ValueError: If the configuration is invalid.
+        """
+        self._application = application
+        recipients = {
+            name: [User(member['user'], member.get('devices'))
+                   for member in members]
+            for name, members in config.get('recipients', {}).items()}
+        self._rules = [_Rule(spec, recipients)
+                       for spec in config.get('rules', [])]
+
+        # label -> value -> mask of rules requiring that value
+        self._index = {}
+
+        # label -> mask of rules not constraining the label by value
+        self._wildcards = {}
+
+        everything = (1 << len(self._rules)) - 1
+        for bit, rule in enumerate(self._rules):
+            for label, values in rule.equal.items():
+                by_value = self._index.setdefault(label, {})
+                for value in values:
+                    by_value[value] = by_value.get(value, 0) | 1 << bit
+        for label in self._index:
+            constrained = 0
+            for mask in self._index[label].values():
+                constrained |= mask
+            self._wildcards[label] = everything & ~constrained
+        self._everything = everything
+
+    @classmethod
+    def from_file(cls, path, application):
+        """
+        Load and compile a routing configuration from a JSON file.
+
+        :param str path: The file.
+        :param Application application: The application to send messages
+                                        from.
+        :return: The router.
+        :rtype: Router
+        :raises ValueError: If the configuration is invalid.
+        """
+        with open(path) as f:
+            return cls(json.load(f), application)
+
+    def rules(self, labels):
+        """
+        Find the rules an event matches, and which would be applied.
+
+        :param dict labels: The event's labels.
+        :return: The indices of the applied rules, in order.
+        :rtype: list(int)
+        """
+        candidates = self._everything
+        for label, by_value in self._index.items():
+            candidates &= by_value.get(labels.get(label), 0) | \
+                self._wildcards[label]
+            if not candidates:
+                return []
+
+        applied = []
+        while candidates:
+            lowest = candidates & -candidates
+            bit = lowest.bit_length() - 1
+            candidates ^= lowest
+            rule = self._rules[bit]
+            if rule.matches_residual(labels):
+                applied.append(bit)
+                if not rule.continue_:
+                    break
+        return applied
+
+    def route(self, labels, body, title=None, **kwargs):
+        """
+        Turn an event into the messages to send. Each user receives the
+        event once, at the highest priority of the rules that matched them,
+        on the union of the devices those rules target. Its retry interval,
+        expiry and sound are those of the first matching rule at that
+        priority.
+
+        :param dict labels: The event's labels.
+        :param str body: The contents of the message.
+        :param str title: The message heading.
+        :param kwargs: Additional parameters to pass to
+                       :class:`~pullover.Message`'s initialiser, other than
+                       the priority, retry and expiry. A rule's sound takes
+                       precedence over one given here.
+        :return: The prepared messages, which may be empty.
+        :rtype: list(PreparedMessage)
+        """
+        # user key -> [rule, devices]; the rule with the highest priority
+        # wins, and devices is None if any winning rule targets all of the
+        # user's devices
+        chosen = {}
+        for bit in self.rules(labels):
+            rule = self._rules[bit]
+            for user in rule.users:
+                current = chosen.get(user.key)
+                devices = None if user.devices is None else set(user.devices)
+                if current is None or rule.priority > current[0].priority:
+                    chosen[user.key] = [rule, devices]
+                elif rule.priority == current[0].priority and \
+                        current[1] is not None:
+                    if devices is None:
+                        current[1] = None
+                    else:
+                        current[1] |= devices
+
+        # one message per distinct set of rule parameters
+        messages = {}
+        prepared = []
+        for user_key, (rule, devices) in chosen.items():
+            key = (rule.priority, rule.retry, rule.expire, rule.sound)
+            msg = messages.get(key)
+            if msg is None:
+                options = dict(kwargs)
+                if rule.sound is not None:
+                    options['sound'] = rule.sound
+                msg = message.Message(body, title, priority=rule.priority,
+                                      retry=rule.retry, expire=rule.expire,
+                                      **options)
+                messages[key] = msg
+            prepared.append(msg.prepare(self._application, User(
+                user_key, None if devices is None else sorted(devices))))
+        return prepared
@@ -0,0 +1,497 @@
+import logging
+import atexit
+import datetime
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import concurrent.futures
+
+from pullover import message, tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledSend:
+    """
+    A prepared message waiting to be sent at a future time.
+    """
+
+    def __init__(self, scheduler, id_, prepared, when):
+        """
+        Initialise a new scheduled send. Instances are created by
+        :meth:`Scheduler.schedule()`.
+
+        :param Scheduler scheduler: The scheduler holding the message.
+        :param str id_: The identifier of the scheduled send.
+        :param PreparedMessage prepared: The message to send.
+        :param float when: When to send it, in seconds since the epoch.
+        """
+        self._scheduler = scheduler
+        self._id = id_
+        self._prepared = prepared
+        self._when = when
+
+        #: A future that resolves to the result of the send attempt once the
+        #: message has been sent, and is cancelled if the send is.
+        self.future = concurrent.futures.Future()
+
+    @property
+    def id(self):
+        """
+        :return: The identifier of the scheduled send, unique within its
+                 scheduler and stable across restarts if it is persisted.
+        :rtype: str
+        """
+        return self._id
+
+    @property
+    def prepared(self):
+        """
+        :return: The message to send.
+        :rtype: PreparedMessage
+        """
+        return self._prepared
+
+    @property
+    def when(self):
+        """
+        :return: When the message will be sent.
+        :rtype: datetime.datetime
+        """
+        return datetime.datetime.fromtimestamp(self._when,
+                                               datetime.timezone.utc)
+
+    def cancel(self):
+        """
+        Stop the message being sent, if it has not been handed to the send
+        queue yet.
+
+        :return: True if the send was cancelled, false if it is too late.
+        :rtype: bool
+        """
+        return self._scheduler.cancel(self._id)
+
+    def __str__(self):
+        return '{0.__class__.__name__}({0._prepared.message}, ' \
+               '{1})'.format(self, self.when.isoformat())
+
+
+class Scheduler:
+    """
+    Sends prepared messages at future times, e.g. reminders, or escalations
+    if an alert is not acknowledged.
+
+    Pending sends are kept in a min-heap ordered by due time, with a single
+    thread sleeping until the earliest is due, so scheduling and cancelling
+    take O(log n) time however many sends are pending. Due messages are put on
+    the shared send queue rather than sent by the timer thread, so a slow
+    send never delays the next one.
+
+    If given a path, pending sends are also persisted in an SQLite database,
+    and are reloaded when a scheduler is next created with the same path.
+    Sends that fell due while no scheduler was running are sent immediately.
+    A send is only removed from the database once it has completed, so one
+    interrupted by a crash is sent again; use :meth:`schedule_many()` to
+    persist many sends in a single transaction.
+    """
+
+    # rebuild the heap once it holds this many times more entries than are
+    # pending, to bound the memory held by cancelled sends
+    _COMPACT_RATIO = 2
+
+    def __init__(self, path=None, clock=time.time):
+        """
+        Initialise a new scheduler, starting its timer thread.
+
+        :param str path: The SQLite database to persist pending sends in.
+                         Created if it does not exist. Defaults to keeping
+                         them in memory only. Note the database contains
+                         application tokens and user keys.
+        :param callable clock: A function returning the current time in
+                               seconds since the epoch. Defaults to the
+                               system clock.
+        """
+        self._clock = clock
+
+        # id -> (ScheduledSend, send kwargs, tracing context) for every
+        # pending send
+        self._pending = {}
+
+        # (due, seq, id) entries; may include cancelled sends, which are
+        # skipped when they reach the top
+        self._heap = []
+        self._seq = itertools.count()
+
+        # ids of persisted sends that have completed, to delete in a batch
+        self._finished = []
+
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db:
+                self._db.execute('CREATE TABLE IF NOT EXISTS schedule ('
+                                 'id TEXT PRIMARY KEY, '
+                                 'due REAL NOT NULL, '
+                                 'message TEXT NOT NULL, '
+                                 'kwargs TEXT NOT NULL)')
+            self._load()
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='pullover-scheduler',
+                                        daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        """
+        Restore the sends persisted in the database.
+        """
+        rows = self._db.execute('SELECT id, due, message, kwargs '
+                                'FROM schedule').fetchall()
+        for id_, due, data, kwargs in rows:
+            prepared = message.PreparedMessage.from_dict(json.loads(data))
+            self._add(ScheduledSend(self, id_, prepared, due),
+                      json.loads(kwargs))
+        if rows:
+            logger.info('Restored %d scheduled sends', len(rows))
+
+    def _add(self, scheduled, kwargs, context=None):
+        """
+        Track a pending send. Must be called with the lock held, or before
+        the timer thread starts.
+
+        :param ScheduledSend scheduled: The send.
+        :param dict kwargs: Parameters to send the message with.
+        :param contextvars.Context context: The tracing context to send the
+                                            message in. Not persisted.
+        """
+        self._pending[scheduled.id] = (scheduled, kwargs, context)
+        heapq.heappush(self._heap,
+                       (scheduled._when, next(self._seq), scheduled.id))
+
+    @property
+    def pending(self):
+        """
+        :return: The number of sends waiting to be due.
+        :rtype: int
+        """
+        return len(self._pending)
+
+    def schedule(self, prepared, when, **kwargs):
+        """
+        Send a prepared message at a future time.
+
+        :param PreparedMessage prepared: The message to send.
+        :param when: When to send the message, as an aware datetime or
+                     seconds since the epoch. Times in the past send the
+                     message as soon as possible.
+        :type when: datetime.datetime or float
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`. If
+                       the scheduler is persistent, they must be JSON
+                       serialisable.
+        :return: The scheduled send.
+        :rtype: ScheduledSend
+        :raises TypeError: If the scheduler is persistent, and a parameter
+                           is not JSON serialisable.
+        :raises RuntimeError: If the scheduler has been closed.
+        """
+        return self.schedule_many([(prepared, when)], **kwargs)[0]
+
+    def schedule_many(self, sends, **kwargs):
+        """
+        Send several prepared messages at future times. If the scheduler is
+        persistent, they are stored in a single transaction, which is much
+        faster than scheduling each individually.
+
+        :param iterable sends: (prepared message, when) pairs, as for
+                               :meth:`schedule()`.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>` for
+                       every message. If the scheduler is persistent, they
+                       must be JSON serialisable.
+        :return: The scheduled sends, in order.
+        :rtype: list(ScheduledSend)
+        :raises TypeError: If the scheduler is persistent, and a parameter
+                           is not JSON serialisable.
+        :raises RuntimeError: If the scheduler has been closed.
+        """
+        context = tracing.capture()
+        scheduled = []
+        for prepared, when in sends:
+            if isinstance(when, datetime.datetime):
+                when = when.timestamp()
+            scheduled.append(ScheduledSend(self, uuid.uuid4().hex, prepared,
+                                           when))
+        rows = None
+        if self._db is not None:
+            encoded = json.dumps(kwargs)
+            rows = [(send.id, send._when,
+                     json.dumps(send.prepared.to_dict()), encoded)
+                    for send in scheduled]
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot schedule on a closed scheduler')
+            if rows:
+                with self._db:
+                    self._db.executemany(
+                        'INSERT INTO schedule VALUES (?, ?, ?, ?)', rows)
+            earliest = self._heap[0][0] if self._heap else None
+            for send in scheduled:
+                self._add(send, kwargs, context)
+            if self._heap and self._heap[0][0] != earliest:
+                # a new send is the earliest; the timer must wake sooner
+                self._cond.notify_all()
+        for send in scheduled:
+            logger.debug('Scheduled %s', send)
+        return scheduled
+
+    def _remove(self, id_):
+        """
+        Stop tracking a pending send. Must be called with the lock held.
+
+        :param str id_: The send's identifier.
+        :return: The send, its parameters and tracing context, or None if it
+                 is not pending.
+        :rtype: tuple(ScheduledSend, dict, contextvars.Context)
+        """
+        return self._pending.pop(id_, None)
+
+    def _finish(self, id_):
+        """
+        Record that a send has completed, so it can be deleted from the
+        database. May be called from any thread.
+
+        :param str id_: The send's identifier.
+        """
+        if self._db is None:
+            return
+        with self._cond:
+            self._finished.append(id_)
+            if len(self._finished) == 1:
+                self._cond.notify_all()
+
+    def _delete_finished(self):
+        """
+        Delete completed sends from the database in a single transaction.
+        Must be called with the lock held.
+        """
+        if self._finished:
+            with self._db:
+                self._db.executemany('DELETE FROM schedule WHERE id = ?',
+                                     [(id_,) for id_ in self._finished])
+            self._finished = []
+
+    def cancel(self, id_):
+        """
+        Stop a message being sent, if it is still pending.
+
+        :param str id_: The identifier of the scheduled send.
+        :return: True if the send was cancelled, false if it was not pending.
+        :rtype: bool
+        """
+        with self._cond:
+            entry = self._remove(id_)
+            if entry is None:
+                return False
+            if self._db is not None:
+                with self._db:
+                    self._db.execute('DELETE FROM schedule WHERE id = ?',
+                                     (id_,))
+            if len(self._heap) > self._COMPACT_RATIO * len(self._pending) \
+                    + 64:
+                self._heap = [item for item in self._heap
+                              if item[2] in self._pending]
+                heapq.heapify(self._heap)
+        scheduled, _, _ = entry
+        scheduled.future.cancel()
+        logger.debug('Cancelled %s', scheduled)
+        return True
+
+    def _next_due(self):
+        """
+        Remove the earliest pending send if it is due. Must be called with the
+        lock held.
+
+        :return: The send, its parameters and tracing context, or None if
+                 nothing is due yet.
+        :rtype: tuple(ScheduledSend, dict, contextvars.Context)
+        """
+        while self._heap and self._heap[0][2] not in self._pending:
+            heapq.heappop(self._heap)  # cancelled
+        if not self._heap or self._heap[0][0] > self._clock():
+            return None
+        _, _, id_ = heapq.heappop(self._heap)
+        return self._remove(id_)
+
+    def _delay(self):
+        """
+        Find how long the timer thread can sleep. Must be called with the lock
+        held.
+
+        :return: The number of seconds until the earliest send is due, or None
+                 if nothing is pending.
+        :rtype: float
+        """
+        if not self._heap:
+            return None
+        return max(0., self._heap[0][0] - self._clock())
+
+    def _run(self):
+        """
+        The main loop of the timer thread.
+        """
+        while True:
+            with self._cond:
+                self._delete_finished()
+                entry = self._next_due()
+                while entry is None:
+                    if self._closed:
+                        return
+                    self._cond.wait(self._delay())
+                    self._delete_finished()
+                    entry = self._next_due()
+
+            scheduled, kwargs, context = entry
+            if not scheduled.future.set_running_or_notify_cancel():
+                self._finish(scheduled.id)
+                continue
+            logger.debug('Sending %s', scheduled)
+            try:
+                # queued in the scheduling caller's context, so the send's
+                # spans have its span as parent
+                future = tracing.run(context, scheduled.prepared.submit,
+                                     **kwargs)
+            except BaseException as e:
+                logger.exception('Failed to queue %s', scheduled)
+                scheduled.future.set_exception(e)
+                self._finish(scheduled.id)
+            else:
+                future.add_done_callback(
+                    lambda f, scheduled=scheduled: self._sent(scheduled, f))
+
+    def _sent(self, scheduled, future):
+        """
+        Complete a scheduled send once its message has been sent.
+
+        :param ScheduledSend scheduled: The send.
+        :param concurrent.futures.Future future: The completed future of the
+                                                 send queue.
+        """
+        self._finish(scheduled.id)
+        _chain(future, scheduled.future)
+
+    def close(self):
+        """
+        Stop the timer thread. Pending sends are not sent; if the scheduler is
+        persistent, they will be restored by the next scheduler created with
+        the same path; either way, their futures are cancelled.
+        """
+        with self._cond:
+            self._closed = True
+            pending = self._pending
+            self._pending = {}
+            self._heap = []
+            self._cond.notify_all()
+        for scheduled, _, _ in pending.values():
+            scheduled.future.cancel()
+        self._thread.join()
+        if self._db is not None:
+            with self._cond:
+                self._delete_finished()
+                # sends still in flight are sent again by the next scheduler
+                db, self._db = self._db, None
+            db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _chain(source, target):
+    """
+    Copy the outcome of one completed future to another.
+
+    :param concurrent.futures.Future source: The completed future.
+    :param concurrent.futures.Future target: The future to resolve.
+    """
+    if source.cancelled():
+        target.set_exception(concurrent.futures.CancelledError())
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+# (pid, scheduler) tuple; the timer thread does not survive fork(), so a child
+# must not use its parent's scheduler
+_default = (None, None)
+_default_lock = threading.Lock()
+
+
+def default():
+    """
+    Retrieve the scheduler shared by :meth:`PreparedMessage.send_at()
+    <pullover.PreparedMessage.send_at()>`. Unless :func:`configure()` has been
+    called in this process, it is created on first use, without persistence.
+
+    :return: The shared scheduler.
+    :rtype: Scheduler
+    """
+    global _default
+    pid = os.getpid()
+    owner, scheduler = _default
+    if owner != pid:
+        with _default_lock:
+            owner, scheduler = _default
+            if owner != pid:
+                scheduler = Scheduler()
+                _default = (pid, scheduler)
+    return scheduler
+
+
+def configure(scheduler=None, **kwargs):
+    """
+    Replace the shared scheduler, e.g. with a persistent one. Sends pending in
+    the previous scheduler are dropped, unless it was persistent.
+
+    :param Scheduler scheduler: The scheduler to use. Defaults to creating a
+                                new one.
+    :param kwargs: Parameters to create the new scheduler with, if one is not
+                   provided. See :meth:`Scheduler.__init__()`.
+    :return: The new shared scheduler.
+    :rtype: Scheduler
+    """
+    global _default
+    if scheduler is None:
+        scheduler = Scheduler(**kwargs)
+    with _default_lock:
+        owner, previous = _default
+        _default = (os.getpid(), scheduler)
+    if previous is not None and owner == os.getpid():
+        previous.close()
+    return scheduler
+
+
+@atexit.register
+def _close_default():
+    """
+    Stop the shared scheduler's timer thread before the interpreter exits.
+    """
+    owner, scheduler = _default
+    if scheduler is not None and owner == os.getpid():
+        if scheduler.pending:
+            logger.warning('Exiting with %d scheduled sends pending',
+                           scheduler.pending)
+        scheduler.close()
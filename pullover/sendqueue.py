@@ -0,0 +1,377 @@
+import logging
+import atexit
+import collections
+import itertools
+import os
+import threading
+import concurrent.futures
+
+from pullover import tracing
+from pullover.exceptions import PulloverError
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(PulloverError):
+    """
+    Raised by :meth:`~pullover.sendqueue.SendQueue.put()` if a message could
+    not be queued, and set on the futures of queued messages that were
+    dropped to make room for others.
+    """
+
+
+class SendQueue:
+    """
+    A bounded in-memory queue of prepared messages, with a pool of worker
+    threads sending them in the order they were queued. If Pushover is slow
+    or down, the queue fills up rather than growing without limit, and an
+    overflow policy decides what happens to further messages.
+    """
+
+    #: Wait for room in the queue.
+    BLOCK = 'block'
+
+    #: Raise :class:`~pullover.sendqueue.QueueFullError` for the new message.
+    REJECT = 'reject'
+
+    #: Drop the message that has been queued the longest.
+    DROP_OLDEST = 'drop-oldest'
+
+    #: Drop the oldest message with the lowest priority, including the new
+    #: message.
+    DROP_LOWEST_PRIORITY = 'drop-lowest-priority'
+
+    _POLICIES = (BLOCK, REJECT, DROP_OLDEST, DROP_LOWEST_PRIORITY)
+
+    _DEFAULT_MAXSIZE = 1000
+    _DEFAULT_WORKERS = 4
+
+    def __init__(self, maxsize=_DEFAULT_MAXSIZE, policy=BLOCK,
+                 workers=_DEFAULT_WORKERS, block_timeout=None, limiter=None,
+                 **kwargs):
+        """
+        Initialise a new queue, starting its worker threads.
+
+        :param int maxsize: The maximum number of messages waiting to be sent.
+                            Defaults to 1000.
+        :param str policy: What to do with a message put in a full queue, e.g.
+                           :attr:`~pullover.sendqueue.SendQueue.BLOCK`, the
+                           default.
+        :param int workers: The maximum number of messages to send
+                            concurrently. Defaults to 4.
+        :param float block_timeout: With the block policy, the maximum number
+                                    of seconds to wait for room before
+                                    rejecting the message. Defaults to waiting
+                                    indefinitely.
+        :param AimdLimiter limiter: Adapts the number of messages sent
+                                    concurrently, up to the number of workers,
+                                    to what Pushover can sustain. Defaults to
+                                    always using every worker.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>` for
+                       every message.
+        :raises ValueError: If the policy is not recognised, or the size or
+                            number of workers is less than one.
+        """
+        if policy not in self._POLICIES:
+            raise ValueError("'{0}' is not a recognised policy".format(policy))
+        if maxsize < 1 or workers < 1:
+            raise ValueError('A send queue needs a size and workers of at '
+                             'least one')
+
+        self._maxsize = maxsize
+        self._policy = policy
+        self._block_timeout = block_timeout
+        self._limiter = limiter
+        self._kwargs = kwargs
+
+        # seq -> (prepared message, send kwargs, future, tracing context),
+        # oldest first
+        self._items = collections.OrderedDict()
+
+        # priority -> deque of seqs, oldest first; only maintained for the
+        # drop lowest priority policy
+        self._by_priority = collections.defaultdict(collections.deque)
+
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        #: The number of queued messages dropped to make room for others.
+        self.dropped = 0
+
+        #: The number of messages that were not queued.
+        self.rejected = 0
+
+        #: The number of messages sent, successfully or otherwise.
+        self.sent = 0
+
+        self._workers = [
+            threading.Thread(target=self._work,
+                             name='pullover-sendqueue-{0}'.format(i),
+                             daemon=True)
+            for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def depth(self):
+        """
+        :return: The number of messages waiting to be sent, excluding those
+                 being sent.
+        :rtype: int
+        """
+        return len(self._items)
+
+    def _track_priority(self):
+        return self._policy == self.DROP_LOWEST_PRIORITY
+
+    def _drop(self, seq):
+        """
+        Remove a queued message, failing its future unless the caller has
+        already cancelled it. Must be called with the lock held.
+
+        :param int seq: The message's sequence number.
+        """
+        prepared, _, future, _ = self._items.pop(seq)
+        if self._track_priority():
+            self._by_priority[prepared.message.priority].remove(seq)
+        # once running, the future can no longer be cancelled
+        if future.set_running_or_notify_cancel():
+            self.dropped += 1
+            logger.warning('Send queue full; dropped %s', prepared.message)
+            future.set_exception(QueueFullError(
+                'Dropped from full send queue'))
+
+    def _lowest(self):
+        """
+        Find the oldest queued message with the lowest priority. Must be
+        called with the lock held.
+
+        :return: The message's priority and sequence number.
+        :rtype: tuple(int, int)
+        """
+        priority = min(p for p, seqs in self._by_priority.items() if seqs)
+        return priority, self._by_priority[priority][0]
+
+    def _make_room(self, prepared):
+        """
+        Apply the overflow policy to a message being put in a full queue. Must
+        be called with the lock held.
+
+        :param PreparedMessage prepared: The message being put.
+        :return: True if the message should be queued, false if it was
+                 dropped.
+        :rtype: bool
+        :raises QueueFullError: If the message was rejected.
+        :raises RuntimeError: If the queue was closed while waiting for room.
+        """
+        if self._policy == self.BLOCK:
+            if not self._cond.wait_for(
+                    lambda: len(self._items) < self._maxsize or self._closed,
+                    self._block_timeout):
+                self.rejected += 1
+                raise QueueFullError('Timed out waiting for room in the '
+                                     'send queue')
+            if self._closed:
+                raise RuntimeError('Send queue closed while waiting')
+            return True
+
+        if self._policy == self.REJECT:
+            self.rejected += 1
+            raise QueueFullError('Send queue is full')
+
+        if self._policy == self.DROP_OLDEST:
+            self._drop(next(iter(self._items)))
+            return True
+
+        priority, seq = self._lowest()
+        if prepared.message.priority < priority:
+            self.dropped += 1
+            return False
+        self._drop(seq)
+        return True
+
+    def put(self, prepared, **kwargs):
+        """
+        Queue a prepared message for sending.
+
+        :param PreparedMessage prepared: The prepared message to send.
+        :param kwargs: Additional parameters to pass to
+                       :meth:`Message.send() <pullover.Message.send()>`,
+                       overriding those given to the queue.
+        :return: A future that resolves to the result of the send attempt. If
+                 the message is dropped, its exception is a
+                 :class:`~pullover.sendqueue.QueueFullError`.
+        :rtype: concurrent.futures.Future
+        :raises QueueFullError: If the queue is full and the policy is reject,
+                                or block with a timeout that expired.
+        :raises RuntimeError: If the queue has been closed.
+        """
+        future = concurrent.futures.Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot put to a closed send queue')
+            if len(self._items) >= self._maxsize and \
+                    not self._make_room(prepared):
+                future.set_exception(QueueFullError(
+                    'Dropped from full send queue'))
+                return future
+
+            seq = next(self._seq)
+            self._items[seq] = (prepared, kwargs, future, tracing.capture())
+            if self._track_priority():
+                self._by_priority[prepared.message.priority].append(seq)
+            self._cond.notify_all()
+        return future
+
+    def _work(self):
+        """
+        The main loop of each worker thread.
+        """
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items or self._closed)
+                if not self._items:
+                    return
+                _, (prepared, kwargs, future, context) = \
+                    self._items.popitem(last=False)
+                if self._track_priority():
+                    # the oldest message overall is the oldest at its priority
+                    self._by_priority[prepared.message.priority].popleft()
+                self._in_flight += 1
+                self._cond.notify_all()
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    send_kwargs = dict(self._kwargs, **kwargs)
+                    if self._limiter is None:
+                        response = tracing.run(context, prepared.send,
+                                               **send_kwargs)
+                    else:
+                        response = tracing.run(context, self._limiter.send,
+                                               prepared, **send_kwargs)
+                    future.set_result(response)
+            except BaseException as e:
+                logger.exception('Failed to send %s', prepared.message)
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self.sent += 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait for all queued messages to be sent.
+
+        :param float timeout: The maximum number of seconds to wait. Defaults
+                              to waiting indefinitely.
+        :return: True if all messages were sent, false if the timeout expired.
+        :rtype: bool
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._items and not self._in_flight, timeout)
+
+    def close(self, timeout=None):
+        """
+        Stop accepting messages, wait for queued ones to be sent, and stop the
+        worker threads. Messages still queued when the timeout expires will be
+        sent in the background.
+
+        :param float timeout: The maximum number of seconds to wait. Defaults
+                              to waiting indefinitely.
+        :return: True if all messages were sent, false if the timeout expired.
+        :rtype: bool
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        return self.flush(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# (pid, queue) tuple; worker threads do not survive fork(), so a child must
+# not use its parent's queue
+_default = (None, None)
+_default_lock = threading.Lock()
+
+
+def _reset():
+    """
+    Forget the parent's queue in a newly forked child, whose copy has no
+    worker threads.
+    """
+    global _default, _default_lock
+    _default = (None, None)
+    _default_lock = threading.Lock()  # may have been held by another thread
+
+
+if hasattr(os, 'register_at_fork'):  # Python 3.7+; default() checks the PID
+    os.register_at_fork(after_in_child=_reset)
+
+# how long to wait for the shared queue to drain when the interpreter exits
+_EXIT_TIMEOUT = 5
+
+
+def default():
+    """
+    Retrieve the send queue shared by :meth:`PreparedMessage.submit()
+    <pullover.PreparedMessage.submit()>`. Unless :func:`configure()` has been
+    called in this process, it is created on first use with default settings.
+
+    :return: The shared send queue.
+    :rtype: SendQueue
+    """
+    global _default
+    pid = os.getpid()
+    owner, queue = _default
+    if owner != pid:
+        with _default_lock:
+            owner, queue = _default
+            if owner != pid:
+                queue = SendQueue()
+                _default = (pid, queue)
+    return queue
+
+
+def configure(queue=None, **kwargs):
+    """
+    Replace the shared send queue. Messages already in the previous queue are
+    still sent.
+
+    :param SendQueue queue: The queue to use. Defaults to creating a new one.
+    :param kwargs: Parameters to create the new queue with, if one is not
+                   provided. See :meth:`SendQueue.__init__()`.
+    :return: The new shared queue.
+    :rtype: SendQueue
+    """
+    global _default
+    if queue is None:
+        queue = SendQueue(**kwargs)
+    with _default_lock:
+        owner, previous = _default
+        _default = (os.getpid(), queue)
+    if previous is not None and owner == os.getpid():
+        previous.close(timeout=0)
+    return queue
+
+
+@atexit.register
+def _close_default():
+    """
+    Give messages in the shared queue a chance to be sent before the
+    interpreter exits.
+    """
+    owner, queue = _default
+    if queue is not None and owner == os.getpid():
+        if not queue.close(_EXIT_TIMEOUT):
+            logger.warning('Exiting with %d messages unsent', queue.depth)
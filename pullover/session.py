@@ -0,0 +1,228 @@
+import logging
+import os
+import queue
+import threading
+import urllib.parse
+import concurrent.futures
+import requests
+from urllib3.util.connection import is_connection_dropped
+
+import pullover
+
+
+logger = logging.getLogger(__name__)
+
+# (pid, session) tuple, replaced atomically so readers never see a session
+# paired with the wrong process
+_state = (None, None)
+_lock = threading.Lock()
+
+
+def _reset():
+    """
+    Forget the parent's session in a newly forked child. The parent's
+    connections are abandoned rather than closed, as closing them could
+    interfere with requests the parent has in flight.
+    """
+    global _state, _lock
+    _state = (None, None)
+    _lock = threading.Lock()  # may have been held by another parent thread
+
+
+if hasattr(os, 'register_at_fork'):  # Python 3.7+; get() checks the PID too
+    os.register_at_fork(after_in_child=_reset)
+
+
+def get():
+    """
+    Retrieve the requests session shared by everything in pullover. Allows
+    connection re-use between messages.
+
+    There is one session per process. It is created lazily, so a process
+    forked from one that has already sent messages (e.g. a pre-fork server
+    worker) gets its own connection pool rather than sharing the parent's
+    sockets. The session is safe to use from multiple threads, as its
+    underlying urllib3 connection pools are locked.
+
+    :return: A new requests session if this is the first call in the current
+             process, otherwise the existing one.
+    :rtype: requests.Session
+    """
+    global _state
+    pid = os.getpid()
+    owner, sess = _state
+    if owner != pid:
+        with _lock:
+            owner, sess = _state
+            if owner != pid:
+                if owner is not None:
+                    logger.debug('Process %d forked from %d; creating a new '
+                                 'session', pid, owner)
+                sess = requests.session()
+                _state = (pid, sess)
+    return sess
+
+
+def _pool(url):
+    """
+    Find the urllib3 connection pool the shared session will use for requests
+    to a URL. This goes through the same adapter logic as
+    :meth:`requests.Session.send()`, so connections opened in the returned
+    pool are the ones real requests will pick up.
+
+    :param str url: The URL requests will be sent to.
+    :return: The connection pool for the URL's host.
+    :rtype: urllib3.HTTPConnectionPool
+    """
+    sess = get()
+    adapter = sess.get_adapter(url)
+    prepared = requests.Request('POST', url).prepare()
+    if hasattr(adapter, 'get_connection_with_tls_context'):
+        return adapter.get_connection_with_tls_context(
+            prepared,
+            verify=sess.verify,
+            proxies=sess.rebuild_proxies(prepared, sess.proxies),
+            cert=sess.cert)
+    return adapter.get_connection(url, sess.proxies)  # requests < 2.32.2
+
+
+def _connect(conn):
+    """
+    Open a connection if it is not already established.
+
+    :param urllib3.HTTPConnection conn: The connection to open.
+    :return: True if the connection is now open, false if it failed.
+    :rtype: bool
+    """
+    try:
+        if conn.sock is None:
+            conn.connect()
+        return True
+    except OSError as e:
+        logger.warning('Failed to open connection to %s: %s', conn.host, e)
+        conn.close()
+        return False
+
+
+def warmup(url, connections=1):
+    """
+    Pre-open pooled connections to a URL, so the first requests sent to it do
+    not pay DNS, TCP and TLS setup. Connections are opened in parallel. This
+    method never raises on connection failure; failed connections are
+    returned to the pool unopened.
+
+    :param str url: The URL to open connections for.
+    :param int connections: The number of connections to open. This is capped
+                            at the size of the session's connection pool, as
+                            urllib3 discards any more than that.
+    :return: The number of connections successfully opened.
+    :rtype: int
+    """
+    pool = _pool(url)
+    if connections > pool.pool.maxsize:
+        logger.warning('Capping warm-up at the pool size of %d connections',
+                       pool.pool.maxsize)
+        connections = pool.pool.maxsize
+
+    conns = [pool._get_conn() for _ in range(connections)]
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(connections, 1)) as executor:
+            opened = sum(executor.map(_connect, conns))
+    finally:
+        for conn in conns:
+            pool._put_conn(conn)
+    logger.debug('Opened %d/%d connections to %s', opened, connections,
+                 pool.host)
+    return opened
+
+
+class KeepAlive(threading.Thread):
+    """
+    A background thread that periodically refreshes idle pooled connections
+    to a URL, so they are not closed by the server during quiet periods. Each
+    refresh sends a ``HEAD`` request over every idle connection, which resets
+    the server's idle timer without sending a message; connections the server
+    has closed anyway are re-opened.
+    """
+
+    # should be comfortably below the server's keep-alive timeout
+    _DEFAULT_INTERVAL = 30
+
+    def __init__(self, url, interval=_DEFAULT_INTERVAL):
+        """
+        Initialise a new keep-alive thread. It must be started with
+        :meth:`start()`.
+
+        :param str url: The URL whose connections to keep alive.
+        :param float interval: The number of seconds between refreshes.
+                               Defaults to 30s.
+        """
+        super(KeepAlive, self).__init__(name='pullover-keepalive', daemon=True)
+        self._url = url
+        self._path = urllib.parse.urlsplit(url).path or '/'
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def _refresh(self, conn):
+        """
+        Refresh a single idle connection.
+
+        :param urllib3.HTTPConnection conn: The connection to refresh.
+        """
+        if conn.sock is None:
+            return  # never opened; leave it to be opened on demand
+        if not is_connection_dropped(conn):
+            try:
+                conn.request('HEAD', self._path, headers={
+                    'User-Agent': '{0}/{1}'.format(pullover.__title__,
+                                                   pullover.__version__)
+                })
+                response = conn.getresponse()
+                response.read()
+                if response.headers.get('Connection', '').lower() != 'close':
+                    return
+            except (OSError, ValueError) as e:
+                logger.debug('Keep-alive request to %s failed: %s',
+                             conn.host, e)
+        conn.close()
+        _connect(conn)
+
+    def refresh(self):
+        """
+        Refresh all connections currently idle in the pool. Connections in use
+        by other threads are left alone.
+
+        :return: The number of connections refreshed.
+        :rtype: int
+        """
+        pool = _pool(self._url)
+        idle = []
+        while True:
+            try:
+                idle.append(pool.pool.get(block=False))
+            except (queue.Empty, AttributeError):  # AttributeError if closed
+                break
+        try:
+            conns = [conn for conn in idle if conn is not None]
+            for conn in conns:
+                self._refresh(conn)
+        finally:
+            for conn in idle:
+                pool._put_conn(conn)
+        logger.debug('Refreshed %d idle connections to %s', len(conns),
+                     pool.host)
+        return len(conns)
+
+    def run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                self.refresh()
+            except Exception:  # never let the thread die
+                logger.exception('Failed to refresh connections')
+
+    def stop(self):
+        """
+        Stop refreshing connections. The thread will exit shortly after.
+        """
+        self._stopped.set()
@@ -0,0 +1,228 @@
+import logging
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+
+from pullover import endpoint
+
+
+logger = logging.getLogger(__name__)
+
+
+class SoundsCatalogue:
+    """
+    Caches the notification sounds available to each application, so the
+    sound of a message can be checked locally before it is sent.
+
+    Catalogues are kept in memory and optionally on disk, so a restarted
+    process does not fetch them again. A catalogue older than its time-to-live
+    is still used, while it is revalidated in the background with a
+    conditional request. Checking a sound never waits for the network: until
+    an application's catalogue has been fetched, every sound is accepted.
+
+    Instances are thread-safe.
+    """
+
+    _ENDPOINT = endpoint.SOUNDS.url()
+    _TIMEOUT = 3
+
+    _DEFAULT_TTL = 24 * 60 * 60
+
+    # seconds to wait after a failed fetch before starting another
+    _RETRY_DELAY = 60
+
+    def __init__(self, ttl=_DEFAULT_TTL, path=None, clock=time.time):
+        """
+        Initialise a new catalogue cache.
+
+        :param float ttl: The number of seconds a catalogue is fresh for.
+                          Defaults to a day.
+        :param str path: A file to persist catalogues to. Defaults to keeping
+                         them in memory only. If the file cannot be read, it
+                         is ignored and overwritten.
+        :param callable clock: A function returning the current time in
+                               seconds since the epoch. Defaults to the
+                               system clock.
+        """
+        self._ttl = ttl
+        self._path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        # token hash -> {'fetched', 'etag', 'last_modified', 'sounds'}
+        self._entries = {}
+
+        # token hashes being revalidated
+        self._refreshing = set()
+
+        # token hash -> time before which not to fetch again after a failure
+        self._retry_at = {}
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    entries = json.load(f)
+                if not isinstance(entries, dict):
+                    raise ValueError('not a JSON object')
+                self._entries = entries
+            except (OSError, ValueError) as e:
+                # treated as a miss; catalogues are fetched again
+                logger.warning('Ignoring unreadable sounds cache %s: %s',
+                               path, e)
+
+    @staticmethod
+    def _key(application):
+        """
+        Identify an application without storing its token.
+
+        :param Application application: The application.
+        :return: A hex digest of its token.
+        :rtype: str
+        """
+        return hashlib.sha256(
+            application.token.encode('utf-8')).hexdigest()
+
+    def _save(self):
+        """
+        Write the cache to its file, if it has one. Must be called with the
+        lock held.
+        """
+        if self._path is None:
+            return
+        temp = self._path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(temp, self._path)
+
+    def sounds(self, application):
+        """
+        Find the sounds available to an application, without waiting for the
+        network. Starts a background fetch if the catalogue is missing or
+        stale.
+
+        :param Application application: The application.
+        :return: Sound descriptions by name, or None if the catalogue has not
+                 been fetched yet.
+        :rtype: dict(str, str)
+        """
+        key = self._key(application)
+        with self._lock:
+            entry = self._entries.get(key)
+            stale = entry is None or \
+                self._clock() - entry['fetched'] >= self._ttl
+            if stale and key not in self._refreshing and \
+                    self._clock() >= self._retry_at.get(key, 0):
+                self._refreshing.add(key)
+                threading.Thread(target=self._refresh,
+                                 args=(application, key),
+                                 name='pullover-sounds',
+                                 daemon=True).start()
+        return None if entry is None else entry['sounds']
+
+    def is_valid(self, application, sound):
+        """
+        Check whether an application can use a sound, without waiting for
+        the network.
+
+        :param Application application: The application.
+        :param str sound: The sound's name.
+        :return: True if the sound is in the catalogue, or the catalogue has
+                 not been fetched yet, false if it is unavailable.
+        :rtype: bool
+        """
+        sounds = self.sounds(application)
+        return sounds is None or sound in sounds
+
+    def refresh(self, application):
+        """
+        Fetch an application's catalogue now, e.g. at startup, waiting for
+        the result.
+
+        :param Application application: The application.
+        :return: True if the catalogue is up to date, false if the fetch
+                 failed.
+        :rtype: bool
+        """
+        return self._refresh(application, self._key(application))
+
+    def _refresh(self, application, key):
+        """
+        Revalidate or fetch an application's catalogue.
+
+        :param Application application: The application.
+        :param str key: The application's key in the cache.
+        :return: True if the catalogue is up to date.
+        :rtype: bool
+        """
+        fetched = False
+        try:
+            with self._lock:
+                entry = self._entries.get(key)
+            request = endpoint.SOUNDS.request(application)
+            if entry is not None:
+                if entry.get('etag'):
+                    request.headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    request.headers['If-Modified-Since'] = \
+                        entry['last_modified']
+            try:
+                response, _ = endpoint.SOUNDS.send(request, application,
+                                                   self._TIMEOUT)
+                if response.status_code == 304 and entry is not None:
+                    sounds = entry['sounds']
+                    logger.debug('Sounds catalogue unchanged')
+                else:
+                    json_ = response.json()
+                    if json_.get('status') != 1:
+                        logger.warning('Failed to fetch sounds: %s',
+                                       json_.get('errors'))
+                        return False
+                    sounds = json_['sounds']
+                    logger.info('Fetched %d sounds', len(sounds))
+            except (requests.RequestException, ValueError) as e:
+                logger.warning('Failed to fetch sounds: %s', e)
+                return False
+
+            with self._lock:
+                self._entries[key] = {
+                    'fetched': self._clock(),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'sounds': sounds
+                }
+                self._save()
+            fetched = True
+            return True
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+                if not fetched:
+                    self._retry_at[key] = self._clock() + self._RETRY_DELAY
+
+
+_default = SoundsCatalogue()
+
+
+def default():
+    """
+    Retrieve the sounds catalogue cache used to check message sounds.
+
+    :return: The shared cache, or None if sounds are not checked.
+    :rtype: SoundsCatalogue
+    """
+    return _default
+
+
+def configure(catalogue):
+    """
+    Replace the sounds catalogue cache used to check message sounds, e.g.
+    with one persisted to disk.
+
+    :param SoundsCatalogue catalogue: The new cache, or None to stop checking
+                                      sounds.
+    """
+    global _default
+    _default = catalogue
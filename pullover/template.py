@@ -0,0 +1,251 @@
+import string
+import urllib.parse
+import requests
+
+import pullover
+from pullover import endpoint
+from pullover.message import Message
+
+
+# Pushover's limits on the lengths of templated parameters, in characters
+_LIMITS = {
+    'message': 1024,
+    'title': 250,
+    'url': 512,
+    'url_title': 100
+}
+
+# replaces the last character of a truncated value
+_ELLIPSIS = '…'
+
+
+class _FieldPlan:
+    """
+    The compiled form of one templated message parameter: literal text,
+    already URL-encoded, interleaved with placeholders.
+    """
+
+    def __init__(self, name, template):
+        """
+        Parse a template for a message parameter.
+
+        :param str name: The parameter's name, e.g. ``'message'``.
+        :param str template: The parameter's template, in
+                             :meth:`str.format` syntax.
+        :raises ValueError: If the template is malformed, or its literal text
+                            alone exceeds the parameter's length limit.
+        """
+        self._name = name
+        self._limit = _LIMITS[name]
+        self._prefix = urllib.parse.quote_plus(name) + '='
+
+        # list of (encoded literal, placeholder or None); placeholders are
+        # (name, simple, conversion, format spec), where simple means the
+        # name is a plain key rather than an attribute or index lookup
+        self._steps = []
+
+        # number of characters of literal text, which every rendering
+        # includes
+        self._static = 0
+
+        for literal, field, spec, conversion in \
+                string.Formatter().parse(template):
+            self._static += len(literal)
+            placeholder = None
+            if field is not None:
+                if not field or field.isdigit():
+                    raise ValueError('Template placeholders must be named')
+                placeholder = (field, field.isidentifier(), conversion,
+                               spec or '')
+            self._steps.append((urllib.parse.quote_plus(literal),
+                                placeholder))
+
+        if self._static > self._limit:
+            raise ValueError("Template for '{0}' exceeds {1} characters"
+                             .format(name, self._limit))
+
+    def render(self, values, truncate):
+        """
+        Render this parameter into URL-encoded form, enforcing its length
+        limit as values are substituted.
+
+        :param dict values: Values for placeholders, by name.
+        :param bool truncate: Whether to shorten values that would exceed the
+                              length limit, rather than raise.
+        :return: The encoded ``name=value`` pair.
+        :rtype: str
+        :raises KeyError: If a placeholder has no value.
+        :raises ValueError: If the rendering exceeds the length limit and
+                            truncate is false.
+        """
+        formatter = None
+        budget = self._limit - self._static
+        parts = [self._prefix]
+        for literal, placeholder in self._steps:
+            parts.append(literal)
+            if placeholder is None:
+                continue
+            field, simple, conversion, spec = placeholder
+            if simple:
+                value = values[field]
+            else:
+                if formatter is None:
+                    formatter = string.Formatter()
+                value, _ = formatter.get_field(field, (), values)
+            if conversion == 's':
+                value = str(value)
+            elif conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            text = value if type(value) is str and not spec \
+                else format(value, spec)
+            if len(text) > budget:
+                if not truncate:
+                    raise ValueError("Rendered '{0}' exceeds {1} characters"
+                                     .format(self._name, self._limit))
+                text = text[:budget - 1] + _ELLIPSIS if budget > 0 else ''
+            budget -= len(text)
+            parts.append(urllib.parse.quote_plus(text))
+        return ''.join(parts)
+
+
+class RenderedMessage(Message):
+    """
+    A message rendered from a :class:`MessageTemplate`. Its parameters are
+    held URL-encoded, ready to be sent without further processing, and are
+    only decoded if needed, e.g. for logging.
+    """
+
+    # attributes set by Message's initialiser, decoded from the payload on
+    # first use
+    _DECODED = frozenset(['_body', '_title', '_timestamp', '_url',
+                          '_url_title', '_retry', '_expire', '_tags'])
+
+    def __init__(self, payload, priority, sound):
+        """
+        Initialise a new rendered message. Instances are created by
+        :meth:`MessageTemplate.render()`.
+
+        :param str payload: The message's URL-encoded parameters.
+        :param int priority: The message priority.
+        :param str sound: The message's sound, or None.
+        """
+        self._payload = payload
+        self._priority = priority
+        self._sound = sound
+
+    def __getattr__(self, name):
+        # only called for attributes not yet set
+        if name not in self._DECODED:
+            raise AttributeError(name)
+        decoded = Message._from_data({key: value
+                                      for key, value in self._data().items()
+                                      if value is not None})
+        for attribute in self._DECODED:
+            setattr(self, attribute, getattr(decoded, attribute))
+        return getattr(self, name)
+
+    def _data(self):
+        data = {'title': None, 'timestamp': None, 'url': None,
+                'url_title': None, 'retry': None, 'expire': None,
+                'tags': None, 'sound': None}
+        data.update(urllib.parse.parse_qsl(self._payload,
+                                           keep_blank_values=True))
+        data['priority'] = self._priority
+        return data
+
+    def _request(self, application, user):
+        signed = requests.Request(data={})
+        application.sign(signed)
+        user.sign(signed)
+        return requests.Request(
+            'POST',
+            endpoint.MESSAGES.url(),
+            headers={
+                'User-Agent': '{0}/{1}'.format(pullover.__title__,
+                                               pullover.__version__),
+                'Content-Type': 'application/x-www-form-urlencoded'
+            },
+            data=self._payload + '&' + urllib.parse.urlencode(
+                {key: value for key, value in signed.data.items()
+                 if value is not None}))
+
+
+class MessageTemplate:
+    """
+    A message with placeholders, for sending personalised messages to many
+    users.
+
+    Templates are parsed once. Each rendering substitutes values straight into
+    the URL-encoded request body, checking Pushover's length limits as it
+    goes, and parameters shared by every rendering are encoded only once.
+    """
+
+    def __init__(self, body, title=None, url=None, url_title=None,
+                 truncate=True, **kwargs):
+        """
+        Compile a new template. Placeholders use :meth:`str.format` syntax
+        with names, e.g. ``'Hello {name}'`` or ``'{order.total:.2f}'``.
+
+        :param str body: The template for the message contents.
+        :param str title: The template for the message heading.
+        :param str url: The template for the supplementary URL.
+        :param str url_title: The template for the URL's title. Requires URL
+                              be set.
+        :param bool truncate: Whether to shorten rendered values to fit
+                              Pushover's length limits, rather than raise.
+                              Defaults to true.
+        :param kwargs: Parameters shared by every rendering, as accepted by
+                       :class:`~pullover.Message`'s initialiser, e.g.
+                       ``priority``.
+        :raises ValueError: If a template is malformed, or the parameters are
+                            invalid.
+        """
+        # validates the shared parameters
+        message = Message(body, url=url, url_title=url_title, **kwargs)
+
+        self._truncate = truncate
+        self._plans = [_FieldPlan(name, template) for name, template in (
+            ('message', body), ('title', title), ('url', url),
+            ('url_title', url_title)) if template is not None]
+
+        shared = {key: value for key, value in message._data().items()
+                  if value is not None and key not in _LIMITS}
+        self._shared = '&' + urllib.parse.urlencode(shared) if shared else ''
+        self._priority = message.priority
+        self._sound = message._sound
+
+    def render(self, **values):
+        """
+        Render a message.
+
+        :param values: Values for the template's placeholders, by name.
+        :return: The message.
+        :rtype: RenderedMessage
+        :raises KeyError: If a placeholder has no value.
+        :raises ValueError: If the message exceeds a length limit and
+                            truncation is disabled.
+        """
+        return RenderedMessage(
+            '&'.join([plan.render(values, self._truncate)
+                      for plan in self._plans]) + self._shared,
+            self._priority, self._sound)
+
+    def prepare(self, application, user, **values):
+        """
+        Render a message, and package it up with a sending application and
+        user.
+
+        :param Application application: The application to send the message
+                                        from.
+        :param User user: The user to send the message to.
+        :param values: Values for the template's placeholders, by name.
+        :return: The prepared message.
+        :rtype: PreparedMessage
+        :raises KeyError: If a placeholder has no value.
+        :raises ValueError: If the message exceeds a length limit and
+                            truncation is disabled, or the application cannot
+                            use the sound.
+        """
+        return self.render(**values).prepare(application, user)
@@ -14,6 +14,16 @@ class TestApplication(unittest.TestCase):
         self._APP.sign(request)
         self.assertDictEqual(request.data, {'token': self._APP_TOKEN})
 
+    def test_token(self):
+        self.assertEqual(self._APP.token, self._APP_TOKEN)
+
+    def test_eq(self):
+        self.assertEqual(self._APP, Application(self._APP_TOKEN))
+        self.assertNotEqual(self._APP, Application('other'))
+
+    def test_hash(self):
+        self.assertEqual(hash(self._APP), hash(Application(self._APP_TOKEN)))
+
     def test_str(self):
         self.assertEqual(str(self._APP),
                          'Application({0})'.format(self._APP_TOKEN))
@@ -0,0 +1,242 @@
+import unittest
+from unittest import mock
+import base64
+import hashlib
+import socket
+import threading
+import urllib.parse
+import responses
+
+from pullover.client import Client, ClientError, ClientUnavailableError, \
+    ReceivedMessage
+from pullover.client.websocket import WebSocket, WebSocketError
+
+
+class _StandInServer:
+    """
+    A local WebSocket server accepting a number of connections, recording
+    what the client sends and replying to each with scripted frames.
+    """
+
+    def __init__(self, frames, accept=True, connections=1):
+        self._frames = frames
+        self._accept = accept
+        self._connections = connections
+        self._listener = socket.socket()
+        self._listener.bind(('127.0.0.1', 0))
+        self._listener.listen(connections)
+        self.url = 'ws://127.0.0.1:{0}/push'.format(
+            self._listener.getsockname()[1])
+        self.received = []
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _frame(payload, opcode=0x2):
+        return bytes([0x80 | opcode, len(payload)]) + payload
+
+    def _serve(self):
+        for _ in range(self._connections):
+            self._serve_one()
+
+    def _serve_one(self):
+        conn, _ = self._listener.accept()
+        with conn, conn.makefile('rb') as reader:
+            key = None
+            while True:
+                line = reader.readline().strip()
+                if not line:
+                    break
+                if line.lower().startswith(b'sec-websocket-key:'):
+                    key = line.split(b':', 1)[1].strip()
+            if not self._accept:
+                conn.sendall(b'HTTP/1.1 403 Forbidden\r\n\r\n')
+                return
+            accept = base64.b64encode(hashlib.sha1(
+                key + WebSocket._GUID).digest())
+            conn.sendall(b'HTTP/1.1 101 Switching Protocols\r\n'
+                         b'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+
+            # read the client's login frame
+            first, second = reader.read(2)
+            mask = reader.read(4)
+            payload = reader.read(second & 0x7F)
+            self.received.append(bytes(
+                b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+            for frame in self._frames:
+                conn.sendall(frame)
+
+    def close(self):
+        self._thread.join(5)
+        self._listener.close()
+
+
+class TestWebSocket(unittest.TestCase):
+
+    def test_recv(self):
+        server = _StandInServer([
+            _StandInServer._frame(b'', opcode=0x9),  # ping
+            bytes([0x02, 2]) + b'he',  # fragmented
+            bytes([0x80, 3]) + b'llo'])
+        try:
+            with WebSocket(server.url, 5) as ws:
+                ws.send('login')
+                self.assertEqual(ws.recv(), b'hello')
+            self.assertEqual(server.received, [b'login'])
+        finally:
+            server.close()
+
+    def test_server_close(self):
+        server = _StandInServer([_StandInServer._frame(b'', opcode=0x8)])
+        try:
+            with WebSocket(server.url, 5) as ws:
+                ws.send('login')
+                with self.assertRaises(WebSocketError):
+                    ws.recv()
+        finally:
+            server.close()
+
+    def test_handshake_rejected(self):
+        server = _StandInServer([], accept=False)
+        try:
+            with self.assertRaises(WebSocketError):
+                WebSocket(server.url, 5)
+        finally:
+            server.close()
+
+
+class TestReceivedMessage(unittest.TestCase):
+
+    def test_parse(self):
+        message = ReceivedMessage({'id': '3', 'message': 'hello',
+                                   'date': 1500000000, 'priority': 1,
+                                   'app': 'pullover'})
+        self.assertEqual(message.id, 3)
+        self.assertEqual(message.priority, 1)
+        self.assertEqual(message.date.timestamp(), 1500000000)
+        self.assertIsNone(message.title)
+
+
+class TestClient(unittest.TestCase):
+
+    _API = 'http://127.0.0.1/1/'
+
+    def _messages(self, *ids):
+        return {'status': 1, 'request': 'request',
+                'messages': [{'id': id_, 'message': str(id_),
+                              'date': 1500000000} for id_ in ids]}
+
+    @responses.activate
+    def test_login_register(self):
+        responses.add(responses.POST, self._API + 'users/login.json',
+                      json={'status': 1, 'id': 'user', 'secret': 'secret'})
+        responses.add(responses.POST, self._API + 'devices.json',
+                      json={'status': 1, 'id': 'device'})
+        client = Client(api=self._API)
+        self.assertEqual(client.login('a@example.com', 'password'), 'user')
+        self.assertEqual(client.register('monitor'), 'device')
+        self.assertEqual((client.secret, client.device_id),
+                         ('secret', 'device'))
+        params = urllib.parse.parse_qs(responses.calls[1].request.body)
+        self.assertEqual(params['secret'], ['secret'])
+
+    @responses.activate
+    def test_login_failure(self):
+        responses.add(responses.POST, self._API + 'users/login.json',
+                      status=400,
+                      json={'status': 0, 'errors': ['invalid password']})
+        with self.assertRaises(ClientError) as context:
+            Client(api=self._API).login('a@example.com', 'password')
+        self.assertEqual(context.exception.errors, ['invalid password'])
+
+    @responses.activate
+    def test_server_error_unavailable(self):
+        responses.add(responses.GET, self._API + 'messages.json', status=503,
+                      json={'status': 0, 'errors': ['unavailable']})
+        with self.assertRaises(ClientUnavailableError):
+            Client('secret', 'device', api=self._API).download()
+
+    @responses.activate
+    def test_sync(self):
+        responses.add(responses.GET, self._API + 'messages.json',
+                      json=self._messages(7, 5))
+        responses.add(responses.POST, self._API +
+                      'devices/device/update_highest_message.json',
+                      json={'status': 1})
+        client = Client('secret', 'device', api=self._API)
+        self.assertEqual([message.id for message in client.sync()], [5, 7])
+        self.assertEqual(len(responses.calls), 2)
+        params = urllib.parse.parse_qs(responses.calls[1].request.body)
+        self.assertEqual(params['message'], ['7'])
+
+    @responses.activate
+    def test_sync_empty(self):
+        responses.add(responses.GET, self._API + 'messages.json',
+                      json=self._messages())
+        self.assertEqual(Client('secret', 'device', api=self._API).sync(),
+                         [])
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_listen(self):
+        responses.add(responses.GET, self._API + 'messages.json',
+                      json=self._messages())
+        responses.add(responses.GET, self._API + 'messages.json',
+                      json=self._messages(1, 2))
+        responses.add(responses.POST, self._API +
+                      'devices/device/update_highest_message.json',
+                      json={'status': 1})
+        server = _StandInServer([_StandInServer._frame(b'#'),
+                                 _StandInServer._frame(b'!')])
+        client = Client('secret', 'device', api=self._API, push=server.url)
+        received = []
+
+        def handler(message):
+            received.append(message.id)
+            if len(received) == 2:
+                client.stop()
+
+        try:
+            client.listen(handler)
+        finally:
+            server.close()
+        self.assertEqual(received, [1, 2])
+        self.assertEqual(server.received, [b'login:device:secret\n'])
+
+    @responses.activate
+    def test_listen_error(self):
+        responses.add(responses.GET, self._API + 'messages.json',
+                      json=self._messages())
+        server = _StandInServer([_StandInServer._frame(b'E')])
+        client = Client('secret', 'device', api=self._API, push=server.url)
+        try:
+            with self.assertRaises(ClientError):
+                client.listen(lambda _: None)
+        finally:
+            server.close()
+
+    @responses.activate
+    def test_listen_reconnects_after_sync_failure(self):
+        responses.add(responses.GET, self._API + 'messages.json', status=503)
+        responses.add(responses.GET, self._API + 'messages.json',
+                      json=self._messages(1))
+        responses.add(responses.POST, self._API +
+                      'devices/device/update_highest_message.json',
+                      json={'status': 1})
+        server = _StandInServer([], connections=2)
+        client = Client('secret', 'device', api=self._API, push=server.url)
+        received = []
+
+        def handler(message):
+            received.append(message.id)
+            client.stop()
+
+        try:
+            with mock.patch('time.sleep'):  # skip the backoff delay
+                client.listen(handler)
+        finally:
+            server.close()
+        self.assertEqual(received, [1])
+        self.assertEqual(len(server.received), 2)
@@ -0,0 +1,114 @@
+import unittest
+from unittest import mock
+
+from pullover.concurrency import AimdLimiter
+
+
+def _response(status=1, http_status=200, app_remaining=None, latency=0.1):
+    return mock.Mock(status=status, http_status=http_status,
+                     app_remaining=app_remaining, latency=latency)
+
+
+class TestAimdLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.limiter = AimdLimiter(initial=4, maximum=8,
+                                   clock=lambda: self.now)
+
+    def _complete(self, response, latency=0.1):
+        self.assertTrue(self.limiter.acquire(0))
+        self.limiter.release(response, latency)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            AimdLimiter(initial=10, maximum=5)
+
+    def test_acquire_at_limit(self):
+        for _ in range(4):
+            self.assertTrue(self.limiter.acquire(0))
+        self.assertFalse(self.limiter.acquire(0))
+        self.assertEqual(self.limiter.in_flight, 4)
+
+    def test_additive_increase(self):
+        for _ in range(4):
+            self._complete(_response())
+        self.assertEqual(self.limiter.limit, 4)  # 4 + 1/4 + 1/4.25 + ...
+        for _ in range(4):
+            self._complete(_response())
+        self.assertEqual(self.limiter.limit, 5)
+
+    def test_maximum(self):
+        for _ in range(100):
+            self._complete(_response())
+        self.assertEqual(self.limiter.limit, 8)
+
+    def test_rate_limited(self):
+        self._complete(_response(status=0, http_status=429))
+        self.assertEqual(self.limiter.limit, 2)
+
+    def test_server_error(self):
+        self._complete(_response(status=None, http_status=503))
+        self.assertEqual(self.limiter.limit, 2)
+
+    def test_exception(self):
+        self._complete(None)
+        self.assertEqual(self.limiter.limit, 2)
+
+    def test_client_error(self):
+        self._complete(_response(status=0, http_status=400))
+        self.assertEqual(self.limiter.decreases, 0)
+
+    def test_app_remaining(self):
+        self._complete(_response(app_remaining=10))
+        self.assertEqual(self.limiter.limit, 2)
+
+    def test_latency(self):
+        self._complete(_response(), latency=0.1)
+        self.now = 1
+        self._complete(_response(), latency=1)
+        self.assertEqual(self.limiter.decreases, 1)
+
+    def test_one_decrease_per_round_trip(self):
+        self._complete(_response(), latency=1)  # baseline
+        self._complete(None)
+        self._complete(None)
+        self.assertEqual(self.limiter.decreases, 1)
+        self.now = 1
+        self._complete(None)
+        self.assertEqual(self.limiter.decreases, 2)
+
+    def test_minimum(self):
+        for i in range(10):
+            self.now = i
+            self._complete(None)
+        self.assertEqual(self.limiter.limit, 1)
+
+    def test_send(self):
+        prepared = mock.Mock()
+        prepared.send.return_value = _response(http_status=429)
+        self.assertIs(self.limiter.send(prepared, max_tries=1),
+                      prepared.send.return_value)
+        prepared.send.assert_called_once_with(max_tries=1)
+        self.assertEqual(self.limiter.in_flight, 0)
+        self.assertEqual(self.limiter.limit, 2)
+
+    def test_send_retries_not_congestion(self):
+        self._complete(_response(), latency=0.1)  # baseline
+        prepared = mock.Mock()
+
+        def send(**kwargs):
+            self.now += 10  # e.g. sleeping between retries
+            return _response(latency=0.1)
+
+        prepared.send.side_effect = send
+        self.limiter.send(prepared)
+        self.assertEqual(self.limiter.decreases, 0)
+
+    def test_send_raises(self):
+        prepared = mock.Mock()
+        prepared.send.side_effect = KeyError
+        with self.assertRaises(KeyError):
+            self.limiter.send(prepared)
+        self.assertEqual(self.limiter.in_flight, 0)
+        self.assertEqual(self.limiter.decreases, 1)
@@ -0,0 +1,132 @@
+import unittest
+from unittest import mock
+import os
+import json
+import shutil
+import tempfile
+import time
+import responses
+
+from pullover import Application, User, Message, deadletter
+from pullover.deadletter import DeadLetterStore
+from pullover.tests.test_message import TestSendResponse
+
+
+class _StoreTestCase(unittest.TestCase):
+
+    _APP = Application('app')
+    _USER = User('user')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dead.jsonl')
+        self.store = DeadLetterStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _add(self, body, error='HTTP 503'):
+        self.store.add(Message(body).prepare(self._APP, self._USER), error)
+
+
+class TestDeadLetterStore(_StoreTestCase):
+
+    def test_empty(self):
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(list(self.store), [])
+        self.assertEqual(list(self.store.drain()), [])
+
+    def test_add(self):
+        self._add('one')
+        self._add('two', 'timed out')
+        letters = list(self.store)
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual([str(letter.prepared.message) for letter in letters],
+                         ['Message(one)', 'Message(two)'])
+        self.assertEqual(letters[1].error, 'timed out')
+        self.assertEqual(letters[0].prepared.application, self._APP)
+        self.assertEqual(letters[0].prepared.user, self._USER)
+
+    def test_drain(self):
+        self._add('one')
+        drained = self.store.drain()
+        next(drained)
+        self._add('two')  # e.g. failed again while draining
+        self.assertEqual(list(drained), [])
+        self.assertEqual([str(letter.prepared.message)
+                          for letter in self.store], ['Message(two)'])
+
+    def test_drain_interrupted(self):
+        self._add('one')
+        next(self.store.drain())
+        self._add('two')
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(len(list(self.store.drain())), 1)
+        self.assertEqual(len(self.store), 1)
+
+    def test_corrupt_line(self):
+        self._add('one')
+        with open(self.path, 'a') as f:
+            f.write('{"truncated\n')
+        self._add('two')
+        self.assertEqual(len(list(self.store)), 2)
+
+
+class TestReplay(_StoreTestCase):
+
+    @responses.activate
+    def test_sent(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=TestSendResponse.SUCCESS_JSON)
+        self._add('one')
+        self._add('two')
+        progress = mock.Mock()
+        self.assertEqual(deadletter.replay(self.store, 2, progress), (2, 0))
+        self.assertEqual(progress.call_args, mock.call(2, 0))
+        self.assertEqual(len(self.store), 0)
+
+    @responses.activate
+    def test_kept_until_sent(self):
+        replaying = self.path + DeadLetterStore._REPLAYING
+        exists = []
+
+        def callback(request):
+            time.sleep(0.1)  # let the replay finish reading the store
+            exists.append(os.path.exists(replaying))
+            return 200, {}, json.dumps(TestSendResponse.SUCCESS_JSON)
+
+        responses.add_callback(responses.POST, Message._ENDPOINT, callback)
+        self._add('one')
+        self.assertEqual(deadletter.replay(self.store), (1, 0))
+        self.assertEqual(exists, [True])
+        self.assertFalse(os.path.exists(replaying))
+
+    @responses.activate
+    def test_requeue_retriable(self):
+        responses.add(responses.POST, Message._ENDPOINT, status=503)
+        self._add('one')
+        self.assertEqual(deadletter.replay(self.store, max_tries=1), (0, 1))
+        self.assertEqual(len(self.store), 1)
+
+    @responses.activate
+    def test_drop_rejected(self):
+        responses.add(responses.POST, Message._ENDPOINT, status=400,
+                      json={'status': 0, 'request': 'x',
+                            'errors': ['user key is invalid']})
+        self._add('one')
+        self.assertEqual(deadletter.replay(self.store), (0, 1))
+        self.assertEqual(len(self.store), 0)
+
+
+class TestDefault(unittest.TestCase):
+
+    def tearDown(self):
+        deadletter.configure(None)
+
+    def test_unset(self):
+        self.assertIsNone(deadletter.default())
+
+    def test_configure(self):
+        store = DeadLetterStore('dead.jsonl')
+        deadletter.configure(store)
+        self.assertIs(deadletter.default(), store)
@@ -0,0 +1,130 @@
+import unittest
+from unittest import mock
+import threading
+import time
+import responses
+
+from pullover import Application, User, Message, Dispatcher
+from pullover.tests import test_message
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_no_workers(self):
+        with self.assertRaises(ValueError):
+            Dispatcher(workers=0)
+
+    def test_result(self):
+        prepared = Message('message').prepare(Application('app'), User('a'))
+        with mock.patch.object(prepared, 'send', return_value='response'), \
+                Dispatcher() as dispatcher:
+            future = dispatcher.submit(prepared)
+        self.assertEqual(future.result(), 'response')
+
+    def test_kwargs(self):
+        prepared = Message('message').prepare(Application('app'), User('a'))
+        with mock.patch.object(prepared, 'send') as send, \
+                Dispatcher(max_tries=1) as dispatcher:
+            dispatcher.submit(prepared).result()
+        send.assert_called_once_with(max_tries=1)
+
+    def test_limiter(self):
+        prepared = Message('message').prepare(Application('app'), User('a'))
+        limiter = mock.Mock()
+        with Dispatcher(limiter=limiter, max_tries=1) as dispatcher:
+            future = dispatcher.submit(prepared)
+        self.assertIs(future.result(), limiter.send.return_value)
+        limiter.send.assert_called_once_with(prepared, max_tries=1)
+
+    def test_exception(self):
+        prepared = Message('message').prepare(Application('app'), User('a'))
+        with mock.patch.object(prepared, 'send', side_effect=KeyError), \
+                Dispatcher() as dispatcher:
+            future = dispatcher.submit(prepared)
+        self.assertIsInstance(future.exception(), KeyError)
+
+    def test_per_user_order(self):
+        sent = []
+        lock = threading.Lock()
+
+        def send(user, i):
+            def _send():
+                time.sleep(0.001 * (i % 3))  # jitter
+                with lock:
+                    sent.append((user, i))
+            return _send
+
+        messages = []
+        for i in range(20):
+            for user in ('a', 'b', 'c'):
+                prepared = Message(str(i)).prepare(Application('app'),
+                                                   User(user))
+                prepared.send = send(user, i)
+                messages.append(prepared)
+
+        with Dispatcher(workers=4) as dispatcher:
+            for prepared in messages:
+                dispatcher.submit(prepared)
+
+        for user in ('a', 'b', 'c'):
+            self.assertEqual([i for u, i in sent if u == user],
+                             list(range(20)))
+
+    def test_cross_user_parallel(self):
+        # both sends must be in flight at once for the barrier to release
+        barrier = threading.Barrier(2, timeout=5)
+        with Dispatcher(workers=2) as dispatcher:
+            futures = []
+            for user in ('a', 'b'):
+                prepared = Message('message').prepare(Application('app'),
+                                                      User(user))
+                prepared.send = barrier.wait
+                futures.append(dispatcher.submit(prepared))
+        for future in futures:
+            self.assertIsNone(future.exception())
+
+    @responses.activate
+    def test_merge_devices(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        message = Message('message')
+        app = Application('app')
+        release = threading.Event()
+        blocker = Message('blocker').prepare(app, User('a'))
+        blocker.send = lambda **_: release.wait(5)
+
+        with Dispatcher(workers=1) as dispatcher:
+            dispatcher.submit(blocker)
+            futures = [dispatcher.submit(message.prepare(app,
+                                                         User('a', [device])))
+                       for device in ('phone', 'tablet')]
+            release.set()
+
+        self.assertEqual(len(responses.calls), 1)
+        self.assertIn('device=phone%2Ctablet', responses.calls[0].request.body)
+        self.assertIs(futures[0].result(), futures[1].result())
+
+    @responses.activate
+    def test_identical_not_merged(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        prepared = Message('message').prepare(Application('app'),
+                                              User('a', ['phone']))
+        release = threading.Event()
+        blocker = Message('blocker').prepare(Application('app'), User('a'))
+        blocker.send = lambda **_: release.wait(5)
+
+        with Dispatcher(workers=1) as dispatcher:
+            dispatcher.submit(blocker)
+            dispatcher.submit(prepared)
+            dispatcher.submit(prepared)
+            release.set()
+
+        self.assertEqual(len(responses.calls), 2)
+
+    def test_submit_after_shutdown(self):
+        dispatcher = Dispatcher()
+        dispatcher.shutdown()
+        with self.assertRaises(RuntimeError):
+            dispatcher.submit(Message('message').prepare(Application('app'),
+                                                         User('a')))
@@ -0,0 +1,124 @@
+import unittest
+import socket
+import time
+
+from pullover.dns import DnsCache, _interleave
+
+
+def _address(host, port, family=socket.AF_INET):
+    return family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (host, port)
+
+
+class _Resolver:
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.host = '127.0.0.1'
+        self.calls = 0
+        self.error = None
+
+    def __call__(self, host, port):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return [_address(self.host, port)], self.ttl
+
+
+class TestDnsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.resolver = _Resolver()
+        self.cache = DnsCache(min_ttl=30, max_ttl=600,
+                              resolver=self.resolver, clock=lambda: self.now)
+
+    def _wait_for_refresh(self):
+        deadline = time.monotonic() + 5
+        while self.cache._refreshing:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_cached(self):
+        self.cache.resolve('api.pushover.net', 443)
+        self.now = 40.
+        self.assertEqual(self.cache.resolve('api.pushover.net', 443),
+                         [_address('127.0.0.1', 443)])
+        self.assertEqual(self.resolver.calls, 1)
+
+    def test_refresh_ahead(self):
+        self.cache.resolve('api.pushover.net', 443)
+        self.resolver.host = '127.0.0.2'
+        self.now = 50.  # 60s default TTL
+        self.assertEqual(self.cache.resolve('api.pushover.net', 443),
+                         [_address('127.0.0.1', 443)])
+        self._wait_for_refresh()
+        self.assertEqual(self.resolver.calls, 2)
+        self.assertEqual(self.cache.resolve('api.pushover.net', 443),
+                         [_address('127.0.0.2', 443)])
+
+    def test_ttl_clamped(self):
+        self.resolver.ttl = 5
+        self.cache.resolve('api.pushover.net', 443)
+        self.now = 20.
+        self.cache.resolve('api.pushover.net', 443)
+        self.assertEqual(self.resolver.calls, 1)
+
+        self.resolver.ttl = 86400
+        self.now = 25.
+        self.cache.resolve('api.pushover.net', 443)
+        self._wait_for_refresh()
+        self.now = 25. + 450
+        self.cache.resolve('api.pushover.net', 443)
+        self._wait_for_refresh()
+        self.assertEqual(self.resolver.calls, 3)
+
+    def test_refresh_failure_keeps_entry(self):
+        self.cache.resolve('api.pushover.net', 443)
+        self.resolver.error = socket.gaierror(socket.EAI_AGAIN, 'down')
+        self.now = 50.
+        self.cache.resolve('api.pushover.net', 443)
+        self._wait_for_refresh()
+        self.assertEqual(self.cache.resolve('api.pushover.net', 443),
+                         [_address('127.0.0.1', 443)])
+
+    def test_cold_failure(self):
+        self.resolver.error = socket.gaierror(socket.EAI_NONAME, 'unknown')
+        with self.assertRaises(socket.gaierror):
+            self.cache.resolve('api.pushover.net', 443)
+
+    def test_interleave(self):
+        v6 = [_address('::{0}'.format(i), 443, socket.AF_INET6)
+              for i in range(1, 3)]
+        v4 = [_address('127.0.0.{0}'.format(i), 443) for i in range(1, 4)]
+        self.assertEqual(_interleave(v6 + v4),
+                         [v6[0], v4[0], v6[1], v4[1], v4[2]])
+
+
+class TestConnect(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen()
+        self.addCleanup(self.listener.close)
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.closed_port = sock.getsockname()[1]
+
+    def _cache(self, addresses):
+        return DnsCache(attempt_delay=0.05,
+                        resolver=lambda host, port: (addresses, None))
+
+    def test_falls_through(self):
+        cache = self._cache([
+            _address('127.0.0.1', self.closed_port),
+            _address('127.0.0.1', self.listener.getsockname()[1])])
+        with cache.connect('api.pushover.net', 443, 1) as sock:
+            self.assertEqual(sock.getpeername(),
+                             self.listener.getsockname())
+            self.assertEqual(sock.gettimeout(), 1)
+
+    def test_all_fail(self):
+        cache = self._cache([_address('127.0.0.1', self.closed_port)])
+        with self.assertRaises(ConnectionRefusedError):
+            cache.connect('api.pushover.net', 443, 1)
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+import responses
+import requests
+
+from pullover import Application, User, endpoint, retry
+from pullover.endpoint import Endpoint, ApiError
+
+
+class TestEndpoint(unittest.TestCase):
+
+    _APP = Application('app')
+
+    def setUp(self):
+        patcher = mock.patch.object(endpoint, '_limits', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_url(self):
+        self.assertEqual(endpoint.RECEIPT.url(receipt='r1'),
+                         'https://api.pushover.net/1/receipts/r1.json')
+
+    def test_request_post(self):
+        request = endpoint.GLANCES.request(self._APP, User('user', ['phone']),
+                                           {'count': 1})
+        self.assertEqual(request.method, 'POST')
+        self.assertEqual(request.data, {'count': 1, 'token': 'app',
+                                        'user': 'user', 'device': 'phone'})
+        self.assertTrue(request.headers['User-Agent'].startswith('pullover/'))
+
+    def test_request_get(self):
+        request = endpoint.SOUNDS.request(self._APP)
+        self.assertEqual(request.params, {'token': 'app'})
+        self.assertEqual(request.data, {})
+
+    @mock.patch.object(retry, '_default', None)
+    @responses.activate
+    def test_send_retries(self):
+        responses.add(responses.POST, endpoint.GLANCES.url(), status=503)
+        responses.add(responses.POST, endpoint.GLANCES.url(),
+                      json={'status': 1})
+        response, tries = endpoint.GLANCES.send(
+            endpoint.GLANCES.request(self._APP), retry_interval=0,
+            max_tries=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(tries, 2)
+
+    @responses.activate
+    def test_send_timeout(self):
+        responses.add(responses.POST, endpoint.GLANCES.url(),
+                      body=requests.Timeout('slow'))
+        with self.assertRaises(requests.Timeout):
+            endpoint.GLANCES.call(self._APP)
+
+    @responses.activate
+    def test_limits_from_headers(self):
+        self.assertIsNone(endpoint.limits(self._APP))
+        responses.add(responses.POST, endpoint.MESSAGES.url(),
+                      json={'status': 1, 'request': 'id'},
+                      headers={'X-Limit-App-Limit': '10000',
+                               'X-Limit-App-Remaining': '7496',
+                               'X-Limit-App-Reset': '1393653600'})
+        endpoint.MESSAGES.call(self._APP, User('user'))
+        limits = endpoint.limits(self._APP)
+        self.assertEqual((limits.limit, limits.remaining, limits.reset),
+                         (10000, 7496, 1393653600))
+
+    @responses.activate
+    def test_fetch_limits(self):
+        responses.add(responses.GET, endpoint.LIMITS.url() + '?token=app',
+                      json={'status': 1, 'limit': 10000, 'remaining': 7496,
+                            'reset': 1393653600})
+        limits = endpoint.fetch_limits(self._APP)
+        self.assertEqual(limits.remaining, 7496)
+        self.assertIs(endpoint.limits(self._APP), limits)
+
+    @responses.activate
+    def test_validate(self):
+        responses.add(responses.POST, endpoint.VALIDATE.url(),
+                      json={'status': 1, 'devices': ['phone', 'tablet']})
+        self.assertEqual(endpoint.validate(self._APP, User('user')),
+                         ['phone', 'tablet'])
+
+    @responses.activate
+    def test_validate_invalid(self):
+        responses.add(responses.POST, endpoint.VALIDATE.url(), status=400,
+                      json={'status': 0,
+                            'errors': ['user key is invalid']})
+        with self.assertRaises(ApiError) as cm:
+            endpoint.validate(self._APP, User('user'))
+        self.assertEqual(cm.exception.errors, ['user key is invalid'])
+
+    @responses.activate
+    def test_validate_unreachable(self):
+        responses.add(responses.POST, endpoint.VALIDATE.url(),
+                      body=requests.ConnectionError('down'))
+        with self.assertRaises(ApiError):
+            endpoint.validate(self._APP, User('user'))
+
+    def test_custom_root(self):
+        self.assertEqual(Endpoint('devices.json', root='http://local/1/')
+                         .url(), 'http://local/1/devices.json')
@@ -0,0 +1,153 @@
+import unittest
+from unittest import mock
+import os
+import shutil
+import tempfile
+import urllib.parse
+import responses
+
+from pullover import Application, User, Message, retry
+from pullover.follow import LineReader, Follower
+
+
+class _Base(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'app.log')
+
+    def _append(self, text, path=None):
+        with open(path or self.path, 'a') as f:
+            f.write(text)
+
+
+class TestLineReader(_Base):
+
+    def setUp(self):
+        super(TestLineReader, self).setUp()
+        self._append('old\n')
+        self.reader = LineReader(self.path)
+        self.addCleanup(self.reader.close)
+
+    def test_from_end(self):
+        self.assertEqual(self.reader.read(), [])
+        self._append('new\n')
+        self.assertEqual(self.reader.read(), ['new'])
+
+    def test_from_start(self):
+        reader = LineReader(self.path, from_end=False)
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.read(), ['old'])
+
+    def test_partial_line(self):
+        self.reader.read()
+        self._append('par')
+        self.assertEqual(self.reader.read(), [])
+        self._append('tial\r\nnext\n')
+        self.assertEqual(self.reader.read(), ['partial', 'next'])
+
+    def test_missing_file(self):
+        reader = LineReader(os.path.join(self.directory, 'later.log'))
+        self.addCleanup(reader.close)
+        self.assertEqual(reader.read(), [])
+        self._append('first\n', os.path.join(self.directory, 'later.log'))
+        self.assertEqual(reader.read(), ['first'])
+
+    def test_rotation(self):
+        self.reader.read()
+        self._append('before')
+        os.rename(self.path, self.path + '.1')
+        self.assertEqual(self.reader.read(), [])  # new file not created yet
+        self._append('after\n')
+        self.assertEqual(self.reader.read(), ['before', 'after'])
+
+    def test_truncation(self):
+        self.reader.read()
+        with open(self.path, 'w'):
+            pass
+        self.assertEqual(self.reader.read(), [])
+        self._append('again\n')
+        self.assertEqual(self.reader.read(), ['again'])
+
+
+class TestFollower(_Base):
+
+    def setUp(self):
+        super(TestFollower, self).setUp()
+        self._append('')
+        self.now = 0.
+        self.follower = Follower(self.path, ['ERROR', r'took \d{4,}ms'],
+                                 Application('app'), User('user'),
+                                 window=2, rate=6, burst=1,
+                                 clock=lambda: self.now)
+
+    def _sent(self):
+        return [dict(urllib.parse.parse_qsl(call.request.body))
+                for call in responses.calls]
+
+    @responses.activate
+    def test_batches_burst(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'id'})
+        self._append('INFO fine\nERROR one\nrequest took 12000ms\n')
+        self.assertEqual(self.follower.poll(), 2)
+        self._append('ERROR two\n')
+        self.now = 2
+        self.assertIsNone(self.follower.poll())
+
+        sent = self._sent()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]['message'],
+                         'ERROR one\nrequest took 12000ms\nERROR two')
+        self.assertEqual(sent[0]['title'], 'app.log: 3 matches')
+        self.assertEqual(self.follower.matched, 3)
+
+    @mock.patch.object(retry, '_default', None)
+    @responses.activate
+    def test_rate_limited(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'id'})
+        self._append('ERROR one\n')
+        self.follower.poll()
+        self.now = 2
+        self.assertIsNone(self.follower.poll())
+        self._append('ERROR two\n')
+        self.now = 4
+        self.assertEqual(self.follower.poll(), 2)
+        self.now = 6
+        self.assertAlmostEqual(self.follower.poll(), 6)  # 1 message per 10s
+        self._append('ERROR three\n')
+        self.now = 12
+        self.assertIsNone(self.follower.poll())
+
+        sent = self._sent()
+        self.assertEqual([s['message'] for s in sent],
+                         ['ERROR one', 'ERROR two\nERROR three'])
+        self.assertEqual(sent[0]['title'], 'app.log')
+        self.assertEqual(self.follower.sent, 2)
+
+    @responses.activate
+    def test_flush(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'id'})
+        self._append('ERROR one\n')
+        self.follower.poll()
+        self.follower.flush()
+        self.assertEqual(len(responses.calls), 1)
+
+    def test_body_limit(self):
+        self.follower._pending = ['x' * 100] * Follower._MAX_LINES
+        self.follower._matches = 60
+        body = self.follower._body()
+        self.assertEqual(len(body), Follower._MAX_BODY)
+        self.assertTrue(body.endswith('…'))
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(ValueError):
+            Follower(self.path, ['('], Application('app'), User('user'))
+
+    def test_emergency(self):
+        with self.assertRaises(ValueError):
+            Follower(self.path, ['x'], Application('app'), User('user'),
+                     priority=Message.EMERGENCY)
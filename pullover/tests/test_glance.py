@@ -0,0 +1,136 @@
+import unittest
+import time
+import urllib.parse
+import responses
+
+from pullover import Application, User, Glance
+from pullover.glance import GlanceUpdater
+
+
+class TestGlance(unittest.TestCase):
+
+    def test_no_fields(self):
+        with self.assertRaises(ValueError):
+            Glance()
+
+    def test_text_too_long(self):
+        with self.assertRaises(ValueError):
+            Glance(text='x' * 101)
+
+    def test_percent_out_of_range(self):
+        with self.assertRaises(ValueError):
+            Glance(percent=101)
+
+    def test_str(self):
+        self.assertEqual(str(Glance(count=3, title='Queue')),
+                         'Glance(title=Queue, count=3)')
+
+    @responses.activate
+    def test_send(self):
+        responses.add(responses.POST, Glance._ENDPOINT,
+                      json={'status': 1, 'request': 'request'})
+        response = Glance(count=3).send(Application('app'), User('user'))
+        self.assertTrue(response.ok)
+        params = urllib.parse.parse_qs(responses.calls[0].request.body)
+        self.assertEqual(params, {'count': ['3'], 'token': ['app'],
+                                  'user': ['user']})
+
+
+class TestGlanceUpdater(unittest.TestCase):
+
+    _USER = User('user')
+
+    def _params(self):
+        return [urllib.parse.parse_qs(call.request.body)
+                for call in responses.calls]
+
+    @responses.activate
+    def test_coalesce(self):
+        responses.add(responses.POST, Glance._ENDPOINT,
+                      json={'status': 1, 'request': 'request'})
+        with GlanceUpdater(Application('app'), delay=60) as updater:
+            for count in range(100):
+                updater.update(self._USER, count=count)
+            updater.update(self._USER, title='Queue')
+        self.assertEqual(updater.requests, 1)
+        self.assertEqual(updater.updates, 101)
+        params = self._params()[0]
+        self.assertEqual((params['count'], params['title']),
+                         (['99'], ['Queue']))
+
+    @responses.activate
+    def test_min_interval(self):
+        responses.add(responses.POST, Glance._ENDPOINT,
+                      json={'status': 1, 'request': 'request'})
+        now = [0.]
+        updater = GlanceUpdater(Application('app'), delay=0,
+                                min_interval=20, clock=lambda: now[0])
+        try:
+            updater.update(self._USER, count=1)
+            while updater.requests < 1:
+                time.sleep(0.01)
+            now[0] = 5
+            updater.update(self._USER, count=2)
+            with updater._cond:
+                self.assertEqual(updater._take_due()[1], 15)
+        finally:
+            updater.close()
+        self.assertEqual(updater.requests, 2)
+
+    @responses.activate
+    def test_failure_keeps_newer(self):
+        responses.add(responses.POST, Glance._ENDPOINT, status=500)
+        updater = GlanceUpdater(Application('app'), delay=60)
+        try:
+            updater.update(self._USER, count=2)
+            updater._pending[self._USER][0]['count'] = 3
+            updater._send(self._USER, {'count': 1, 'title': 'Queue'})
+            self.assertEqual(updater._pending[self._USER][0],
+                             {'count': 3, 'title': 'Queue'})
+        finally:
+            updater._pending.clear()
+            updater.close()
+
+    @responses.activate
+    def test_rejected_dropped(self):
+        responses.add(responses.POST, Glance._ENDPOINT, status=400,
+                      json={'status': 0, 'request': 'request',
+                            'errors': ['user key is invalid']})
+        updater = GlanceUpdater(Application('app'), delay=60)
+        try:
+            updater._send(self._USER, {'count': 1})
+            self.assertNotIn(self._USER, updater._pending)
+        finally:
+            updater.close()
+
+    @responses.activate
+    def test_rate_limited_kept(self):
+        responses.add(responses.POST, Glance._ENDPOINT, status=429,
+                      json={'status': 0, 'request': 'request',
+                            'errors': ['rate limited']})
+        updater = GlanceUpdater(Application('app'), delay=60)
+        try:
+            updater._send(self._USER, {'count': 1})
+            self.assertEqual(updater._pending[self._USER][0], {'count': 1})
+        finally:
+            updater._pending.clear()
+            updater.close()
+
+    def test_sent_evicted(self):
+        now = [0.]
+        updater = GlanceUpdater(Application('app'), min_interval=20,
+                                clock=lambda: now[0])
+        try:
+            with updater._cond:
+                updater._sent[User('old')] = 0.
+                updater._sent[self._USER] = 10.
+                now[0] = 25.
+                updater._take_due()
+                self.assertEqual(list(updater._sent), [self._USER])
+        finally:
+            updater.close()
+
+    def test_invalid(self):
+        with GlanceUpdater(Application('app')) as updater:
+            with self.assertRaises(ValueError):
+                updater.update(self._USER, percent=200)
@@ -0,0 +1,138 @@
+import unittest
+import tempfile
+import os
+import urllib.parse
+import responses
+
+from pullover import Application, User, Message, endpoint
+from pullover.group import Group, GroupCache, GroupError
+from pullover.tests import test_message
+
+
+class TestGroupCache(unittest.TestCase):
+
+    _APP = Application('app')
+    _USERS = [User('user{0}'.format(i)) for i in range(12)]
+    _CREATE_URL = endpoint.CREATE_GROUP.url()
+    _ADD_URL = endpoint.GROUP_ADD_USER.url(group='g1')
+    _DELETE_URL = endpoint.GROUP_DELETE_USER.url(group='g1')
+
+    def setUp(self):
+        responses.start()
+        self.addCleanup(responses.stop)
+        self.addCleanup(responses.reset)
+        responses.add(responses.POST, self._CREATE_URL,
+                      json={'status': 1, 'group': 'g1'})
+        responses.add(responses.POST, self._ADD_URL, json={'status': 1})
+        responses.add(responses.POST, self._DELETE_URL, json={'status': 1})
+
+    @staticmethod
+    def _calls(url):
+        return [urllib.parse.parse_qs(call.request.body)
+                for call in responses.calls if call.request.url == url]
+
+    def test_create(self):
+        group = GroupCache(self._APP).group(self._USERS)
+        self.assertEqual(group, Group('g1'))
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+        self.assertEqual({params['user'][0]
+                          for params in self._calls(self._ADD_URL)},
+                         {user.key for user in self._USERS})
+
+    def test_cached(self):
+        cache = GroupCache(self._APP)
+        cache.group(self._USERS)
+        cache.group(reversed(self._USERS))
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+
+    def test_incremental_update(self):
+        cache = GroupCache(self._APP)
+        cache.group(self._USERS, name='oncall')
+        group = cache.group(self._USERS[1:] + [User('new')], name='oncall')
+        self.assertEqual(group, Group('g1'))
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+        self.assertEqual(self._calls(self._ADD_URL)[-1]['user'], ['new'])
+        self.assertEqual(self._calls(self._DELETE_URL)[0]['user'],
+                         [self._USERS[0].key])
+
+    def test_name_existing_group(self):
+        cache = GroupCache(self._APP)
+        cache.group(self._USERS)
+        cache.group(self._USERS, name='oncall')
+        group = cache.group(self._USERS[1:], name='oncall')
+        self.assertEqual(group, Group('g1'))
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+        self.assertEqual(self._calls(self._DELETE_URL)[0]['user'],
+                         [self._USERS[0].key])
+
+    def test_resume_failed_update(self):
+        cache = GroupCache(self._APP)
+        cache.group(self._USERS, name='oncall')
+        responses.replace(responses.POST, self._DELETE_URL,
+                          json={'status': 0, 'errors': ['unavailable']})
+        new = self._USERS[2:] + [User('new')]
+        with self.assertRaises(GroupError):
+            cache.group(new, name='oncall')
+        responses.replace(responses.POST, self._DELETE_URL,
+                          json={'status': 1})
+        self.assertEqual(cache.group(new, name='oncall'), Group('g1'))
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+        self.assertEqual([params['user'] for params in
+                          self._calls(self._ADD_URL)[len(self._USERS):]],
+                         [['new']])
+        self.assertEqual(cache.group(new), Group('g1'))
+
+    def test_error(self):
+        responses.replace(responses.POST, self._CREATE_URL,
+                          json={'status': 0, 'errors': ['invalid name']})
+        with self.assertRaises(GroupError) as cm:
+            GroupCache(self._APP).group(self._USERS)
+        self.assertEqual(cm.exception.errors, ['invalid name'])
+
+    def test_resume_after_partial_failure(self):
+        responses.replace(responses.POST, self._ADD_URL,
+                          json={'status': 0, 'errors': ['unavailable']})
+        cache = GroupCache(self._APP)
+        with self.assertRaises(GroupError):
+            cache.group(self._USERS)
+        responses.replace(responses.POST, self._ADD_URL, json={'status': 1})
+        self.assertEqual(cache.group(self._USERS), Group('g1'))
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+        self.assertEqual(len(self._calls(self._ADD_URL)),
+                         len(self._USERS) + 1)
+
+    def test_resume_persisted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'groups.json')
+            responses.replace(responses.POST, self._ADD_URL,
+                              json={'status': 0, 'errors': ['unavailable']})
+            with self.assertRaises(GroupError):
+                GroupCache(self._APP, path=path).group(self._USERS)
+            responses.replace(responses.POST, self._ADD_URL,
+                              json={'status': 1})
+            GroupCache(self._APP, path=path).group(self._USERS)
+            self.assertEqual(len(self._calls(self._CREATE_URL)), 1)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'groups.json')
+            GroupCache(self._APP, path=path).group(self._USERS, name='oncall')
+            responses.calls.reset()
+            cache = GroupCache(self._APP, path=path)
+            self.assertEqual(cache.group(self._USERS), Group('g1'))
+            self.assertEqual(len(responses.calls), 0)
+
+    def test_send_small(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        results = GroupCache(self._APP).send(Message('message'),
+                                             self._USERS[:3])
+        self.assertEqual(len(results), 3)
+        self.assertEqual(len(self._calls(self._CREATE_URL)), 0)
+
+    def test_send_large(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        results = GroupCache(self._APP).send(Message('message'), self._USERS)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(self._calls(Message._ENDPOINT)[0]['user'], ['g1'])
@@ -0,0 +1,118 @@
+import unittest
+from unittest import mock
+import logging
+import queue
+import urllib.parse
+import requests
+import responses
+
+from pullover import Application, User, Message
+from pullover.logging import PushoverHandler
+from pullover.tests import test_message
+
+
+class TestPushoverHandler(unittest.TestCase):
+
+    def setUp(self):
+        responses.start()
+        self.addCleanup(responses.stop)
+        self.addCleanup(responses.reset)
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        self.logger = logging.getLogger('pullover_test_logging')
+        self.logger.propagate = False
+
+    def _handler(self, **kwargs):
+        kwargs.setdefault('window', 60)  # only flush on close
+        handler = PushoverHandler(Application('app'), User('user'), **kwargs)
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    @staticmethod
+    def _sent():
+        return [urllib.parse.parse_qs(call.request.body)
+                for call in responses.calls]
+
+    def test_single(self):
+        handler = self._handler()
+        self.logger.error('disk full')
+        handler.close()
+        sent = self._sent()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]['message'], ['disk full'])
+        self.assertEqual(sent[0]['priority'], [str(Message.NORMAL)])
+
+    def test_level(self):
+        handler = self._handler()
+        self.logger.warning('ignored')
+        handler.close()
+        self.assertEqual(len(responses.calls), 0)
+
+    def test_digest(self):
+        handler = self._handler()
+        for _ in range(3):
+            self.logger.error('disk full')
+        self.logger.critical('on fire')
+        handler.close()
+        sent = self._sent()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0]['title'], ['4 log records'])
+        self.assertEqual(sent[0]['message'], ['[x3] disk full\non fire'])
+        self.assertEqual(sent[0]['priority'], [str(Message.HIGH)])
+
+    def test_digest_formatted(self):
+        handler = self._handler()
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s.%(msecs)03d %(levelname)s %(message)s'))
+        for i in range(3):
+            self.logger.error('disk %d full', i)
+        handler.close()
+        lines = self._sent()[0]['message'][0].splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('[x3] '))
+        self.assertTrue(lines[0].endswith(' ERROR disk 0 full'))
+
+    def test_max_records(self):
+        handler = self._handler(max_records=1)
+        self.logger.error('one')
+        self.logger.error('two')
+        handler.close()
+        self.assertEqual(self._sent()[0]['message'], ['one\n... and 1 more'])
+
+    def test_send_raises(self):
+        handler = self._handler()
+        self.logger.error('disk full')
+        with mock.patch.object(Message, 'send',
+                               side_effect=requests.ConnectionError), \
+                self.assertLogs('pullover.logging', 'WARNING'):
+            handler.close()
+        self.assertEqual(handler._digester.sent, 0)
+
+    def test_rate_limit(self):
+        handler = self._handler(rate=1e-6, burst=1)
+        self.logger.error('first')
+        handler.queue.join()
+        handler._digester._flush()
+        self.logger.error('second')
+        handler.queue.join()
+        handler._digester._flush()
+        self.assertEqual(len(responses.calls), 1)
+        handler.close()  # pending record sent regardless of limit
+        self.assertEqual(len(responses.calls), 2)
+
+    def test_dropped(self):
+        handler = self._handler()
+        with mock.patch.object(handler.queue, 'put_nowait',
+                               side_effect=queue.Full):
+            self.logger.error('disk full')
+        handler.close()
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(len(responses.calls), 0)
+
+    def test_ignores_pullover(self):
+        handler = self._handler()
+        handler.handle(logging.makeLogRecord({'name': 'pullover.message',
+                                              'levelno': logging.ERROR}))
+        handler.close()
+        self.assertEqual(len(responses.calls), 0)
@@ -8,9 +8,12 @@ import sys
 import os
 import io
 import contextlib
+import shutil
+import tempfile
 import responses
 
-from pullover import __main__ as main, Message
+from pullover import __main__ as main, deadletter, Message, Application, \
+    User
 from pullover.__main__ import EnvDefault, DependencyAction, PriorityAction
 from pullover.tests import test_message
 
@@ -163,6 +166,17 @@ class TestParseArgs(unittest.TestCase):
         with self.assertRaises(SystemExit), _suppress_stderr():
             _ = main._parse_argv(self._BASE_ARGV).user
 
+    @_declare_app_user
+    def test_device_default(self):
+        self.assertIsNone(main._parse_argv(self._BASE_ARGV).device)
+
+    @_declare_app_user
+    def test_device_multiple(self):
+        self.assertEqual(
+            main._parse_argv(self._BASE_ARGV + ['-d', 'phone', '-d',
+                                                'tablet']).device,
+            ['phone', 'tablet'])
+
     @_declare_app_user
     def test_priority_default(self):
         self.assertEqual(main._parse_argv(self._BASE_ARGV).priority,
@@ -179,6 +193,26 @@ class TestParseArgs(unittest.TestCase):
         with self.assertRaises(SystemExit), _suppress_stderr():
             _ = main._parse_argv(self._BASE_ARGV + ['-p', '99'])
 
+    @_declare_app_user
+    def test_emergency(self):
+        args = main._parse_argv(self._BASE_ARGV + [
+            '-p', 'emergency', '--retry', '60', '--expire', '3600', '--tag',
+            'db'])
+        self.assertEqual(args.priority, Message.EMERGENCY)
+        self.assertEqual((args.retry, args.expire, args.tag),
+                         (60, 3600, ['db']))
+
+    @_declare_app_user
+    def test_emergency_missing_expire(self):
+        with self.assertRaises(SystemExit), _suppress_stderr():
+            main._parse_argv(self._BASE_ARGV + ['-p', 'emergency', '--retry',
+                                                '60'])
+
+    @_declare_app_user
+    def test_retry_not_emergency(self):
+        with self.assertRaises(SystemExit), _suppress_stderr():
+            main._parse_argv(self._BASE_ARGV + ['--retry', '60'])
+
     @_declare_app_user
     def test_title(self):
         self.assertEqual(
@@ -261,6 +295,88 @@ class TestMain(unittest.TestCase):
             test_message.TestSendResponse.SUCCESS_REQUEST + os.linesep)
         self.assertEqual(status_code, 0)
 
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    @responses.activate
+    def test_message_named_like_mode(self, _):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        for word in ('replay', 'follow'):
+            self.assertEqual(main.main(['pullover', word, '-a', 'valid',
+                                        '-u', 'valid']), 0)
+            self.assertIn('message=' + word, responses.calls[-1].request.body)
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dead.jsonl')
+        deadletter.DeadLetterStore(self.path).add(
+            Message('baz').prepare(Application('valid'), User('valid')),
+            'HTTP 503')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_workers(self):
+        args = main._parse_replay_argv(['pullover', '--replay', '-w', '2',
+                                        self.path])
+        self.assertEqual(args.workers, 2)
+        self.assertEqual(args.file, self.path)
+
+    @mock.patch('sys.stderr', new_callable=io.StringIO)
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    @responses.activate
+    def test_sent(self, mock_stdout, _):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=test_message.TestSendResponse.SUCCESS_JSON)
+        status_code = main.main(['pullover', '--replay', self.path])
+        self.assertEqual(mock_stdout.getvalue(),
+                         '1 sent, 0 failed' + os.linesep)
+        self.assertEqual(status_code, 0)
+
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    @mock.patch.object(deadletter, 'replay', return_value=(0, 1))
+    def test_failed(self, _, mock_stdout):
+        status_code = main.main(['pullover', '--replay', self.path])
+        self.assertEqual(mock_stdout.getvalue(),
+                         '0 sent, 1 failed' + os.linesep)
+        self.assertEqual(status_code, 1)
+
+
+class TestFollow(unittest.TestCase):
+
+    _ARGV = ['pullover', '--follow', '-a', 'app', '-u', 'user']
+
+    def test_parse(self):
+        args = main._parse_follow_argv(self._ARGV + [
+            '-e', 'ERROR', '-e', 'WARN', '--rate', '2', 'app.log'])
+        self.assertEqual(args.regex, ['ERROR', 'WARN'])
+        self.assertEqual(args.rate, 2)
+        self.assertEqual(args.file, 'app.log')
+        self.assertFalse(args.from_start)
+
+    def test_parse_requires_regex(self):
+        with _suppress_stderr(), self.assertRaises(SystemExit):
+            main._parse_follow_argv(self._ARGV + ['app.log'])
+
+    def test_parse_emergency(self):
+        with _suppress_stderr(), self.assertRaises(SystemExit):
+            main._parse_follow_argv(self._ARGV + [
+                '-e', 'ERROR', '-p', 'emergency', 'app.log'])
+
+    @mock.patch('sys.stderr', new_callable=io.StringIO)
+    def test_invalid_regex(self, mock_stderr):
+        status_code = main.main(self._ARGV + ['-e', '(', 'app.log'])
+        self.assertTrue(mock_stderr.getvalue().startswith('Invalid pattern'))
+        self.assertEqual(status_code, 1)
+
+    @mock.patch('pullover.follow.Follower.run')
+    def test_run(self, mock_run):
+        status_code = main.main(self._ARGV + ['-e', 'ERROR', 'app.log'])
+        mock_run.assert_called_once_with()
+        self.assertEqual(status_code, 0)
+
 
 class TestMainCli(unittest.TestCase):
 
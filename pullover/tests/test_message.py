@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 import datetime
 import pytz
 import responses
@@ -7,8 +8,11 @@ import urllib.parse
 
 import pullover
 from pullover import Application, User
+from pullover import retry, deadletter
+from pullover.retry import RetryBudget
+from pullover.timeout import AdaptiveTimeout
 from pullover.message import ClientSendError, ServerSendError, SendResponse, \
-    Message
+    Message, PreparedMessage, merge
 
 
 class TestClientSendError(unittest.TestCase):
@@ -62,6 +66,19 @@ class TestSendResponse(unittest.TestCase):
         self.assertFalse(
             SendResponse(self._response(json=self.INVALID_USER_JSON)).ok)
 
+    def test_http_status(self):
+        self.assertEqual(SendResponse(self._response(status=429)).http_status,
+                         429)
+
+    def test_app_remaining(self):
+        response = self._response(json=self.SUCCESS_JSON,
+                                  headers={'X-Limit-App-Remaining': '7496'})
+        self.assertEqual(SendResponse(response).app_remaining, 7496)
+
+    def test_app_remaining_missing(self):
+        self.assertIsNone(
+            SendResponse(self._response(json=self.SUCCESS_JSON)).app_remaining)
+
     def test_raise_for_status_server_5xx(self):
         with self.assertRaises(ServerSendError):
             SendResponse(self._response(status=503)).raise_for_status()
@@ -137,6 +154,7 @@ class TestMessage(unittest.TestCase):
                 self._URL_TITLE, self._PRIORITY).send(self._APP, self._USER)
         self.assertEqual(len(responses.calls), 1)  # no retry on response.ok
 
+    @mock.patch.object(retry, '_default', RetryBudget())
     @responses.activate
     def test_send_retry_5xx(self):
         def callback(_):
@@ -149,6 +167,27 @@ class TestMessage(unittest.TestCase):
                                       retry_interval=0)  # to speed up test
         self.assertFalse(response.ok)
         self.assertEqual(len(responses.calls), Message._DEFAULT_MAX_SEND_TRIES)
+        self.assertEqual(response.attempts, Message._DEFAULT_MAX_SEND_TRIES)
+        self.assertEqual(retry.default().retries,
+                         Message._DEFAULT_MAX_SEND_TRIES - 1)
+
+    @mock.patch.object(retry, '_default',
+                       RetryBudget(ratio=0, min_per_second=0.1))
+    @responses.activate
+    def test_send_retry_budget_exhausted(self):
+        responses.add(responses.POST, Message._ENDPOINT, status=503)
+        response = self._MESSAGE.send(self._APP, self._USER,
+                                      retry_interval=0)
+        self.assertFalse(response.ok)
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(retry.default().denied, 1)
+
+    @mock.patch.object(retry, '_default', None)
+    @responses.activate
+    def test_send_retry_unbudgeted(self):
+        responses.add(responses.POST, Message._ENDPOINT, status=503)
+        self._MESSAGE.send(self._APP, self._USER, retry_interval=0)
+        self.assertEqual(len(responses.calls), Message._DEFAULT_MAX_SEND_TRIES)
 
     @responses.activate
     def test_send_no_retry_4xx(self):
@@ -162,6 +201,94 @@ class TestMessage(unittest.TestCase):
         self.assertFalse(response.ok)
         self.assertEqual(len(responses.calls), 1)
 
+    @responses.activate
+    def test_send_retry_timeout(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      body=requests.ConnectTimeout())
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=TestSendResponse.SUCCESS_JSON)
+        response = self._MESSAGE.send(self._APP, self._USER,
+                                      retry_interval=0)
+        self.assertTrue(response.ok)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_send_timeout_exhausted(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      body=requests.ReadTimeout())
+        with self.assertRaises(requests.Timeout):
+            self._MESSAGE.send(self._APP, self._USER, retry_interval=0,
+                               max_tries=2)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_send_adaptive_timeout(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      body=requests.ConnectTimeout())
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=TestSendResponse.SUCCESS_JSON)
+        timeout = mock.Mock(spec=AdaptiveTimeout)
+        timeout.current.return_value = 1
+        self._MESSAGE.send(self._APP, self._USER, timeout=timeout,
+                           retry_interval=0)
+        timeout.expired.assert_called_once_with()
+        timeout.observe.assert_called_once_with(mock.ANY)
+
+    @mock.patch.object(deadletter, '_default')
+    @responses.activate
+    def test_send_dead_letter(self, store):
+        responses.add(responses.POST, Message._ENDPOINT, status=503)
+        self._MESSAGE.send(self._APP, self._USER, retry_interval=0,
+                           max_tries=1)
+        store.add.assert_called_once_with(mock.ANY, 'HTTP 503')
+
+    @mock.patch.object(deadletter, '_default')
+    @responses.activate
+    def test_send_dead_letter_unreachable(self, store):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      body=requests.ConnectionError('refused'))
+        with self.assertRaises(requests.ConnectionError):
+            self._MESSAGE.send(self._APP, self._USER)
+        store.add.assert_called_once_with(mock.ANY, 'refused')
+
+    @mock.patch.object(deadletter, '_default')
+    @responses.activate
+    def test_send_no_dead_letter_4xx(self, store):
+        responses.add(responses.POST, Message._ENDPOINT, status=400)
+        self._MESSAGE.send(self._APP, self._USER)
+        store.add.assert_not_called()
+
+    def test_init_emergency_missing(self):
+        with self.assertRaises(ValueError):
+            Message(self._BODY, priority=Message.EMERGENCY)
+
+    def test_init_emergency_out_of_range(self):
+        with self.assertRaises(ValueError):
+            Message(self._BODY, priority=Message.EMERGENCY, retry=10,
+                    expire=60)
+
+    def test_init_retry_not_emergency(self):
+        with self.assertRaises(ValueError):
+            Message(self._BODY, retry=60, expire=3600)
+
+    @responses.activate
+    def test_send_emergency(self):
+        def callback(request):
+            params = urllib.parse.parse_qs(request.body)
+            self.assertEqual(params['priority'][0], str(Message.EMERGENCY))
+            self.assertEqual(params['retry'][0], '60')
+            self.assertEqual(params['expire'][0], '3600')
+            self.assertEqual(params['tags'][0], 'db,prod')
+            return 200, {}, '{"status": 1, "request": "r", "receipt": "x"}'
+
+        responses.add_callback(responses.POST, Message._ENDPOINT,
+                               callback=callback)
+
+        response = Message(self._BODY, priority=Message.EMERGENCY, retry=60,
+                           expire=3600, tags=['db', 'prod']) \
+            .send(self._APP, self._USER)
+        self.assertEqual(response.receipt, 'x')
+
     def test_str(self):
         self.assertEqual(str(self._MESSAGE), 'Message({0})'.format(self._BODY))
 
@@ -179,3 +306,75 @@ class TestPreparedMessage(unittest.TestCase):
         self.assertTrue(response.ok)
         self.assertEqual(response.id,
                          TestSendResponse.SUCCESS_REQUEST)
+
+    @responses.activate
+    def test_submit(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json=TestSendResponse.SUCCESS_JSON)
+        prepared = Message('message').prepare(Application('app'), User('user'))
+        future = prepared.submit(max_tries=1)
+        self.assertEqual(future.result(5).id, TestSendResponse.SUCCESS_REQUEST)
+
+    def test_dict_round_trip(self):
+        timestamp = pytz.utc.localize(datetime.datetime(2020, 1, 2, 3, 4, 5))
+        prepared = Message('message', 'title', timestamp, 'https://gebn.co.uk',
+                           'url title', Message.HIGH) \
+            .prepare(Application('app'), User('user', ['phone']))
+        restored = PreparedMessage.from_dict(prepared.to_dict())
+        self.assertEqual(restored.to_dict(), prepared.to_dict())
+        emergency = Message('message', priority=Message.EMERGENCY, retry=60,
+                            expire=3600, tags=['db']) \
+            .prepare(Application('app'), User('user'))
+        self.assertEqual(
+            PreparedMessage.from_dict(emergency.to_dict()).to_dict(),
+            emergency.to_dict())
+        self.assertEqual(restored.application, Application('app'))
+        self.assertEqual(restored.user, User('user', ['phone']))
+
+
+class TestMerge(unittest.TestCase):
+
+    _APP = Application('app')
+    _MESSAGE = Message('message')
+
+    def test_devices(self):
+        merged = merge([self._MESSAGE.prepare(self._APP, User('a', ['phone'])),
+                        self._MESSAGE.prepare(self._APP, User('b')),
+                        self._MESSAGE.prepare(self._APP,
+                                              User('a', ['tablet']))])
+        self.assertEqual([prepared.user for prepared in merged],
+                         [User('a', ['phone', 'tablet']), User('b')])
+
+    def test_all_devices(self):
+        merged = merge([self._MESSAGE.prepare(self._APP, User('a', ['phone'])),
+                        self._MESSAGE.prepare(self._APP, User('a'))])
+        self.assertEqual([prepared.user for prepared in merged],
+                         [User('a', ['phone']), User('a')])
+
+    def test_identical(self):
+        for devices in (['phone'], None):
+            prepared = self._MESSAGE.prepare(self._APP, User('a', devices))
+            self.assertEqual(len(merge([prepared, prepared])), 2)
+
+    def test_overlapping_devices(self):
+        merged = merge([
+            self._MESSAGE.prepare(self._APP, User('a', ['phone'])),
+            self._MESSAGE.prepare(self._APP, User('a', ['phone', 'tablet'])),
+            self._MESSAGE.prepare(self._APP, User('a', ['tablet']))])
+        self.assertEqual([prepared.user for prepared in merged],
+                         [User('a', ['phone', 'tablet']),
+                          User('a', ['phone', 'tablet'])])
+
+    def test_equal_content(self):
+        merged = merge([Message('message').prepare(self._APP,
+                                                   User('a', ['phone'])),
+                        Message('message').prepare(self._APP,
+                                                   User('a', ['tablet']))])
+        self.assertEqual(len(merged), 1)
+
+    def test_different_content(self):
+        merged = merge([Message('one').prepare(self._APP,
+                                               User('a', ['phone'])),
+                        Message('two').prepare(self._APP,
+                                               User('a', ['tablet']))])
+        self.assertEqual(len(merged), 2)
@@ -0,0 +1,33 @@
+import unittest
+
+from pullover.ratelimit import TokenBucket
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.bucket = TokenBucket(2, 3, clock=lambda: self.now)
+
+    def test_burst(self):
+        self.assertTrue(all(self.bucket.take() for _ in range(3)))
+        self.assertFalse(self.bucket.take())
+
+    def test_refill(self):
+        for _ in range(3):
+            self.bucket.take()
+        self.now = 0.5
+        self.assertTrue(self.bucket.take())
+        self.assertFalse(self.bucket.take())
+
+    def test_capacity(self):
+        self.now = 100
+        for _ in range(3):
+            self.bucket.take()
+        self.assertFalse(self.bucket.take())
+
+    def test_delay(self):
+        self.assertEqual(self.bucket.delay(), 0)
+        for _ in range(3):
+            self.bucket.take()
+        self.assertAlmostEqual(self.bucket.delay(), 0.5)
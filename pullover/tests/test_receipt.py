@@ -0,0 +1,168 @@
+import unittest
+import re
+import responses
+
+from pullover import Application, endpoint
+from pullover.receipt import ReceiptPoller, ReceiptError, ReceiptStatus
+
+
+_RECEIPT = 'r4ni8aobjcbskm5s7ssjzkkdyhpb8o'
+_POLL_URL = endpoint.RECEIPT.url(receipt=_RECEIPT)
+
+
+def _status(**kwargs):
+    json = {
+        'status': 1,
+        'acknowledged': 0,
+        'acknowledged_at': 0,
+        'acknowledged_by': '',
+        'acknowledged_by_device': '',
+        'last_delivered_at': 1500000000,
+        'expired': 0,
+        'expires_at': 1500003600,
+        'request': 'request'
+    }
+    json.update(kwargs)
+    return json
+
+
+class TestReceiptStatus(unittest.TestCase):
+
+    def test_pending(self):
+        status = ReceiptStatus(_status())
+        self.assertFalse(status.done)
+        self.assertIsNone(status.acknowledged_at)
+        self.assertIsNone(status.acknowledged_by)
+        self.assertEqual(status.expires_at.timestamp(), 1500003600)
+
+    def test_acknowledged(self):
+        status = ReceiptStatus(_status(acknowledged=1,
+                                       acknowledged_at=1500000100,
+                                       acknowledged_by='user',
+                                       acknowledged_by_device='phone'))
+        self.assertTrue(status.done)
+        self.assertEqual(status.acknowledged_by, 'user')
+        self.assertEqual(status.acknowledged_by_device, 'phone')
+
+
+class TestReceiptPoller(unittest.TestCase):
+
+    _APP = Application('app')
+
+    def setUp(self):
+        self.poller = ReceiptPoller(min_interval=0, max_interval=0.1)
+
+    def tearDown(self):
+        self.poller.close()
+
+    @responses.activate
+    def test_acknowledged(self):
+        responses.add(responses.GET, _POLL_URL, json=_status())
+        responses.add(responses.GET, _POLL_URL,
+                      json=_status(acknowledged=1, acknowledged_by='user'))
+        receipt = self.poller.track(self._APP, _RECEIPT)
+        status = receipt.future.result(5)
+        self.assertEqual(status.acknowledged_by, 'user')
+        self.assertEqual(self.poller.tracked, 0)
+        self.assertIn('token=app', responses.calls[0].request.url)
+
+    @responses.activate
+    def test_unknown(self):
+        responses.add(responses.GET, _POLL_URL, status=404,
+                      json={'status': 0, 'errors': ['receipt not found']})
+        receipt = self.poller.track(self._APP, _RECEIPT)
+        with self.assertRaises(ReceiptError):
+            receipt.future.result(5)
+
+    def test_track_twice(self):
+        poller = ReceiptPoller(min_interval=60)
+        try:
+            self.assertIs(poller.track(self._APP, _RECEIPT),
+                          poller.track(self._APP, _RECEIPT))
+            self.assertEqual(poller.tracked, 1)
+        finally:
+            poller.close()
+
+    @responses.activate
+    def test_cancel(self):
+        responses.add(responses.POST,
+                      endpoint.CANCEL_RECEIPT.url(receipt=_RECEIPT),
+                      json={'status': 1, 'request': 'request'})
+        poller = ReceiptPoller(min_interval=60)
+        try:
+            receipt = poller.track(self._APP, _RECEIPT)
+            poller.cancel(receipt)
+            self.assertTrue(receipt.future.cancelled())
+            self.assertEqual(poller.tracked, 0)
+        finally:
+            poller.close()
+
+    @responses.activate
+    def test_cancel_by_tag(self):
+        responses.add(responses.POST,
+                      endpoint.CANCEL_BY_TAG.url(tag='db'),
+                      json={'status': 1, 'canceled': 1, 'request': 'request'})
+        poller = ReceiptPoller(min_interval=60)
+        try:
+            tagged = poller.track(self._APP, 'a', ['db', 'prod'])
+            untagged = poller.track(self._APP, 'b', ['web'])
+            self.assertEqual(poller.cancel_by_tag(self._APP, 'db'), 1)
+            self.assertTrue(tagged.future.cancelled())
+            self.assertFalse(untagged.future.done())
+        finally:
+            poller.close()
+
+    @responses.activate
+    def test_cancel_failure(self):
+        responses.add(responses.POST, re.compile('.*'), status=400,
+                      json={'status': 0, 'errors': ['invalid receipt']})
+        poller = ReceiptPoller(min_interval=60)
+        try:
+            receipt = poller.track(self._APP, _RECEIPT)
+            with self.assertRaises(ReceiptError):
+                poller.cancel(receipt)
+            self.assertEqual(poller.tracked, 1)
+        finally:
+            poller.close()
+
+
+class TestInterval(unittest.TestCase):
+
+    _APP = Application('app')
+
+    def setUp(self):
+        self.now = 1500000000.
+        self.poller = ReceiptPoller(min_interval=5, max_interval=60,
+                                    clock=lambda: self.now)
+        self.receipt = self.poller.track(self._APP, _RECEIPT)
+
+    def tearDown(self):
+        self.poller.close()
+
+    def _poll(self):
+        self.poller._slots.acquire()
+        self.poller._poll(self.receipt)
+
+    @responses.activate
+    def test_backoff_unchanged(self):
+        responses.add(responses.GET, _POLL_URL, json=_status())
+        self._poll()
+        self._poll()
+        self.assertEqual(self.receipt._interval, 7.5)
+
+    @responses.activate
+    def test_reset_on_delivery(self):
+        responses.add(responses.GET, _POLL_URL, json=_status())
+        self._poll()
+        self._poll()
+        responses.replace(responses.GET, _POLL_URL,
+                          json=_status(last_delivered_at=1500000060))
+        self._poll()
+        self.assertEqual(self.receipt._interval, 5)
+
+    @responses.activate
+    def test_server_error(self):
+        responses.add(responses.GET, _POLL_URL, status=503)
+        self._poll()
+        self.assertEqual(self.receipt._interval, 10)
+        self.assertFalse(self.receipt.future.done())
@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+import concurrent.futures
+import requests
+
+from pullover.message import SendResponse
+from pullover.results import ResultStore
+
+
+_REQUEST_ID = '5042853c-402d-4a18-abcb-168734a801de'
+
+
+def _response(status=1, http_status=200, latency=0.1, errors=None,
+              attempts=1):
+    response = mock.Mock(spec=SendResponse)
+    response.status = status
+    response.http_status = http_status
+    response.latency = latency
+    response.attempts = attempts
+    response.id = _REQUEST_ID
+    response.errors = errors or []
+    return response
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ResultStore()
+
+    def test_summary(self):
+        for latency in range(1, 101):
+            self.store.add(_response(latency=latency / 100))
+        self.store.add(_response(0, 400, errors=['user key is invalid']))
+        self.store.add_exception(requests.ReadTimeout('timed out'))
+        summary = self.store.summary()
+        self.assertEqual((summary['total'], summary['ok'], summary['failed']),
+                         (102, 100, 2))
+        self.assertEqual(summary['by_http_status'], {200: 100, 400: 1, 0: 1})
+        self.assertAlmostEqual(summary['latency_p50'], 0.5, places=5)
+        self.assertAlmostEqual(summary['latency_max'], 1, places=5)
+
+    def test_empty(self):
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(self.store.percentile(50))
+
+    def test_failures(self):
+        self.store.add(_response())
+        self.store.add(_response(0, 400, errors=['invalid']), index=7)
+        self.store.add(_response(0, 400, errors=['invalid']), index=8)
+        self.store.add_exception(requests.ReadTimeout('timed out'), index=9)
+        self.assertEqual(list(self.store.failures()), [
+            (7, 400, _REQUEST_ID, 'invalid'),
+            (8, 400, _REQUEST_ID, 'invalid'),
+            (9, 0, None, 'timed out')])
+        self.assertEqual(len(self.store._error_strings), 3)
+
+    def test_track(self):
+        ok = concurrent.futures.Future()
+        failed = concurrent.futures.Future()
+        self.store.track(ok, 0)
+        self.store.track(failed, 1)
+        ok.set_result(_response(attempts=3))
+        failed.set_exception(requests.ConnectionError('refused'))
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(list(self.store._attempts), [3, 0])
+        self.assertEqual([failure[0] for failure in self.store.failures()],
+                         [1])
@@ -0,0 +1,50 @@
+import unittest
+
+from pullover import retry
+from pullover.retry import RetryBudget
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.
+        self.budget = RetryBudget(ratio=0.5, min_per_second=0.1, ttl=10,
+                                  clock=lambda: self.now)
+
+    def test_reserve(self):
+        self.assertTrue(self.budget.withdraw())
+        self.assertFalse(self.budget.withdraw())
+        self.assertEqual(self.budget.retries, 1)
+        self.assertEqual(self.budget.denied, 1)
+
+    def test_ratio(self):
+        for _ in range(4):
+            self.budget.deposit()
+        self.assertEqual(self.budget.balance, 3)
+        self.assertTrue(all(self.budget.withdraw() for _ in range(3)))
+        self.assertFalse(self.budget.withdraw())
+        self.assertEqual(self.budget.attempts, 4)
+
+    def test_expiry(self):
+        for _ in range(4):
+            self.budget.deposit()
+        self.now = 5
+        self.assertEqual(self.budget.balance, 3)
+        self.now = 10
+        self.assertEqual(self.budget.balance, 1)
+
+    def test_withdrawals_expire(self):
+        self.budget.withdraw()
+        self.assertFalse(self.budget.withdraw())
+        self.now = 100
+        self.assertTrue(self.budget.withdraw())
+
+
+class TestDefault(unittest.TestCase):
+
+    def test_configure(self):
+        previous = retry.default()
+        self.addCleanup(retry.configure, previous)
+        budget = RetryBudget()
+        retry.configure(budget)
+        self.assertIs(retry.default(), budget)
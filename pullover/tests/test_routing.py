@@ -0,0 +1,171 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pullover import Application, Message
+from pullover.routing import Router
+
+
+class TestRouter(unittest.TestCase):
+
+    _APP = Application('app')
+
+    _CONFIG = {
+        'recipients': {
+            'db-oncall': [{'user': 'alice', 'devices': ['phone']}],
+            'web-oncall': [{'user': 'bob'}],
+            'everyone': [{'user': 'alice', 'devices': ['tablet']},
+                         {'user': 'bob'}, {'user': 'carol'}]
+        },
+        'rules': [
+            {'match': {'team': 'db', 'severity': ['critical', 'page']},
+             'recipients': ['db-oncall'], 'priority': 'emergency',
+             'retry': 60, 'expire': 3600, 'continue': True},
+            {'match': {'team': 'web'},
+             'recipients': ['web-oncall'], 'priority': 'high'},
+            {'match': {'env': {'not': 'dev'}, 'host': {'regex': 'db-.*'}},
+             'recipients': ['everyone']}
+        ]
+    }
+
+    def setUp(self):
+        self._router = Router(self._CONFIG, self._APP)
+
+    def test_rules_first_match(self):
+        self.assertEqual(self._router.rules({'team': 'web',
+                                             'host': 'db-1'}), [1])
+
+    def test_rules_continue(self):
+        self.assertEqual(self._router.rules({'team': 'db',
+                                             'severity': 'page',
+                                             'host': 'db-1'}), [0, 2])
+
+    def test_rules_list_matcher(self):
+        self.assertEqual(self._router.rules({'team': 'db',
+                                             'severity': 'warning'}), [])
+
+    def test_rules_regex_full_match(self):
+        self.assertEqual(self._router.rules({'host': 'web-db-1'}), [])
+
+    def test_rules_not(self):
+        self.assertEqual(self._router.rules({'host': 'db-1',
+                                             'env': 'dev'}), [])
+        self.assertEqual(self._router.rules({'host': 'db-1'}), [2])
+
+    def test_route_no_match(self):
+        self.assertEqual(self._router.route({'team': 'none'}, 'Hi'), [])
+
+    def test_route_highest_priority(self):
+        prepared = self._router.route(
+            {'team': 'db', 'severity': 'critical', 'host': 'db-1'},
+            'Disk full', title='db-1')
+        by_user = {p.user.key: p for p in prepared}
+        self.assertEqual(len(prepared), 3)
+
+        # alice matched both rules, so is sent the emergency on one device
+        self.assertEqual(by_user['alice'].message.priority, Message.EMERGENCY)
+        self.assertEqual(by_user['alice'].user.devices, frozenset(['phone']))
+        self.assertEqual(by_user['bob'].message.priority, Message.NORMAL)
+        self.assertIs(by_user['bob'].message, by_user['carol'].message)
+
+    def test_route_merges_devices(self):
+        router = Router({
+            'recipients': {
+                'phones': [{'user': 'alice', 'devices': ['phone']}],
+                'tablets': [{'user': 'alice', 'devices': ['tablet']}]
+            },
+            'rules': [
+                {'match': {'team': 'db'}, 'recipients': ['phones'],
+                 'continue': True},
+                {'match': {}, 'recipients': ['tablets']}
+            ]
+        }, self._APP)
+        prepared = router.route({'team': 'db'}, 'Hi')
+        self.assertEqual(len(prepared), 1)
+        self.assertEqual(prepared[0].user.devices,
+                         frozenset(['phone', 'tablet']))
+
+    def test_route_overlapping_recipients(self):
+        router = Router({
+            'recipients': {
+                'db': [{'user': 'alice', 'devices': ['phone']},
+                       {'user': 'bob'}],
+                'web': [{'user': 'alice', 'devices': ['phone', 'tablet']},
+                        {'user': 'bob'}]
+            },
+            'rules': [
+                {'match': {}, 'recipients': ['db'], 'continue': True},
+                {'match': {}, 'recipients': ['web']}
+            ]
+        }, self._APP)
+        prepared = router.route({}, 'Hi')
+        self.assertEqual(sorted(p.user.key for p in prepared),
+                         ['alice', 'bob'])
+        by_user = {p.user.key: p.user for p in prepared}
+        self.assertEqual(by_user['alice'].devices,
+                         frozenset(['phone', 'tablet']))
+        self.assertIsNone(by_user['bob'].devices)
+
+    def test_route_all_and_specific_devices(self):
+        router = Router({
+            'recipients': {
+                'all': [{'user': 'alice'}],
+                'phones': [{'user': 'alice', 'devices': ['phone']}]
+            },
+            'rules': [
+                {'match': {}, 'recipients': ['phones'], 'continue': True},
+                {'match': {}, 'recipients': ['all']}
+            ]
+        }, self._APP)
+        prepared = router.route({}, 'Hi')
+        self.assertEqual(len(prepared), 1)
+        self.assertEqual(prepared[0].user.key, 'alice')
+        self.assertIsNone(prepared[0].user.devices)
+
+    def test_route_rule_parameters(self):
+        router = Router({
+            'recipients': {'a': [{'user': 'alice'}], 'b': [{'user': 'bob'}]},
+            'rules': [
+                {'match': {}, 'recipients': ['a'], 'priority': 'emergency',
+                 'retry': 60, 'expire': 3600, 'continue': True},
+                {'match': {}, 'recipients': ['b'], 'priority': 'emergency',
+                 'retry': 30, 'expire': 600, 'sound': 'siren'}
+            ]
+        }, self._APP)
+        by_user = {p.user.key: p.to_dict()
+                   for p in router.route({}, 'Hi', sound='pushover')}
+        self.assertEqual((by_user['alice']['retry'],
+                          by_user['alice']['sound']), (60, 'pushover'))
+        self.assertEqual((by_user['bob']['retry'], by_user['bob']['expire'],
+                          by_user['bob']['sound']), (30, 600, 'siren'))
+
+    def test_emergency_without_retry(self):
+        with self.assertRaises(ValueError):
+            Router({'recipients': {'a': []},
+                    'rules': [{'recipients': ['a'],
+                               'priority': 'emergency'}]}, self._APP)
+
+    def test_unknown_recipients(self):
+        with self.assertRaises(ValueError):
+            Router({'rules': [{'recipients': ['nobody']}]}, self._APP)
+
+    def test_invalid_priority(self):
+        with self.assertRaises(ValueError):
+            Router({'recipients': {'a': []},
+                    'rules': [{'recipients': ['a'], 'priority': 'urgent'}]},
+                   self._APP)
+
+    def test_invalid_matcher(self):
+        with self.assertRaises(ValueError):
+            Router({'recipients': {'a': []},
+                    'rules': [{'recipients': ['a'],
+                               'match': {'team': 42}}]}, self._APP)
+
+    def test_from_file(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._CONFIG, f)
+        router = Router.from_file(path, self._APP)
+        self.assertEqual(router.rules({'team': 'web'}), [1])
@@ -0,0 +1,170 @@
+import unittest
+from unittest import mock
+import contextlib
+import datetime
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import concurrent.futures
+
+from pullover import Application, User, Message, schedule
+from pullover.schedule import Scheduler
+
+
+def _prepared(body='message'):
+    prepared = Message(body).prepare(Application('app'), User('user'))
+    future = concurrent.futures.Future()
+    future.set_result(body)
+    prepared.submit = mock.Mock(return_value=future)
+    return prepared
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    def test_due(self):
+        prepared = _prepared()
+        scheduled = self.scheduler.schedule(prepared, time.time(),
+                                            max_tries=1)
+        self.assertEqual(scheduled.future.result(5), 'message')
+        prepared.submit.assert_called_once_with(max_tries=1)
+        self.assertEqual(self.scheduler.pending, 0)
+
+    def test_order(self):
+        sent = []
+        now = time.time()
+        for body, delay in [('second', 0.2), ('first', 0.1)]:
+            prepared = _prepared(body)
+            prepared.submit.side_effect = \
+                lambda body=body, **_: sent.append(body) or mock.MagicMock()
+            self.scheduler.schedule(prepared, now + delay)
+        while self.scheduler.pending:
+            time.sleep(0.01)
+        self.assertEqual(sent, ['first', 'second'])
+
+    def test_datetime(self):
+        when = datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc)
+        scheduled = self.scheduler.schedule(_prepared(), when)
+        self.assertEqual(scheduled.when, when)
+        self.assertEqual(self.scheduler.pending, 1)
+
+    def test_cancel(self):
+        prepared = _prepared()
+        scheduled = self.scheduler.schedule(prepared, time.time() + 60)
+        self.assertTrue(scheduled.cancel())
+        self.assertFalse(scheduled.cancel())
+        self.assertTrue(scheduled.future.cancelled())
+        self.assertEqual(self.scheduler.pending, 0)
+        prepared.submit.assert_not_called()
+
+    def test_cancel_compacts(self):
+        later = time.time() + 60
+        for scheduled in [self.scheduler.schedule(_prepared(), later)
+                          for _ in range(200)]:
+            scheduled.cancel()
+        self.assertLess(len(self.scheduler._heap), 100)
+
+    def test_closed(self):
+        self.scheduler.close()
+        with self.assertRaises(RuntimeError):
+            self.scheduler.schedule(_prepared(), time.time())
+
+
+class TestPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'schedule.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_restore(self):
+        with Scheduler(self.path) as scheduler:
+            scheduled = scheduler.schedule(_prepared(), time.time() + 60,
+                                           max_tries=2)
+            cancelled = scheduler.schedule(_prepared(), time.time() + 60)
+            cancelled.cancel()
+        with Scheduler(self.path) as scheduler:
+            self.assertEqual(scheduler.pending, 1)
+            restored, kwargs, _ = scheduler._pending[scheduled.id]
+            self.assertEqual(restored.prepared.to_dict(),
+                             scheduled.prepared.to_dict())
+            self.assertEqual(kwargs, {'max_tries': 2})
+
+    def test_kept_until_sent(self):
+        prepared = _prepared()
+        pending = concurrent.futures.Future()
+        prepared.submit.return_value = pending
+        with Scheduler(self.path) as scheduler:
+            scheduled = scheduler.schedule(prepared, time.time())
+            while scheduler.pending:
+                time.sleep(0.01)
+            self.assertEqual(self._rows(), 1)  # due, but not yet sent
+            pending.set_result('message')
+            self.assertEqual(scheduled.future.result(5), 'message')
+        self.assertEqual(self._rows(), 0)
+
+    def test_schedule_many(self):
+        later = time.time() + 60
+        with Scheduler(self.path) as scheduler:
+            scheduled = scheduler.schedule_many(
+                [(_prepared(str(i)), later + i) for i in range(100)],
+                max_tries=1)
+            self.assertEqual(scheduler.pending, 100)
+        self.assertEqual(self._rows(), 100)
+        with Scheduler(self.path) as scheduler:
+            self.assertEqual(scheduler._pending[scheduled[1].id][1],
+                             {'max_tries': 1})
+
+    def _rows(self):
+        with contextlib.closing(sqlite3.connect(self.path)) as db:
+            return db.execute('SELECT COUNT(*) FROM schedule').fetchone()[0]
+
+    def test_unserialisable(self):
+        with Scheduler(self.path) as scheduler:
+            with self.assertRaises(TypeError):
+                scheduler.schedule(_prepared(), time.time(),
+                                   timeout=object())
+            self.assertEqual(scheduler.pending, 0)
+
+
+class TestPreparedMessage(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        patcher = mock.patch.object(schedule, '_default',
+                                    (os.getpid(), self.scheduler))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.scheduler.close()
+
+    def test_send_at(self):
+        prepared = _prepared()
+        prepared.send_at(time.time()).future.result(5)
+        prepared.submit.assert_called_once_with()
+
+    def test_cancel(self):
+        prepared = _prepared()
+        prepared.send_at(time.time() + 60)
+        prepared.send_at(time.time() + 120)
+        self.assertEqual(prepared.cancel(), 2)
+        self.assertEqual(self.scheduler.pending, 0)
+        self.assertEqual(prepared._scheduled, set())
+
+    def test_fired_forgotten(self):
+        prepared = _prepared()
+        prepared.send_at(time.time()).future.result(5)
+        deadline = time.monotonic() + 5  # callbacks run after waiters wake
+        while prepared._scheduled and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(prepared._scheduled, set())
@@ -0,0 +1,150 @@
+import unittest
+from unittest import mock
+import threading
+import time
+import os
+
+from pullover import Application, User, Message, sendqueue
+from pullover.sendqueue import SendQueue, QueueFullError
+
+
+def _prepared(body, priority=Message.NORMAL):
+    message = Message(body, priority=priority)
+    prepared = message.prepare(Application('app'), User('user'))
+    prepared.send = mock.Mock(return_value=body)
+    return prepared
+
+
+class TestSendQueue(unittest.TestCase):
+
+    def _blocked(self, **kwargs):
+        """
+        Create a queue with a single worker stuck sending a message until the
+        returned event is set.
+        """
+        gate = threading.Event()
+        queue = SendQueue(workers=1, **kwargs)
+        self.addCleanup(queue.close, 5)
+        self.addCleanup(gate.set)
+        blocker = _prepared('blocker')
+        blocker.send.side_effect = lambda **_: gate.wait(5)
+        queue.put(blocker)
+        while queue.depth:
+            time.sleep(0.001)
+        return queue, gate
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            SendQueue(policy='invalid')
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            SendQueue(maxsize=0)
+
+    def test_send(self):
+        prepared = _prepared('message')
+        with SendQueue(max_tries=1) as queue:
+            future = queue.put(prepared, timeout=1)
+        self.assertEqual(future.result(), 'message')
+        prepared.send.assert_called_once_with(max_tries=1, timeout=1)
+        self.assertEqual(queue.sent, 1)
+
+    def test_limiter(self):
+        prepared = _prepared('message')
+        limiter = mock.Mock()
+        with SendQueue(limiter=limiter) as queue:
+            future = queue.put(prepared, max_tries=1)
+        self.assertIs(future.result(), limiter.send.return_value)
+        limiter.send.assert_called_once_with(prepared, max_tries=1)
+
+    def test_reject(self):
+        queue, _ = self._blocked(maxsize=1, policy=SendQueue.REJECT)
+        queue.put(_prepared('one'))
+        with self.assertRaises(QueueFullError):
+            queue.put(_prepared('two'))
+        self.assertEqual(queue.rejected, 1)
+        self.assertEqual(queue.depth, 1)
+
+    def test_block_timeout(self):
+        queue, _ = self._blocked(maxsize=1, block_timeout=0.01)
+        queue.put(_prepared('one'))
+        with self.assertRaises(QueueFullError):
+            queue.put(_prepared('two'))
+
+    def test_block(self):
+        queue, gate = self._blocked(maxsize=1)
+        queue.put(_prepared('one'))
+        threading.Timer(0.01, gate.set).start()
+        self.assertEqual(queue.put(_prepared('two')).result(5), 'two')
+
+    def test_drop_oldest(self):
+        queue, gate = self._blocked(maxsize=2, policy=SendQueue.DROP_OLDEST)
+        futures = [queue.put(_prepared(str(i))) for i in range(3)]
+        gate.set()
+        self.assertIsInstance(futures[0].exception(5), QueueFullError)
+        self.assertEqual([future.result(5) for future in futures[1:]],
+                         ['1', '2'])
+        self.assertEqual(queue.dropped, 1)
+
+    def test_drop_cancelled(self):
+        for policy in (SendQueue.DROP_OLDEST, SendQueue.DROP_LOWEST_PRIORITY):
+            queue, gate = self._blocked(maxsize=1, policy=policy)
+            cancelled = queue.put(_prepared('cancelled'))
+            self.assertTrue(cancelled.cancel())
+            future = queue.put(_prepared('sent'))
+            gate.set()
+            self.assertEqual(future.result(5), 'sent')
+            self.assertTrue(cancelled.cancelled())
+            self.assertEqual(queue.dropped, 0)
+
+    def test_drop_lowest_priority(self):
+        queue, gate = self._blocked(maxsize=2,
+                                    policy=SendQueue.DROP_LOWEST_PRIORITY)
+        high = queue.put(_prepared('high', Message.HIGH))
+        low = queue.put(_prepared('low', Message.LOW))
+        normal = queue.put(_prepared('normal'))
+        lowest = queue.put(_prepared('lowest', Message.LOWEST))
+        gate.set()
+        self.assertIsInstance(low.exception(5), QueueFullError)
+        self.assertIsInstance(lowest.exception(5), QueueFullError)
+        self.assertEqual(high.result(5), 'high')
+        self.assertEqual(normal.result(5), 'normal')
+        self.assertEqual(queue.dropped, 2)
+
+    def test_flush_timeout(self):
+        queue, gate = self._blocked()
+        self.assertFalse(queue.flush(0.01))
+        gate.set()
+        self.assertTrue(queue.flush(5))
+
+    def test_put_after_close(self):
+        queue = SendQueue()
+        queue.close()
+        with self.assertRaises(RuntimeError):
+            queue.put(_prepared('message'))
+
+
+class TestDefault(unittest.TestCase):
+
+    def test_reuse(self):
+        self.assertIs(sendqueue.default(), sendqueue.default())
+
+    def test_pid_change(self):
+        parent = sendqueue.default()
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(sendqueue.default(), parent)
+
+    def test_reset_after_fork(self):
+        parent = sendqueue.default()
+        held = threading.Lock()
+        held.acquire()  # e.g. by a parent thread at the time of the fork
+        with mock.patch.object(sendqueue, '_default', sendqueue._default), \
+                mock.patch.object(sendqueue, '_default_lock', held):
+            sendqueue._reset()
+            self.assertIsNot(sendqueue.default(), parent)
+
+    def test_configure(self):
+        previous = sendqueue.default()
+        queue = sendqueue.configure(maxsize=10)
+        self.assertIs(sendqueue.default(), queue)
+        self.assertTrue(previous._closed)
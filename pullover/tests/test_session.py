@@ -0,0 +1,122 @@
+import unittest
+from unittest import mock
+import os
+import queue
+import threading
+import requests
+
+from pullover import session, Message
+
+
+class TestGet(unittest.TestCase):
+
+    def test_type(self):
+        self.assertIsInstance(session.get(), requests.Session)
+
+    def test_reuse(self):
+        self.assertIs(session.get(), session.get())
+
+    def test_pid_change(self):
+        parent = session.get()
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            child = session.get()
+            self.assertIsNot(child, parent)
+            self.assertIs(session.get(), child)
+
+    def test_reset(self):
+        parent = session.get()
+        session._reset()
+        self.assertIsNot(session.get(), parent)
+
+    def test_threads_share(self):
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(
+            session.get())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(sess) for sess in sessions}), 1)
+
+
+def _mock_pool(maxsize=10):
+    pool = mock.Mock()
+    pool.pool = queue.LifoQueue(maxsize)
+    for _ in range(maxsize):
+        pool.pool.put(None)
+    pool._get_conn.side_effect = lambda: mock.Mock(sock=None)
+    return pool
+
+
+class TestWarmup(unittest.TestCase):
+
+    def test_pool_matches_send(self):
+        # the pool warmed must be the one requests picks for a real send
+        pool = session._pool(Message._ENDPOINT)
+        self.assertEqual(pool.host, 'api.pushover.net')
+        self.assertIs(pool, session._pool(Message._ENDPOINT))
+
+    @mock.patch.object(session, '_pool')
+    def test_opens_connections(self, _pool):
+        pool = _mock_pool()
+        _pool.return_value = pool
+        self.assertEqual(session.warmup(Message._ENDPOINT, 3), 3)
+        self.assertEqual(pool._put_conn.call_count, 3)
+        for call in pool._put_conn.call_args_list:
+            call[0][0].connect.assert_called_once_with()
+
+    @mock.patch.object(session, '_pool')
+    def test_capped_at_pool_size(self, _pool):
+        pool = _mock_pool(2)
+        _pool.return_value = pool
+        self.assertEqual(session.warmup(Message._ENDPOINT, 5), 2)
+
+    @mock.patch.object(session, '_pool')
+    def test_connect_failure(self, _pool):
+        pool = _mock_pool()
+        conn = mock.Mock(sock=None)
+        conn.connect.side_effect = OSError('unreachable')
+        pool._get_conn.side_effect = None
+        pool._get_conn.return_value = conn
+        _pool.return_value = pool
+        self.assertEqual(session.warmup(Message._ENDPOINT, 1), 0)
+        pool._put_conn.assert_called_once_with(conn)
+
+
+class TestKeepAlive(unittest.TestCase):
+
+    @mock.patch.object(session, 'is_connection_dropped', return_value=False)
+    @mock.patch.object(session, '_pool')
+    def test_refresh_idle(self, _pool, _):
+        pool = _mock_pool(2)
+        pool.pool.get()
+        conn = mock.Mock()
+        conn.getresponse.return_value.headers = {}
+        pool.pool.put(conn)
+        _pool.return_value = pool
+
+        self.assertEqual(session.KeepAlive(Message._ENDPOINT).refresh(), 1)
+        conn.request.assert_called_once_with('HEAD', '/1/messages.json',
+                                             headers=mock.ANY)
+        conn.close.assert_not_called()
+        self.assertEqual(pool._put_conn.call_count, 2)
+
+    @mock.patch.object(session, 'is_connection_dropped', return_value=True)
+    @mock.patch.object(session, '_pool')
+    def test_refresh_dropped(self, _pool, _):
+        pool = _mock_pool(1)
+        pool.pool.get()
+        conn = mock.Mock()
+        pool.pool.put(conn)
+        _pool.return_value = pool
+
+        session.KeepAlive(Message._ENDPOINT).refresh()
+        conn.request.assert_not_called()
+        conn.close.assert_called_once_with()
+
+    def test_stop(self):
+        thread = session.KeepAlive(Message._ENDPOINT, interval=60)
+        thread.start()
+        thread.stop()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
@@ -0,0 +1,124 @@
+import unittest
+from unittest import mock
+import os
+import shutil
+import tempfile
+import responses
+
+from pullover import Application, User, Message, sounds
+from pullover.sounds import SoundsCatalogue
+
+
+_SOUNDS = {'status': 1, 'request': 'request',
+           'sounds': {'pushover': 'Pushover (default)', 'siren': 'Siren'}}
+
+
+class TestSoundsCatalogue(unittest.TestCase):
+
+    _APP = Application('app')
+
+    def setUp(self):
+        self.now = 1000.
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sounds.json')
+        self.catalogue = SoundsCatalogue(ttl=60, path=self.path,
+                                         clock=lambda: self.now)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @responses.activate
+    def test_refresh(self):
+        responses.add(responses.GET, SoundsCatalogue._ENDPOINT, json=_SOUNDS)
+        self.assertTrue(self.catalogue.refresh(self._APP))
+        self.assertTrue(self.catalogue.is_valid(self._APP, 'siren'))
+        self.assertFalse(self.catalogue.is_valid(self._APP, 'trumpet'))
+        self.assertIn('token=app', responses.calls[0].request.url)
+
+    @mock.patch('threading.Thread')
+    def test_unknown_catalogue(self, thread):
+        self.assertTrue(self.catalogue.is_valid(self._APP, 'trumpet'))
+        thread.return_value.start.assert_called_once_with()
+
+    @mock.patch('threading.Thread')
+    @responses.activate
+    def test_fresh_no_fetch(self, thread):
+        responses.add(responses.GET, SoundsCatalogue._ENDPOINT, json=_SOUNDS)
+        self.catalogue.refresh(self._APP)
+        self.now += 30
+        self.catalogue.sounds(self._APP)
+        thread.assert_not_called()
+        self.now += 30
+        self.catalogue.sounds(self._APP)
+        thread.assert_called_once()
+
+    @responses.activate
+    def test_revalidate_not_modified(self):
+        responses.add(responses.GET, SoundsCatalogue._ENDPOINT, json=_SOUNDS,
+                      headers={'ETag': '"v1"'})
+        self.catalogue.refresh(self._APP)
+        responses.replace(responses.GET, SoundsCatalogue._ENDPOINT,
+                          status=304)
+        self.now += 120
+        self.assertTrue(self.catalogue.refresh(self._APP))
+        self.assertEqual(responses.calls[1].request.headers['If-None-Match'],
+                         '"v1"')
+        self.assertTrue(self.catalogue.is_valid(self._APP, 'siren'))
+
+    @responses.activate
+    def test_persisted(self):
+        responses.add(responses.GET, SoundsCatalogue._ENDPOINT, json=_SOUNDS)
+        self.catalogue.refresh(self._APP)
+        restored = SoundsCatalogue(ttl=60, path=self.path,
+                                   clock=lambda: self.now)
+        self.assertFalse(restored.is_valid(self._APP, 'trumpet'))
+        with open(self.path) as f:
+            self.assertNotIn('"app"', f.read())
+
+    @mock.patch('threading.Thread')
+    def test_corrupt_file(self, thread):
+        with open(self.path, 'w') as f:
+            f.write('{"truncated')
+        restored = SoundsCatalogue(ttl=60, path=self.path,
+                                   clock=lambda: self.now)
+        self.assertIsNone(restored.sounds(self._APP))
+        thread.return_value.start.assert_called_once_with()
+
+    @mock.patch('threading.Thread')
+    @responses.activate
+    def test_failure_backs_off(self, thread):
+        responses.add(responses.GET, SoundsCatalogue._ENDPOINT, status=500)
+        self.assertFalse(self.catalogue.refresh(self._APP))
+        self.catalogue.sounds(self._APP)
+        thread.assert_not_called()
+
+
+class TestMessageSound(unittest.TestCase):
+
+    _APP = Application('app')
+
+    def setUp(self):
+        catalogue = SoundsCatalogue()
+        catalogue._entries[catalogue._key(self._APP)] = {
+            'fetched': float('inf'), 'sounds': _SOUNDS['sounds']}
+        patcher = mock.patch.object(sounds, '_default', catalogue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prepare_invalid(self):
+        with self.assertRaises(ValueError) as context:
+            Message('message', sound='trumpet').prepare(self._APP,
+                                                        User('user'))
+        # the message must not reveal the token
+        self.assertEqual(str(context.exception),
+                         "'trumpet' is not a sound available to the "
+                         "application")
+
+    def test_prepare_valid(self):
+        prepared = Message('message', sound='siren').prepare(self._APP,
+                                                             User('user'))
+        self.assertEqual(prepared.to_dict()['sound'], 'siren')
+
+    @mock.patch.object(sounds, '_default', None)
+    def test_unchecked(self):
+        Message('message', sound='trumpet').prepare(self._APP, User('user'))
@@ -0,0 +1,95 @@
+import unittest
+import urllib.parse
+import responses
+
+from pullover import Application, User, Message, PreparedMessage
+from pullover.template import MessageTemplate
+
+
+class TestMessageTemplate(unittest.TestCase):
+
+    _APP = Application('app')
+    _USER = User('user', ['phone'])
+
+    def _params(self, message):
+        return dict(urllib.parse.parse_qsl(
+            message._request(self._APP, self._USER).data))
+
+    def test_render(self):
+        template = MessageTemplate('Hi {name}, order {order.id} & {total:.2f}',
+                                   title='Order {order.id!s}',
+                                   priority=Message.HIGH)
+        order = type('Order', (), {'id': 42})
+        params = self._params(template.render(name='Zoë', order=order,
+                                              total=3.5))
+        self.assertEqual(params, {
+            'message': 'Hi Zoë, order 42 & 3.50',
+            'title': 'Order 42',
+            'priority': '1',
+            'token': 'app',
+            'user': 'user',
+            'device': 'phone'
+        })
+
+    def test_missing_value(self):
+        with self.assertRaises(KeyError):
+            MessageTemplate('Hi {name}').render()
+
+    def test_positional(self):
+        with self.assertRaises(ValueError):
+            MessageTemplate('Hi {}')
+
+    def test_invalid_shared(self):
+        with self.assertRaises(ValueError):
+            MessageTemplate('Hi {name}', url_title='{title}')
+
+    def test_truncate(self):
+        template = MessageTemplate('{a}{b}!', title='{a}')
+        params = self._params(template.render(a='x' * 1000, b='y' * 100))
+        self.assertEqual(len(params['message']), 1024)
+        self.assertTrue(params['message'].endswith('y…!'))
+        self.assertEqual(params['title'], 'x' * 249 + '…')
+
+    def test_no_truncate(self):
+        template = MessageTemplate('{a}', truncate=False)
+        with self.assertRaises(ValueError):
+            template.render(a='x' * 1025)
+
+    def test_literal_too_long(self):
+        with self.assertRaises(ValueError):
+            MessageTemplate('x' * 1025)
+
+    def test_rendered_message(self):
+        message = MessageTemplate('Hi {name}', priority=Message.LOW) \
+            .render(name='Bob')
+        self.assertEqual(str(message), 'RenderedMessage(Hi Bob)')
+        self.assertEqual(message.priority, Message.LOW)
+        prepared = message.prepare(self._APP, self._USER)
+        restored = PreparedMessage.from_dict(prepared.to_dict())
+        self.assertEqual(restored.to_dict(), prepared.to_dict())
+
+    def test_rendered_attributes(self):
+        message = MessageTemplate('Hi {name}', title='{name}',
+                                  url='https://example.com/') \
+            .render(name='Bob')
+        self.assertEqual(message._title, 'Bob')
+        self.assertEqual(message._url, 'https://example.com/')
+        self.assertIsNone(message._retry)
+        self.assertEqual(message.tags, ())
+
+    def test_rendered_empty_body(self):
+        message = MessageTemplate('{body}').render(body='')
+        self.assertEqual(str(message), 'RenderedMessage()')
+        self.assertEqual(message.prepare(self._APP, self._USER)
+                         .to_dict()['message'], '')
+
+    @responses.activate
+    def test_send(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'request'})
+        response = MessageTemplate('Hi {name}') \
+            .prepare(self._APP, self._USER, name='Bob').send()
+        self.assertTrue(response.ok)
+        self.assertEqual(
+            urllib.parse.parse_qs(responses.calls[0].request.body)['message'],
+            ['Hi Bob'])
@@ -0,0 +1,54 @@
+import unittest
+
+from pullover.timeout import AdaptiveTimeout
+
+
+class TestAdaptiveTimeout(unittest.TestCase):
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            AdaptiveTimeout(initial=20, ceiling=10)
+
+    def test_initial(self):
+        self.assertEqual(AdaptiveTimeout(initial=2).current(), 2)
+
+    def test_first_sample(self):
+        timeout = AdaptiveTimeout()
+        timeout.observe(0.2)
+        self.assertAlmostEqual(timeout.current(), 0.2 + 4 * 0.1)
+
+    def test_converges(self):
+        timeout = AdaptiveTimeout(floor=0.01)
+        for _ in range(100):
+            timeout.observe(0.15)
+        self.assertAlmostEqual(timeout.current(), 0.15, places=3)
+
+    def test_floor(self):
+        timeout = AdaptiveTimeout(floor=0.5)
+        for _ in range(100):
+            timeout.observe(0.01)
+        self.assertEqual(timeout.current(), 0.5)
+
+    def test_ceiling(self):
+        timeout = AdaptiveTimeout(ceiling=10)
+        timeout.observe(30)
+        self.assertEqual(timeout.current(), 10)
+
+    def test_expired_doubles(self):
+        timeout = AdaptiveTimeout(floor=1)
+        for _ in range(100):
+            timeout.observe(0.1)
+        timeout.expired()
+        self.assertAlmostEqual(timeout.current(), 2)
+        timeout.expired()
+        self.assertAlmostEqual(timeout.current(), 4)
+        timeout.observe(0.1)
+        self.assertAlmostEqual(timeout.current(), 1)
+
+    def test_expired_bounded(self):
+        timeout = AdaptiveTimeout()
+        for _ in range(5000):
+            timeout.expired()
+        self.assertEqual(timeout.current(), 10)
+        timeout.observe(1)
+        self.assertLess(timeout.current(), 10)
@@ -0,0 +1,119 @@
+import unittest
+from unittest import mock
+import contextlib
+import contextvars
+import responses
+
+from pullover import Application, User, Message, tracing
+from pullover.schedule import Scheduler
+from pullover.sendqueue import SendQueue
+
+
+class _Span:
+
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+
+class _Tracer:
+    """
+    Records spans, with the same start_as_current_span() interface as an
+    OpenTelemetry tracer.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._current = contextvars.ContextVar('span', default=None)
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name, attributes=None):
+        span = _Span(name, self._current.get(), attributes)
+        self.spans.append(span)
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+
+class TestTracing(unittest.TestCase):
+
+    _APP = Application('app')
+    _USER = User('user')
+    _MESSAGE = Message('Hello')
+
+    def setUp(self):
+        self.tracer = _Tracer()
+        patcher = mock.patch.object(tracing, '_tracer', self.tracer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _names(self):
+        return [span.name for span in self.tracer.spans]
+
+    def test_disabled(self):
+        tracing.configure(None)
+        with tracing.span('pullover.test') as span:
+            span.set_attribute('key', 'value')
+        self.assertIsNone(tracing.capture())
+        self.assertEqual(tracing.run(None, len, 'abc'), 3)
+
+    @mock.patch('pullover.retry._default', None)
+    @responses.activate
+    def test_send(self):
+        responses.add(responses.POST, Message._ENDPOINT, status=503)
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'id'})
+        self._MESSAGE.send(self._APP, self._USER, retry_interval=0)
+
+        self.assertEqual(self._names(), [
+            'pullover.send', 'pullover.sign', 'pullover.encode',
+            'pullover.attempt', 'pullover.backoff', 'pullover.attempt',
+            'pullover.parse'])
+        root = self.tracer.spans[0]
+        self.assertTrue(all(span.parent is root
+                            for span in self.tracer.spans[1:]))
+        first, second = [span for span in self.tracer.spans
+                         if span.name == 'pullover.attempt']
+        self.assertEqual(first.attributes, {'pullover.attempt': 1,
+                                            'pullover.endpoint':
+                                                'messages.json',
+                                            'http.status_code': 503})
+        self.assertEqual(second.attributes['http.status_code'], 200)
+
+    def test_prepare(self):
+        self._MESSAGE.prepare(self._APP, self._USER)
+        self.assertEqual(self._names(), ['pullover.prepare'])
+
+    @responses.activate
+    def test_queue_propagates_context(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'id'})
+        prepared = Message('Hello').prepare(self._APP, self._USER)
+        with SendQueue(workers=1) as queue:
+            with self.tracer.start_as_current_span('caller') as caller:
+                future = queue.put(prepared)
+            future.result()
+
+        send = [span for span in self.tracer.spans
+                if span.name == 'pullover.send'][0]
+        self.assertIs(send.parent, caller)
+
+    @responses.activate
+    def test_scheduler_propagates_context(self):
+        responses.add(responses.POST, Message._ENDPOINT,
+                      json={'status': 1, 'request': 'id'})
+        prepared = Message('Hello').prepare(self._APP, self._USER)
+        with Scheduler() as scheduler:
+            with self.tracer.start_as_current_span('caller') as caller:
+                scheduled = scheduler.schedule(prepared, 0)
+            scheduled.future.result(timeout=5)
+
+        send = [span for span in self.tracer.spans
+                if span.name == 'pullover.send'][0]
+        self.assertIs(send.parent, caller)
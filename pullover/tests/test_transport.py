@@ -0,0 +1,133 @@
+import unittest
+from unittest import mock
+import http.server
+import json
+import socket
+import threading
+import time
+import urllib.parse
+import requests
+
+from pullover import Application, User, Message, transport, endpoint
+from pullover.transport import Urllib3Transport
+from pullover.dns import DnsCache
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(
+            dict(urllib.parse.parse_qsl(body.decode('utf-8'))))
+        if self.path == '/slow':
+            time.sleep(0.5)
+        payload = json.dumps({'status': 1, 'request': 'id'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('X-Limit-App-Remaining', '42')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.server.gets.append((self.path, self.headers['Content-Type'],
+                                 self.headers['Content-Length']))
+        payload = json.dumps({'status': 1}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(http.server.ThreadingHTTPServer):
+
+    def handle_error(self, request, client_address):
+        pass  # e.g. the client timed out and closed the connection
+
+
+class TestUrllib3Transport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.requests = []
+        self.server.gets = []
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.root = 'http://127.0.0.1:{0}/1/'.format(
+            self.server.server_address[1])
+
+        self.transport = Urllib3Transport()
+        self.addCleanup(self.transport.close)
+        patcher = mock.patch.object(transport, '_default', self.transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_send(self):
+        with mock.patch.object(endpoint.MESSAGES, 'root', self.root):
+            response = Message('Hello', title='Hi').send(
+                Application('app'), User('user', ['phone']))
+        self.assertTrue(response.ok)
+        self.assertEqual(response.id, 'id')
+        self.assertEqual(response.app_remaining, 42)
+        self.assertGreater(response.latency, 0)
+        self.assertEqual(self.server.requests, [{
+            'message': 'Hello',
+            'title': 'Hi',
+            'priority': '0',
+            'token': 'app',
+            'user': 'user',
+            'device': 'phone'
+        }])
+
+    def test_timeout(self):
+        request = requests.Request('POST', 'http://127.0.0.1:{0}/slow'.format(
+            self.server.server_address[1]), data={'message': 'Hello'})
+        with self.assertRaises(requests.Timeout):
+            self.transport.send(self.transport.prepare(request), 0.1)
+
+    def test_connection_refused(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        request = requests.Request(
+            'POST', 'http://127.0.0.1:{0}/'.format(port), data={})
+        with self.assertRaises(requests.ConnectionError) as cm:
+            self.transport.send(self.transport.prepare(request), 1)
+        self.assertNotIsInstance(cm.exception, requests.Timeout)
+
+    def test_dns_cache(self):
+        port = self.server.server_address[1]
+        resolver = mock.Mock(return_value=(
+            [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '',
+              ('127.0.0.1', port))], None))
+        self.transport = Urllib3Transport(dns=DnsCache(resolver=resolver))
+        self.addCleanup(self.transport.close)
+        request = requests.Request(
+            'POST', 'http://pushover.invalid:{0}/'.format(port),
+            data={'message': 'Hello'})
+        prepared = self.transport.prepare(request)
+        self.assertTrue(self.transport.send(prepared, 1).ok)
+        resolver.assert_called_once_with('pushover.invalid', port)
+
+    def test_dns_cache_unresolvable(self):
+        resolver = mock.Mock(
+            side_effect=socket.gaierror(socket.EAI_NONAME, 'unknown'))
+        self.transport = Urllib3Transport(dns=DnsCache(resolver=resolver))
+        request = requests.Request('POST', 'http://pushover.invalid/',
+                                   data={})
+        with self.assertRaises(requests.ConnectionError):
+            self.transport.send(self.transport.prepare(request), 1)
+
+    def test_get(self):
+        with mock.patch.object(endpoint.RECEIPT, 'root', self.root):
+            response = endpoint.RECEIPT.call(Application('app'),
+                                             receipt='r1')
+        self.assertTrue(response.ok)
+        self.assertEqual(self.server.gets, [
+            ('/1/receipts/r1.json?token=app', None, None)])
@@ -9,10 +9,39 @@ class TestUser(unittest.TestCase):
     _USER_KEY = 'key'
     _USER = User(_USER_KEY)
 
+    def test_key(self):
+        self.assertEqual(self._USER.key, self._USER_KEY)
+
     def test_sign(self):
         request = requests.Request(data={})
         self._USER.sign(request)
         self.assertDictEqual(request.data, {'user': self._USER_KEY})
 
+    def test_devices_default(self):
+        self.assertIsNone(self._USER.devices)
+
+    def test_devices_empty(self):
+        self.assertIsNone(User(self._USER_KEY, []).devices)
+
+    def test_sign_devices(self):
+        request = requests.Request(data={})
+        User(self._USER_KEY, ['tablet', 'phone']).sign(request)
+        self.assertDictEqual(request.data, {'user': self._USER_KEY,
+                                            'device': 'phone,tablet'})
+
+    def test_eq_devices(self):
+        self.assertNotEqual(self._USER, User(self._USER_KEY, ['phone']))
+
+    def test_eq(self):
+        self.assertEqual(self._USER, User(self._USER_KEY))
+        self.assertNotEqual(self._USER, User('other'))
+
+    def test_hash(self):
+        self.assertEqual(hash(self._USER), hash(User(self._USER_KEY)))
+
     def test_str(self):
         self.assertEqual(str(self._USER), 'User({0})'.format(self._USER_KEY))
+
+    def test_str_devices(self):
+        self.assertEqual(str(User(self._USER_KEY, ['phone'])),
+                         'User({0}, phone)'.format(self._USER_KEY))
@@ -0,0 +1,90 @@
+import threading
+
+
+class AdaptiveTimeout:
+    """
+    A per-attempt request timeout that adapts to observed latency, for use in
+    place of a fixed number of seconds with :meth:`Message.send()
+    <pullover.Message.send()>`.
+
+    Latency is tracked with exponentially weighted moving averages of its
+    mean and mean deviation, as TCP does for round trip times. The timeout is
+    the mean plus a multiple of the deviation, approximating a high
+    percentile of recent latency. Each consecutive timed out attempt doubles
+    it, so a slow but healthy period does not cause a run of false timeouts.
+    The result is always kept within a floor and ceiling.
+
+    Instances are thread-safe, and are intended to be shared by all sends to
+    the same endpoint.
+    """
+
+    # weights of each new sample in the mean and deviation averages
+    _MEAN_WEIGHT = 1 / 8
+    _DEVIATION_WEIGHT = 1 / 4
+
+    def __init__(self, initial=3., floor=0.5, ceiling=10., deviations=4.):
+        """
+        Initialise a new adaptive timeout.
+
+        :param float initial: The timeout to use before any latency has been
+                              observed. Defaults to 3s.
+        :param float floor: The minimum timeout. Defaults to 0.5s.
+        :param float ceiling: The maximum timeout. Defaults to 10s.
+        :param float deviations: The number of mean deviations above the mean
+                                 latency to allow. Defaults to 4.
+        :raises ValueError: If the bounds are inconsistent.
+        """
+        if not 0 < floor <= initial <= ceiling:
+            raise ValueError('Timeouts must satisfy 0 < floor <= initial <= '
+                             'ceiling')
+
+        self._initial = initial
+        self._floor = floor
+        self._ceiling = ceiling
+        self._deviations = deviations
+
+        self._mean = None
+        self._deviation = None
+        self._backoff = 1
+        self._lock = threading.Lock()
+
+    def current(self):
+        """
+        Find the timeout to use for the next attempt.
+
+        :return: The timeout in seconds.
+        :rtype: float
+        """
+        with self._lock:
+            if self._mean is None:
+                timeout = self._initial
+            else:
+                timeout = self._mean + self._deviations * self._deviation
+            return min(self._ceiling,
+                       max(self._floor, timeout) * self._backoff)
+
+    def observe(self, latency):
+        """
+        Record the latency of an attempt that received a response.
+
+        :param float latency: The number of seconds until the response.
+        """
+        with self._lock:
+            if self._mean is None:
+                self._mean = latency
+                self._deviation = latency / 2
+            else:
+                self._deviation += self._DEVIATION_WEIGHT * \
+                    (abs(latency - self._mean) - self._deviation)
+                self._mean += self._MEAN_WEIGHT * (latency - self._mean)
+            self._backoff = 1
+
+    def expired(self):
+        """
+        Record that an attempt timed out.
+        """
+        with self._lock:
+            # once the ceiling is reached, doubling further has no effect
+            # other than to eventually overflow
+            if self._floor * self._backoff < self._ceiling:
+                self._backoff *= 2
@@ -0,0 +1,89 @@
+import contextlib
+import contextvars
+
+
+class _NoopSpan:
+    """
+    Stands in for a span when no tracer is installed.
+    """
+
+    def set_attribute(self, key, value):
+        pass
+
+
+# returned by span() when no tracer is installed; nullcontext is reentrant, so
+# one instance serves every caller
+_NOOP = contextlib.nullcontext(_NoopSpan())
+
+_tracer = None
+
+
+def configure(tracer):
+    """
+    Install a tracer to receive spans for each stage of sending a message:
+    ``pullover.send`` wrapping ``pullover.sign`` (building the request with
+    the application token and user key), ``pullover.encode`` (serialising
+    it), each ``pullover.attempt`` and ``pullover.backoff`` wait, and
+    ``pullover.parse``, and ``pullover.prepare`` when a message is prepared.
+
+    Any object with OpenTelemetry's ``start_as_current_span(name,
+    attributes=None)`` method may be used, e.g.
+    ``opentelemetry.trace.get_tracer('pullover')``. Messages queued with
+    :meth:`PreparedMessage.submit() <pullover.PreparedMessage.submit()>` or a
+    :class:`~pullover.dispatch.Dispatcher`, or scheduled with a
+    :class:`~pullover.schedule.Scheduler`, are sent in the context they were
+    queued from, so their spans have the caller's span as parent.
+
+    :param tracer: The tracer, or None to stop tracing.
+    """
+    global _tracer
+    _tracer = tracer
+
+
+def default():
+    """
+    Retrieve the tracer receiving spans.
+
+    :return: The tracer, or None if tracing is disabled.
+    """
+    return _tracer
+
+
+def span(name, attributes=None):
+    """
+    Start a span as the current span, if a tracer is installed.
+
+    :param str name: The span's name.
+    :param dict attributes: The span's initial attributes.
+    :return: A context manager yielding the span, or a stand-in whose
+             ``set_attribute()`` does nothing if tracing is disabled.
+    """
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def capture():
+    """
+    Capture the current context, to send a message in it on another thread.
+
+    :return: The context, or None if tracing is disabled.
+    :rtype: contextvars.Context
+    """
+    if _tracer is None:
+        return None
+    return contextvars.copy_context()
+
+
+def run(context, func, *args, **kwargs):
+    """
+    Call a function in a context returned by :func:`capture()`.
+
+    :param contextvars.Context context: The context, or None to use the
+                                        current one.
+    :param callable func: The function.
+    :return: The function's result.
+    """
+    if context is None:
+        return func(*args, **kwargs)
+    return context.run(func, *args, **kwargs)
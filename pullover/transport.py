@@ -0,0 +1,272 @@
+import logging
+import abc
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+import urllib.parse
+import requests
+import urllib3
+import urllib3.connection
+
+from pullover import session
+
+
+logger = logging.getLogger(__name__)
+
+
+class Transport:
+    """
+    Sends the HTTP requests made to Pushover's API by every
+    :class:`~pullover.endpoint.Endpoint`. A request is prepared once, then
+    sent once per attempt.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    @abc.abstractmethod
+    def prepare(self, request):
+        """
+        Prepare a request for sending.
+
+        :param requests.Request request: The signed request.
+        :return: The request in a form this transport can send.
+        """
+
+    @abc.abstractmethod
+    def send(self, prepared, timeout):
+        """
+        Send a prepared request.
+
+        :param prepared: A request returned by :meth:`prepare()`.
+        :param float timeout: The number of seconds to allow for the request.
+        :return: The response, with the ``status_code``, ``ok``, ``headers``,
+                 ``elapsed`` and ``json()`` members of a
+                 :class:`requests.Response`.
+        :raises requests.Timeout: If the request timed out.
+        :raises requests.RequestException: If the request failed otherwise.
+        """
+
+
+class RequestsTransport(Transport):
+    """
+    Sends requests with the requests session shared by everything in
+    pullover. This honours environment proxy settings, session hooks and
+    mocks such as the ``responses`` library.
+    """
+
+    def prepare(self, request):
+        return session.get().prepare_request(request)
+
+    def send(self, prepared, timeout):
+        return session.get().send(prepared, timeout=timeout)
+
+
+class _Response:
+    """
+    The subset of :class:`requests.Response` used by
+    :class:`~pullover.message.SendResponse`, for a urllib3 response.
+    """
+
+    def __init__(self, response, elapsed):
+        """
+        :param urllib3.HTTPResponse response: The urllib3 response, with its
+                                              body read.
+        :param float elapsed: The number of seconds the request took.
+        """
+        self.status_code = response.status
+        self.headers = response.headers
+        self.content = response.data
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def _encode(fields):
+    """
+    Form-encode request fields, omitting those whose value is None.
+
+    :param dict fields: The fields, if any.
+    :return: The encoded fields.
+    :rtype: str
+    """
+    return urllib.parse.urlencode(
+        [(key, value) for key, value in (fields or {}).items()
+         if value is not None])
+
+
+def _pool_classes(dns):
+    """
+    Create urllib3 connection pool classes whose connections are opened with
+    a DNS cache.
+
+    :param DnsCache dns: The cache.
+    :return: Pool classes by URL scheme, for
+             :attr:`urllib3.PoolManager.pool_classes_by_scheme`.
+    :rtype: dict
+    """
+    def new_conn(self):
+        # as urllib3.connection.HTTPConnection._new_conn(), but connecting
+        # with the cache
+        timeout = self.timeout if isinstance(self.timeout, (int, float)) \
+            else None  # urllib3's default timeout sentinel
+        try:
+            sock = dns.connect(self._dns_host, self.port, timeout,
+                               source_address=self.source_address,
+                               socket_options=self.socket_options)
+        except socket.gaierror as e:
+            raise urllib3.exceptions.NameResolutionError(self.host, self, e)
+        except socket.timeout:
+            raise urllib3.exceptions.ConnectTimeoutError(
+                self, 'Connection to {0} timed out. (connect timeout={1})'
+                .format(self.host, timeout))
+        except OSError as e:
+            raise urllib3.exceptions.NewConnectionError(
+                self, 'Failed to establish a new connection: {0}'.format(e))
+        return sock
+
+    http = type('_HTTPConnection', (urllib3.connection.HTTPConnection,),
+                {'_new_conn': new_conn})
+    https = type('_HTTPSConnection', (urllib3.connection.HTTPSConnection,),
+                 {'_new_conn': new_conn})
+    return {
+        'http': type('_HTTPConnectionPool', (urllib3.HTTPConnectionPool,),
+                     {'ConnectionCls': http}),
+        'https': type('_HTTPSConnectionPool', (urllib3.HTTPSConnectionPool,),
+                      {'ConnectionCls': https}),
+    }
+
+
+class Urllib3Transport(Transport):
+    """
+    Sends requests directly on a urllib3 connection pool, skipping the
+    per-request work of a requests session: merging cookies, hooks,
+    authentication and environment proxy settings, and building adapters'
+    response objects. Request bodies are encoded once, when a message is
+    prepared, rather than on every send.
+
+    Proxies configured in the environment are not used, and connections are
+    not shared with :func:`pullover.session.get()`, so
+    :meth:`Message.warmup() <pullover.Message.warmup()>` does not affect
+    them. Given a :class:`~pullover.dns.DnsCache`, new connections use its
+    cached addresses rather than waiting for the resolver.
+    """
+
+    def __init__(self, maxsize=10, dns=None):
+        """
+        Initialise a new transport. Its pool is created lazily, once per
+        process.
+
+        :param int maxsize: The number of connections to keep per host.
+                            Defaults to 10, as requests does.
+        :param DnsCache dns: A cache to resolve hosts and open connections
+                             with. Defaults to none, resolving each new
+                             connection's host with the system resolver.
+        """
+        self._maxsize = maxsize
+        self._dns = dns
+
+        # (pid, pool manager); a forked child must not share its parent's
+        # sockets
+        self._state = (None, None)
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        """
+        Retrieve this process's pool manager, creating it if necessary.
+
+        :return: The pool manager.
+        :rtype: urllib3.PoolManager
+        """
+        pid = os.getpid()
+        owner, pool = self._state
+        if owner != pid:
+            with self._lock:
+                owner, pool = self._state
+                if owner != pid:
+                    logger.debug('Creating connection pool for process %d',
+                                 pid)
+                    pool = urllib3.PoolManager(maxsize=self._maxsize,
+                                               retries=False)
+                    if self._dns is not None:
+                        pool.pool_classes_by_scheme = _pool_classes(
+                            self._dns)
+                    self._state = (pid, pool)
+        return pool
+
+    def prepare(self, request):
+        url = request.url
+        params = _encode(request.params)
+        if params:
+            url += ('&' if urllib.parse.urlsplit(url).query else '?') + params
+        headers = dict(request.headers)
+        if request.method == 'GET':
+            return request.method, url, None, headers
+        data = request.data
+        if isinstance(data, dict) or not data:
+            data = _encode(data)
+        headers.setdefault('Content-Type',
+                           'application/x-www-form-urlencoded')
+        return request.method, url, data.encode('utf-8'), headers
+
+    def send(self, prepared, timeout):
+        method, url, body, headers = prepared
+        start = time.perf_counter()
+        try:
+            response = self._pool().urlopen(
+                method, url, body=body, headers=headers,
+                timeout=urllib3.Timeout(connect=timeout, read=timeout),
+                redirect=False, retries=False)
+        except urllib3.exceptions.NewConnectionError as e:
+            # a subclass of ConnectTimeoutError, but not a timeout
+            raise requests.ConnectionError(e)
+        except urllib3.exceptions.ConnectTimeoutError as e:
+            raise requests.ConnectTimeout(e)
+        except urllib3.exceptions.TimeoutError as e:
+            raise requests.ReadTimeout(e)
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.ConnectionError(e)
+        return _Response(response, time.perf_counter() - start)
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        _, pool = self._state
+        if pool is not None:
+            pool.clear()
+
+
+_default = RequestsTransport()
+
+
+def default():
+    """
+    Retrieve the transport used to make API requests.
+
+    :return: The shared transport.
+    :rtype: Transport
+    """
+    return _default
+
+
+def configure(transport):
+    """
+    Replace the transport used to make API requests, e.g. with a
+    :class:`Urllib3Transport` to reduce the CPU cost of each send.
+
+    :param Transport transport: The new transport.
+    """
+    global _default
+    _default = transport
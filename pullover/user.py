@@ -3,13 +3,33 @@ class User:
     Encapsulates a Pushover user key, and signs requests with it.
     """
 
-    def __init__(self, key):
+    def __init__(self, key, devices=None):
         """
         Initialise a new user.
 
         :param str key: The user key.
+        :param iterable(str) devices: The names of the user's devices to send
+                                      to. Defaults to all of them.
         """
         self._key = key
+        self._devices = frozenset(devices or ()) or None
+
+    @property
+    def key(self):
+        """
+        :return: The user key.
+        :rtype: str
+        """
+        return self._key
+
+    @property
+    def devices(self):
+        """
+        :return: The names of the devices targeted, or None if all of the
+                 user's devices are.
+        :rtype: frozenset(str)
+        """
+        return self._devices
 
     def sign(self, request):
         """
@@ -18,6 +38,19 @@ class User:
         :param requests.Request request: The request to sign.
         """
         request.data['user'] = self._key
+        if self._devices:
+            request.data['device'] = ','.join(sorted(self._devices))
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return NotImplemented
+        return self._key == other._key and self._devices == other._devices
+
+    def __hash__(self):
+        return hash((self._key, self._devices))
 
     def __str__(self):
-        return '{0.__class__.__name__}({0._key})'.format(self)
+        if self._devices is None:
+            return '{0.__class__.__name__}({0._key})'.format(self)
+        return '{0.__class__.__name__}({0._key}, {1})'.format(
+            self, ','.join(sorted(self._devices)))